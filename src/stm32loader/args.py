@@ -41,8 +41,20 @@ def _auto_int(x):
     return int(x, 0)
 
 
+def _device(specifier):
+    """Convert a device name or product ID[:bootloader ID] to a DeviceInfo."""
+    # Only import the device table when the argument is actually used.
+    from stm32loader.devices import DEVICES  # pylint: disable=import-outside-toplevel
+
+    try:
+        return DEVICES.find(specifier)
+    except KeyError as e:
+        raise argparse.ArgumentTypeError(e.args[0]) from e
+
+
 def parse_arguments(arguments):
     """Parse the given command-line arguments and return the configuration."""
+    # pylint: disable=too-many-statements
 
     parser = argparse.ArgumentParser(
         prog="stm32loader",
@@ -104,6 +116,17 @@ def parse_arguments(arguments):
         "-r", "--read", action="store_true", help="Read from flash and store in local file."
     )
 
+    parser.add_argument(
+        "--snapshot",
+        action="store",
+        type=str,
+        metavar="ZIP",
+        help=(
+            "Read flash, system memory, option bytes, UID and flash size registers"
+            " and store them in the zip archive ZIP, with a manifest."
+        ),
+    )
+
     length_arg = parser.add_argument(
         "-l", "--length", action="store", type=_auto_int, help="Length of read or erase."
     )
@@ -156,6 +179,32 @@ def parse_arguments(arguments):
         ),
     )
 
+    parser.add_argument(
+        "--device",
+        action="store",
+        type=_device,
+        metavar="DEVICE",
+        help=(
+            "Skip device auto-detection and use the given device name"
+            " (e.g. STM32F10xxx-Medium-density) or product ID with optional"
+            " bootloader ID (e.g. 0x410 or 0x413:0x91)."
+            " UID and flash size are then only shown with --info."
+        ),
+    )
+
+    parser.add_argument(
+        "--check-device-id",
+        action="store_true",
+        help="With --device, verify the device's product ID (one extra round trip).",
+    )
+
+    parser.add_argument(
+        "-i",
+        "--info",
+        action="store_true",
+        help="Show device UID and flash size (always done without --device).",
+    )
+
     parser.add_argument(
         "-V",
         "--verbose",
@@ -185,6 +234,15 @@ def parse_arguments(arguments):
         "-B", "--boot0-active-low", action="store_true", help="Make BOOT0 active low."
     )
 
+    parser.add_argument(
+        "--no-reset",
+        action="store_true",
+        help=(
+            "RESET is not connected: don't toggle it, and don't use the flashing stub,"
+            " which needs a reset to return to the bootloader."
+        ),
+    )
+
     parser.add_argument(
         "-n", "--no-progress", action="store_true", help="Don't show progress bar."
     )
@@ -199,6 +257,153 @@ def parse_arguments(arguments):
         help='Parity: "even" for STM32, "none" for BlueNRG.',
     )
 
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Record the progress of --write and --read in a journal, and continue"
+            " an interrupted transfer of the same file to the same device."
+        ),
+    )
+
+    parser.add_argument(
+        "--retries",
+        action="store",
+        type=int,
+        default=3,
+        metavar="N",
+        help=(
+            "Retry a failed read or write of a data chunk up to N times,"
+            " after resynchronizing with the bootloader (default: 3)."
+        ),
+    )
+
+    parser.add_argument(
+        "--fast-connect",
+        action="store_true",
+        help=(
+            "Send the bootloader activation and identification commands in one burst;"
+            " fall back to one command at a time if the replies can't be parsed."
+        ),
+    )
+
+    parser.add_argument(
+        "--ram",
+        action="store_true",
+        help=(
+            "Write the image to RAM instead of flash and run it, without erasing."
+            " The image needs a vector table and must be linked for RAM; it's"
+            " loaded at --address if that's in RAM, else at the start of usable RAM."
+        ),
+    )
+
+    parser.add_argument(
+        "--verify-checksum",
+        action="store_true",
+        help=(
+            "With --verify, compare a CRC32 calculated on the device (GET_CHECKSUM"
+            " command, or the flashing stub with --stub) instead of reading all data back."
+            " Read back if neither is available, or to locate a mismatch."
+        ),
+    )
+
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help=(
+            "Erase and write through a flashing stub uploaded to RAM, with large"
+            " pipelined frames, if a stub is available for the device family;"
+            " see stm32loader.stub. Needs reset control to return to the bootloader."
+        ),
+    )
+
+    parser.add_argument(
+        "--verify-diff",
+        action="store",
+        type=str,
+        metavar="FILE",
+        help=(
+            "If --verify fails, write the XOR of the read and expected data to FILE;"
+            " matching bytes are zero."
+        ),
+    )
+
+    parser.add_argument(
+        "--record-trace",
+        action="store",
+        type=str,
+        metavar="FILE",
+        help=(
+            "Record all serial traffic with timestamps to FILE, in a compact binary"
+            " format that stm32loader.trace can analyse and replay."
+        ),
+    )
+
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help=(
+            "Show per-command latency histograms, time spent sending and waiting,"
+            " and the effective throughput compared to the baud rate."
+        ),
+    )
+
+    parser.add_argument(
+        "--protocol-log",
+        action="store",
+        type=str,
+        metavar="FILE",
+        help=("Log all bytes sent to and received from the bootloader to FILE, as JSON lines."),
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Connect and detect the device, then print the planned steps with time estimates"
+            " instead of running them."
+        ),
+    )
+
+    parser.add_argument(
+        "--bank-erase",
+        action="store_true",
+        help=(
+            "With --erase, erase the whole flash bank(s) holding --address (and --length)"
+            " with one command, leaving the other bank of a dual-bank device untouched."
+            " The bank layout is read from the device."
+        ),
+    )
+
+    parser.add_argument(
+        "--tight-timeouts",
+        action="store_true",
+        help=(
+            "Derive command and erase timeouts from the baud rate and the flash timing"
+            " of the device, instead of waiting up to 5 s (30 s for erase) for a reply."
+        ),
+    )
+
+    parser.add_argument(
+        "--cache-detection",
+        action="store_true",
+        help=(
+            "Remember the detected device, UID and flash size per serial port,"
+            " and reuse them after a single round trip confirms it's the same board."
+        ),
+    )
+
+    parser.add_argument(
+        "--daemon",
+        action="store",
+        type=str,
+        metavar="SOCKET",
+        help=(
+            "Keep the bootloader session open and run erase/write/verify/read/go jobs"
+            " submitted as JSON lines on the given Unix socket."
+        ),
+    )
+
     parser.add_argument("--version", action="version", version=__version__)
 
     # Hack: We want certain arguments to be required when one
@@ -234,6 +439,16 @@ def parse_arguments(arguments):
         length_arg.required = True
         address_arg.required = True
 
+    if configuration.ram and not configuration.write:
+        parser.error("--ram needs --write")
+
+    if (
+        configuration.snapshot
+        and configuration.data_file
+        and os.path.realpath(configuration.snapshot) == os.path.realpath(configuration.data_file)
+    ):
+        parser.error("--snapshot would overwrite FILE.BIN; store the snapshot elsewhere")
+
     parser.parse_args(arguments)
 
     return configuration
@@ -21,87 +21,41 @@
 
 from __future__ import annotations
 
+import contextlib
 import enum
+import logging
 import math
 import operator
 import struct
+import threading
 import time
-from functools import lru_cache, reduce
+from functools import lru_cache, reduce, wraps
 
-from stm32loader.device_family import DeviceFamily, DeviceFlag
+from stm32loader import log, stream
+from stm32loader.device_family import DEVICE_FAMILIES, DeviceFamily, DeviceFlag, FlashTiming
 from stm32loader.device_info import DeviceInfo
-from stm32loader.devices import DEVICES
+from stm32loader.read_planner import read_planned
+from stm32loader.retry import RetryPolicy, RetryStats
+from stm32loader.timeouts import erase_time
+from stm32loader.verify import CRC_INITIAL, CRC_POLYNOMIAL, compare
 
 # pylint: disable=too-many-lines
 
-CHIP_IDS = {
-    # see ST AN2606 Table 136 Bootloader device-dependent parameters
-    # 16 to 32 KiB
-    0x412: "STM32F10x Low-density",
-    0x444: "STM32F03xx4/6",
-    # 64 to 128 KiB
-    0x410: "STM32F10x Medium-density",
-    0x420: "STM32F10x Medium-density value line",
-    0x460: "STM32G0x1",
-    0x468: "STM32G431xx/STM32G441xx",
-    # 128 to 512 KiB,
-    0x469: "STM32G47xxx/48xxx",
-    # 256 to 512 KiB (5128 Kbyte is probably a typo?)
-    0x414: "STM32F10x High-density",
-    0x428: "STM32F10x High-density value line",
-    # 768 to 1024 KiB
-    0x430: "STM3210xx XL-density",
-    # flash size to be looked up
-    0x417: "STM32L05xxx/06xxx",
-    0x416: "STM32L1xxx6(8/B) Medium-density ultralow power line",
-    0x411: "STM32F2xxx",
-    0x433: "STM32F4xxD/E",
-    # STM32F3
-    0x432: "STM32F373xx/378xx",
-    0x422: "STM32F302xB(C)/303xB(C)/358xx",
-    0x439: "STM32F301xx/302x4(6/8)/318xx",
-    0x438: "STM32F303x4(6/8)/334xx/328xx",
-    0x446: "STM32F302xD(E)/303xD(E)/398xx",
-    # RM0090 in ( 38.6.1 MCU device ID code )
-    0x413: "STM32F405xx/07xx and STM32F415xx/17xx",
-    0x419: "STM32F42xxx and STM32F43xxx",
-    # AN2606
-    0x452: "STM32F72xxx/73xxx",
-    0x449: "STM32F74xxx/75xxx",
-    0x451: "STM32F76xxx/77xxx",
-    0x483: "STM32H72xxx/73xxx",
-    0x450: "STM32H74xxx/75xxx",
-    0x480: "STM32H7A3xx/B3xx",
-    # RM0394 46.6.1 MCU device ID code
-    0x435: "STM32L4xx",
-    # ST BlueNRG series; see ST AN4872.
-    # Three-byte ID where we mask out byte 1 (metal fix)
-    # and byte 2 (mask set).
-    # Requires parity None.
-    0x000003: "BlueNRG-1 160kB",
-    0x00002F: "BlueNRG-2 256kB",
-    # STM32F0 RM0091 Table 136. DEV_ID and REV_ID field values
-    0x440: "STM32F030x8",
-    0x445: "STM32F070x6",
-    0x448: "STM32F070xB",
-    0x442: "STM32F030xC",
-    0x457: "STM32L01xxx/02xxx",
-    0x497: "STM32WLE5xx/WL55xx",
-    # Cortex-M0 MCU with hardware TCP/IP and MAC
-    # (SweetPeas custom bootloader)
-    0x801: "Wiznet W7500",
-    # GigaDevice GD32VW55x series
-    # Uses 0x06 command to get part number
-    # (pid is 4-byte ASCII in little-endian)
-    0x50494B36: "GD32VW553KIQ6",
-    0x504D4B36: "GD32VW553KMQ6",
-    0x50494836: "GD32VW553HIQ6",
-    0x504D4836: "GD32VW553HMQ6",
-    0x50494B37: "GD32VW553KIQ7",
-    0x504D4B37: "GD32VW553KMQ7",
-    0x50494837: "GD32VW553HIQ7",
-    0x504D4837: "GD32VW553HMQ7",
-}
+
+def __getattr__(name):
+    """
+    Offer CHIP_IDS as a lazily computed mapping of product ID to device name.
+
+    The product IDs come from the device table in stm32loader.devices,
+    which is only imported when needed. Product IDs that were in CHIP_IDS
+    before the device table existed keep their former names.
+    """
+    if name == "CHIP_IDS":
+        # pylint: disable=import-outside-toplevel
+        from stm32loader.devices import CHIP_ID_NAMES, DEVICES
+
+        return DEVICES.product_names(CHIP_ID_NAMES)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Stm32LoaderError(Exception):
@@ -123,6 +77,16 @@ class DataLengthError(Stm32LoaderError, ValueError):
 class DataMismatchError(Stm32LoaderError):
     """Exception: data comparison failed."""
 
+    def __init__(self, message, report=None):
+        """
+        Construct a DataMismatchError.
+
+        :param str message: What differs.
+        :param VerifyReport report: All mismatches, if known.
+        """
+        super().__init__(message)
+        self.report = report
+
 
 class MissingDependencyError(Stm32LoaderError):
     """Exception: required dependency is missing."""
@@ -194,6 +158,89 @@ class ShowProgress:
         self.progress_bar.finish()
 
 
+class Capabilities:  # pylint: disable=too-few-public-methods
+    """
+    Tell which commands to use, based on the bootloader's GET reply.
+
+    Choosing commands from what the bootloader advertises avoids
+    trying a command and waiting for it to fail or time out.
+    """
+
+    __slots__ = ("version", "commands", "id_command", "erase_command", "extensions")
+
+    def __init__(self, version, commands):
+        """
+        Construct the Capabilities; prefer get_capabilities(), which caches.
+
+        :param int version: Bootloader protocol version.
+        :param commands: Command codes as advertised by GET.
+        """
+        command = Stm32Bootloader.Command
+        self.version = version
+        self.commands = frozenset(commands)
+
+        self.id_command = None
+        if command.GET_ID in self.commands:
+            self.id_command = command.GET_ID
+        elif command.GET_GD_ID in self.commands:
+            self.id_command = command.GET_GD_ID
+
+        self.erase_command = None
+        if command.EXTENDED_ERASE in self.commands:
+            self.erase_command = command.EXTENDED_ERASE
+        elif command.ERASE in self.commands:
+            self.erase_command = command.ERASE
+
+        # Vendor-specific or unknown commands.
+        standard_commands = set(command) - {command.GET_GD_ID}
+        self.extensions = frozenset(self.commands - standard_commands)
+
+    def supports(self, command):
+        """Return True if the bootloader advertises the given command."""
+        return command in self.commands
+
+    def __repr__(self):
+        commands = ", ".join(f"0x{command:02X}" for command in sorted(self.commands))
+        return f"Capabilities(0x{self.version:02X}, [{commands}])"
+
+
+@lru_cache(maxsize=None)
+def get_capabilities(version, commands):
+    """
+    Return the Capabilities for the given bootloader version and commands.
+
+    :param int version: Bootloader protocol version.
+    :param frozenset commands: Command codes as advertised by GET.
+    """
+    return Capabilities(version, commands)
+
+
+def _instrumented(command_name):
+    """
+    Measure the decorated bootloader method in its stats object, if any.
+
+    Without stats, the only overhead is one attribute check.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            start_time = time.perf_counter()
+            failed = True
+            try:
+                result = method(self, *args, **kwargs)
+                failed = False
+                return result
+            finally:
+                self.stats.record_command(command_name, time.perf_counter() - start_time, failed)
+
+        return wrapper
+
+    return decorator
+
+
 class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
     """Talk to the STM32 native bootloader."""
 
@@ -225,6 +272,8 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         EXTENDED_ERASE = 0x44
         WRITE_PROTECT = 0x63
         WRITE_UNPROTECT = 0x73
+        # Only on recent bootloaders; check capabilities.supports().
+        GET_CHECKSUM = 0xA1
 
         # GD-specific command to get part number (GD32VW553 series)
         GET_GD_ID = 0x06
@@ -385,8 +434,24 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
     SYNCHRONIZE_ATTEMPTS = 2
 
+    # Special page counts of the extended erase command, see ST AN3155.
+    EXTENDED_ERASE_MASS = 0xFFFF
+    EXTENDED_ERASE_BANK = {1: 0xFFFE, 2: 0xFFFD}
+
+    # Read timeout while bringing the bootloader back in sync, in seconds.
+    RESYNCHRONIZE_TIMEOUT = 0.1
+
     def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
-        self, connection, device=None, device_family=None, verbosity=5, show_progress=None
+        self,
+        connection,
+        device=None,
+        device_family=None,
+        verbosity=5,
+        show_progress=None,
+        page_cache=None,
+        retry_policy=None,
+        timeout_policy=None,
+        stats=None,
     ):
         """
         Construct the Stm32Bootloader object.
@@ -404,12 +469,34 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         :param int verbosity: Verbosity level. 0 is quiet, 10 is verbose.
         :param ShowProgress show_progress: ShowProgress context manager.
             Set to None to disable progress bar output.
+        :param PageCache page_cache: Cache for flash reads, see
+            stm32loader.page_cache. Set to None to always read from the
+            device.
+        :param RetryPolicy retry_policy: How to retry failed chunks of
+            read_memory_data() and write_memory_data(). Set to None to
+            not retry.
+        :param TimeoutPolicy timeout_policy: Derive read timeouts from
+            the device's flash timing, see stm32loader.timeouts. Set to
+            None to keep the connection's timeout.
+        :param TransferStats stats: Collect command latencies and byte
+            counts, see stm32loader.stats. Set to None to not measure.
         """
         self.connection = connection
         self.verbosity = verbosity
         self.show_progress = show_progress or ShowProgress(None)
+        self.page_cache = page_cache
+        self.retry_policy = retry_policy or RetryPolicy(retries=0)
+        self.retry_stats = RetryStats()
+        self.timeout_policy = timeout_policy
+        self.stats = stats
         self.extended_erase = False
         self.supported_commands = {}
+        # Commands to use; known after get().
+        self.capabilities = None
+        # Values read from the device, such as 'uid' and 'flash_size'.
+        # They're kept until the device is reset or replaced.
+        self.device_properties = {}
+        self._device_properties_lock = threading.RLock()
 
         # Try to use given device or device family.
         if device:
@@ -439,10 +526,30 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
     def write(self, *data):
         """Write the given data to the MCU."""
+        trace = log.TRANSPORT.isEnabledFor(logging.DEBUG)
         for data_bytes in data:
             if isinstance(data_bytes, int):
                 data_bytes = struct.pack("B", data_bytes)
-            self.connection.write(data_bytes)
+            if self.stats is None:
+                self.connection.write(data_bytes)
+            else:
+                start_time = time.perf_counter()
+                self.connection.write(data_bytes)
+                self.stats.record_send(len(data_bytes), time.perf_counter() - start_time)
+            if trace:
+                log.TRANSPORT.debug("write", extra={"data": bytes(data_bytes)})
+
+    def read(self, *args):
+        """Read from the MCU; arguments are passed to the connection."""
+        if self.stats is None:
+            data = self.connection.read(*args)
+        else:
+            start_time = time.perf_counter()
+            data = self.connection.read(*args)
+            self.stats.record_receive(len(data), time.perf_counter() - start_time)
+        if log.TRANSPORT.isEnabledFor(logging.DEBUG):
+            log.TRANSPORT.debug("read", extra={"data": bytes(data)})
+        return data
 
     def write_and_ack(self, message, *data):
         """Write data to the MCU and wait until it replies with ACK."""
@@ -451,21 +558,19 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         self.write(*data)
         return self._wait_for_ack(message)
 
-    def debug(self, level, message):
-        """Print the given message if its level is low enough."""
+    def debug(self, level, message, *args, logger=log.PROTOCOL):
+        """
+        Log the given message if its level is low enough.
+
+        Pass format arguments separately, as for logging: they're only
+        formatted when the message is logged. See stm32loader.log.
+        """
         if self.verbosity >= level:
-            print(message)
+            logger.log(log.log_level(level), message, *args)
 
     def reset_from_system_memory(self):
         """Reset the MCU with boot0 enabled to enter the bootloader."""
-        self._enable_boot0(True)
-        self._reset()
-
-        # Flush the input buffer to avoid reading old data.
-        # It's known that the CP2102N at high baudrate fails to flush
-        # its buffer when the port is opened.
-        if hasattr(self.connection, "flush_input_buffer"):
-            self.connection.flush_input_buffer()
+        self._reset_into_bootloader()
 
         # Try the 0x7F synchronize that selects UART in bootloader mode
         # (see ST application notes AN3155 and AN2606).
@@ -480,7 +585,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             if attempt:
                 print("Bootloader activation timeout -- retrying")
             self.write(self.Command.SYNCHRONIZE)
-            read_data = bytearray(self.connection.read())
+            read_data = bytearray(self.read())
 
             if read_data and read_data[0] in (self.Reply.ACK, self.Reply.NACK):
                 # success
@@ -489,8 +594,140 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         # not successful
         raise CommandError("Bad reply from bootloader")
 
+    def activate_pipelined(self):
+        """
+        Activate the bootloader and identify the device in a single burst.
+
+        Send SYNCHRONIZE, GET and GET_VERSION back to back and parse all
+        replies afterwards, instead of waiting for each reply before sending
+        the next command. If the device family is known and supports GET_ID,
+        send GET_ID too and remember the product ID for get_product_id().
+        GD32 bootloaders only know GET_GD_ID, so without a known family the
+        product ID is left to get_product_id() and the advertised command.
+
+        If the replies can't be parsed (e.g. the UART dropped bytes), fall
+        back to activating the bootloader step by step.
+
+        :return int: Bootloader version.
+        """
+        command = self.Command
+        commands = [
+            command.SYNCHRONIZE,
+            command.GET,
+            command.GET ^ 0xFF,
+            command.GET_VERSION,
+            command.GET_VERSION ^ 0xFF,
+        ]
+        with_id = self.device_family not in (None, DeviceFamily.GD32VW55X.value)
+        if with_id:
+            commands += [command.GET_ID, command.GET_ID ^ 0xFF]
+        self._reset_into_bootloader()
+        self.write(*commands)
+        try:
+            version, product_id = self._read_pipelined_replies(with_id)
+        except CommandError as e:
+            self.debug(5, f"Pipelined bootloader activation failed ({e}); retry step by step")
+            self.reset_from_system_memory()
+            return self.get()
+
+        if with_id:
+            with self._device_properties_lock:
+                self.device_properties["product_id"] = product_id
+        return version
+
+    def _read_pipelined_replies(self, with_id):
+        """
+        Parse the replies to activate_pipelined()'s burst of commands.
+
+        :param bool with_id: True if the burst included GET_ID.
+        :return tuple: Bootloader version and product ID, or None
+          without GET_ID.
+        """
+
+        def read(length=1):
+            data = bytearray(self.read(length))
+            if len(data) != length:
+                raise CommandError("Incomplete reply from bootloader")
+            return data
+
+        if read()[0] not in (self.Reply.ACK, self.Reply.NACK):
+            raise CommandError("Bad reply from bootloader")
+
+        # GET.
+        self._wait_for_ack("0x00 GET")
+        length = read()[0]
+        version = read()[0]
+        self._set_supported_commands(version, read(length))
+        self._wait_for_ack("0x00 end")
+
+        # GET_VERSION.
+        self._wait_for_ack("0x01 GET_VERSION")
+        read(3)
+        self._wait_for_ack("0x01 end")
+
+        if not with_id:
+            return version, None
+
+        # GET_ID.
+        self._wait_for_ack("0x02 GET_ID")
+        length = read()[0]
+        product_id = self._decode_product_id(read(length + 1))
+        self._wait_for_ack("0x02 end")
+
+        return version, product_id
+
+    def _reset_into_bootloader(self):
+        """Reset with boot0 enabled and flush stale input."""
+        self.invalidate_device_properties()
+        self._invalidate_page_cache()
+        self._enable_boot0(True)
+        self._reset()
+
+        # Flush the input buffer to avoid reading old data.
+        # It's known that the CP2102N at high baudrate fails to flush
+        # its buffer when the port is opened.
+        self._flush_input_buffer()
+
+    def _flush_input_buffer(self):
+        """Drop any data that was received but not read yet."""
+        if hasattr(self.connection, "flush_input_buffer"):
+            self.connection.flush_input_buffer()
+
+    def resynchronize(self):
+        """
+        Bring the bootloader back to waiting for a command, after an error.
+
+        The bootloader may still be waiting for the rest of a command,
+        e.g. the data of a write. Feed it enough filler bytes to finish
+        any command, which it will reject. Then send single invalid bytes
+        until it replies NACK: from then on, it waits for a new command.
+
+        The filler ends in 0x00: all 0xFF would be a valid write of 256
+        bytes of 0xFF, with checksum 0xFF, which programs the chunk and
+        makes the retried write fail on ECC flash.
+        """
+        previous_timeout = self.connection.timeout
+        self.connection.timeout = self.RESYNCHRONIZE_TIMEOUT
+        try:
+            self.write(b"\xff" * (self.data_transfer_size + 1) + b"\x00")
+            time.sleep(self.RESYNCHRONIZE_TIMEOUT)
+            self._flush_input_buffer()
+            # An invalid command is two bytes; the first one may be eaten
+            # by an unfinished command.
+            for _attempt in range(3):
+                self.write(0xFF)
+                read_data = bytearray(self.read())
+                if read_data and read_data[0] == self.Reply.NACK:
+                    return
+        finally:
+            self.connection.timeout = previous_timeout
+        raise CommandError("Can't resynchronize with bootloader")
+
     def reset_from_flash(self):
         """Reset the MCU with boot0 disabled."""
+        self.invalidate_device_properties()
+        # The firmware may write to its own flash.
+        self._invalidate_page_cache()
         self._enable_boot0(False)
         self._reset()
 
@@ -500,7 +737,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
         Raise CommandError if there's no ACK replied.
         """
-        self.debug(10, "*** Command: %s" % description)
+        self.debug(10, "*** Command: %s", description)
         ack_received = self.write_and_ack("Command", command, command ^ 0xFF)
         if not ack_received:
             raise CommandError("%s (%s) failed: no ack" % (description, command))
@@ -508,17 +745,21 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
     def get(self):
         """Return the bootloader version and remember supported commands."""
         self.command(self.Command.GET, "Get")
-        length = bytearray(self.connection.read())[0]
-        version = bytearray(self.connection.read())[0]
+        length = bytearray(self.read())[0]
+        version = bytearray(self.read())[0]
         self.debug(10, "    Bootloader version: " + hex(version))
-        supported_commands = bytearray(self.connection.read(length))
+        self._set_supported_commands(version, bytearray(self.read(length)))
+        self._wait_for_ack("0x00 end")
+        return version
+
+    def _set_supported_commands(self, version, supported_commands):
+        """Remember the commands as advertised by GET."""
         self.supported_commands = {command: True for command in supported_commands}
-        self.extended_erase = self.Command.EXTENDED_ERASE in self.supported_commands
+        self.capabilities = get_capabilities(version, frozenset(supported_commands))
+        self.extended_erase = self.capabilities.erase_command == self.Command.EXTENDED_ERASE
         self.debug(
             10, "    Available commands: " + ", ".join(hex(b) for b in self.supported_commands)
         )
-        self._wait_for_ack("0x00 end")
-        return version
 
     def get_version(self):
         """
@@ -527,7 +768,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         Read protection status readout is not yet implemented.
         """
         self.command(self.Command.GET_VERSION, "Get version")
-        data = bytearray(self.connection.read(3))
+        data = bytearray(self.read(3))
         version = data[0]
         option_byte1 = data[1]
         option_byte2 = data[2]
@@ -540,28 +781,57 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
     def get_id(self):
         """Send the 'Get ID' command and return the chip/product/device ID."""
         self.command(self.Command.GET_ID, "Get ID")
-        length = bytearray(self.connection.read())[0]
-        id_data = bytearray(self.connection.read(length + 1))
+        length = bytearray(self.read())[0]
+        id_data = bytearray(self.read(length + 1))
         self._wait_for_ack("0x02 end")
+        return self._decode_product_id(id_data)
+
+    def _decode_product_id(self, id_data):
+        """Return the product ID from the GET_ID reply data."""
         if self.device_family == DeviceFamily.NRG.value:
             # BlueNRG-lineage devices hold the PID in the 3rd byte
             return id_data[2]
-        _device_id = reduce(lambda x, y: x * 0x100 + y, id_data)
-        return _device_id
+        return reduce(lambda x, y: x * 0x100 + y, id_data)
 
     def get_gd_id(self):
         """Send the 'Get GD ID' command and return the device ID."""
         self.command(self.Command.GET_GD_ID, "Get GD ID")
-        length = bytearray(self.connection.read())[0]
+        length = bytearray(self.read())[0]
         # GD32 0x06 command returns N+1 bytes where N is the count,
         # but the last byte is ACK, not part of data
-        id_data = bytearray(self.connection.read(length))
+        id_data = bytearray(self.read(length))
         self._wait_for_ack("0x06 end")
         _device_id = self._gd_part_number_to_pid(id_data)
         return _device_id
 
+    def get_product_id(self):
+        """
+        Return the product ID, using the GD-specific command if needed.
+
+        Use the ID command advertised by get(). If get() was not called,
+        or the bootloader advertises neither, try GET_ID and fall back
+        to GET_GD_ID.
+        """
+        with self._device_properties_lock:
+            if "product_id" in self.device_properties:
+                return self.device_properties["product_id"]
+
+        id_command = self.capabilities.id_command if self.capabilities else None
+        if id_command == self.Command.GET_ID:
+            return self.get_id()
+        if id_command == self.Command.GET_GD_ID:
+            return self.get_gd_id()
+        try:
+            return self.get_id()
+        except CommandError:
+            return self.get_gd_id()
+
     def get_flash_size(self):
         """Return the MCU's flash size in kilobytes."""
+        return self._device_property("flash_size", self._read_flash_size)
+
+    def _read_flash_size(self):
+        """Read the MCU's flash size in kilobytes from the device."""
         if self.device.flags & DeviceFlag.LONG_UID_ACCESS:
             # F4, L0 families.
             flash_size, _uid = self._get_flash_size_and_uid_bulk()
@@ -582,6 +852,10 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         :return byterary: UID bytes of the device, or 0 or -1 when
           not available.
         """
+        return self._device_property("uid", self._read_uid)
+
+    def _read_uid(self):
+        """Read the device UID from the device."""
         if self.device.flags & DeviceFlag.LONG_UID_ACCESS:
             # F4 and L0 families.
             _flash_size, uid = self._get_flash_size_and_uid_bulk()
@@ -592,7 +866,18 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
         return uid
 
-    @lru_cache(maxsize=2)
+    def _device_property(self, name, read):
+        """Return the named device property; call read() if not known yet."""
+        with self._device_properties_lock:
+            if name not in self.device_properties:
+                self.device_properties[name] = read()
+            return self.device_properties[name]
+
+    def invalidate_device_properties(self):
+        """Forget all values read from the device, e.g. UID and flash size."""
+        with self._device_properties_lock:
+            self.device_properties.clear()
+
     def _get_flash_size_raw(self):
         """Perform a direct 2-byte read of the flash size."""
         flash_size_address = self.device.family.flash_size_address
@@ -600,7 +885,6 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         flash_size = flash_size_bytes[0] + (flash_size_bytes[1] << 8)
         return flash_size
 
-    @lru_cache(maxsize=2)
     def _get_uid_raw(self):
         """Perform a direct 12-byte read of the device UID."""
         uid_address = self.UID_ADDRESS.get(self.device_family, self.UID_ADDRESS_UNKNOWN)
@@ -612,12 +896,12 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         uid = self.read_memory(uid_address, 12)
         return uid
 
-    @lru_cache(maxsize=2)
     def _get_flash_size_and_uid_bulk(self):
         """
         Return device_uid and flash_size using a 256-byte bulk read.
 
-        This workaround is used for F4 and L0 families.
+        This workaround is used for F4 and L0 families. Both values are
+        stored in the device properties, so they're only read once.
         """
         flash_size_address = self.FLASH_SIZE_ADDRESS[self.device_family]
         uid_address = self.UID_ADDRESS.get(self.device_family)
@@ -638,42 +922,138 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         device_uid = data[uid_lsb_address : uid_lsb_address + 12]
         flash_size = data[flash_size_lsb_address] + (data[flash_size_lsb_address + 1] << 8)
 
+        with self._device_properties_lock:
+            self.device_properties.setdefault("flash_size", flash_size)
+            self.device_properties.setdefault("uid", device_uid)
         return flash_size, device_uid
 
     def detect_device(self) -> None:
         """Detect the device type and store in `device`."""
-        product_id = None
-        try:
-            product_id = self.get_id()
-        except CommandError:
-            product_id = self.get_gd_id()
+        # Import the device table only when it's really needed.
+        from stm32loader.devices import DEVICES  # pylint: disable=import-outside-toplevel
+
+        product_id = self.get_product_id()
 
         # Look up device details based on ID *without* bootloader ID.
-        self.device = DEVICES.get((product_id, None))
+        self.device = DEVICES.lookup(product_id)
 
         if not self.device:
             raise DeviceDetectionError(
                 f"Unknown device type: no type known for product id: 0x{product_id:03X}"
             )
 
-        # Look up the product's bootloader ID.
-        bootloader_id = self.get_bootloader_id()
+        # Read the bootloader ID, UID and flash size in one go.
+        failures = {}
+        device_properties = self.read_device_properties(failures)
+        if "bootloader_id" in failures:
+            # Don't read it again: the read already failed on its own.
+            raise failures["bootloader_id"]
+        bootloader_id = device_properties.pop("bootloader_id", None)
 
         # Now we can possibly *refine* the product: look up
         # with product ID *and* bootloader ID.
-        self.device = DEVICES.get((product_id, bootloader_id), self.device)
+        identity_registers = self._identity_registers(self.device)
+        self.set_device(DEVICES.lookup(product_id, bootloader_id))
+        if self._identity_registers(self.device) == identity_registers:
+            with self._device_properties_lock:
+                self.device_properties.update(device_properties)
+
+    def set_device(self, device):
+        """Use the given device info, e.g. from detection or a cache."""
+        self.device = device
+        self.invalidate_device_properties()
+        self._invalidate_page_cache()
+        if self.device_family is None:
+            # Device family is not manually set.
+            # Take from auto-detected info.
+            self.device_family = self.device.family.name
+        else:
+            # Device family is manually set.
+            self.debug(1, f"Device family is already set to {self.device_family}. Not updating.")
+        self.update_transfer_info()
 
-        if self.device:
-            if self.device_family is None:
-                # Device family is not manually set.
-                # Take from auto-detected info.
-                self.device_family = self.device.family.name
-            else:
-                # Device family is manually set.
-                self.debug(
-                    1, f"Device family is already set to {self.device_family}. Not updating."
-                )
-            self.update_transfer_info()
+    @staticmethod
+    def _identity_registers(device):
+        """Return a dict of identity register name: (address, length)."""
+        registers = {}
+        if device.bootloader_id_address:
+            registers["bootloader_id"] = (device.bootloader_id_address, 1)
+        if device.family.uid_address:
+            registers["uid"] = (device.family.uid_address, 12)
+        if device.family.flash_size_address:
+            registers["flash_size"] = (device.family.flash_size_address, 2)
+        return registers
+
+    def read_device_properties(self, failures=None):
+        """
+        Read bootloader ID, UID and flash size in as few reads as possible.
+
+        Registers that can't be read are left out of the result.
+
+        :param dict failures: If given, receives the read error for each
+          register name that couldn't be read.
+        :return dict: Values by name: 'bootloader_id' (int), 'uid'
+          (bytes) and 'flash_size' (int, in kilobytes).
+        """
+        registers = self._identity_registers(self.device)
+        block_registers = None
+        if self.device.flags & DeviceFlag.LONG_UID_ACCESS:
+            # Only UID and flash size need aligned block reads.
+            block_registers = [
+                register for name, register in registers.items() if name in ("uid", "flash_size")
+            ]
+        read_failures = {}
+        data = self.read_memory_batch(
+            registers.values(), block_requests=block_registers, failures=read_failures
+        )
+
+        device_properties = {}
+        for name, register in registers.items():
+            if register not in data:
+                if failures is not None and register in read_failures:
+                    failures[name] = read_failures[register]
+                continue
+            value = data[register]
+            if name == "bootloader_id":
+                value = value[0]
+            elif name == "flash_size":
+                value = value[0] + (value[1] << 8)
+            device_properties[name] = value
+        return device_properties
+
+    def read_memory_batch(self, requests, block_requests=None, failures=None):
+        """
+        Read several small memory ranges with as few reads as possible.
+
+        Ranges that are close together are read in a single READ_MEMORY
+        command. Ranges that can't be read are left out of the result.
+
+        :param requests: Iterable of (address, length) tuples.
+        :param block_requests: Requests that need an aligned block read on
+          devices with LONG_UID_ACCESS; by default, all of them.
+        :param dict failures: If given, receives the read error of each
+          request that couldn't be read.
+        :return dict: Bytes read, keyed by (address, length).
+        """
+        block_size = None
+        if self.device and self.device.flags & DeviceFlag.LONG_UID_ACCESS:
+            # These can only read whole, aligned blocks.
+            block_size = self.data_transfer_size
+
+        def read(address, length):
+            if length > self.data_transfer_size:
+                return self.read_memory_data(address, length)
+            return self.read_memory(address, length)
+
+        return read_planned(
+            read,
+            requests,
+            self.data_transfer_size,
+            block_size=block_size,
+            errors=(CommandError,),
+            block_requests=block_requests,
+            failures=failures,
+        )
 
     def get_bootloader_id(self):
         """Get the bootloader ID by reading the 'bootloader ID' register."""
@@ -697,6 +1077,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         uid_string = "-".join("".join(format(b, "02X") for b in part) for part in swapped_data)
         return uid_string
 
+    @_instrumented("READ_MEMORY")
     def read_memory(self, address, length):
         """
         Return the memory contents of flash at the given address.
@@ -710,14 +1091,43 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         nr_of_bytes = (length - 1) & 0xFF
         checksum = nr_of_bytes ^ 0xFF
         self.write_and_ack("0x11 length failed", nr_of_bytes, checksum)
-        return bytearray(self.connection.read(length))
+        return bytearray(self.read(length))
+
+    @_instrumented("GET_CHECKSUM")
+    def get_checksum(self, address, length, polynomial=CRC_POLYNOMIAL, initial=CRC_INITIAL):
+        """
+        Return the CRC32 of a memory range, calculated by the device.
+
+        The result matches verify.stm32_crc32() of the data.
 
+        :param int address: Start address, a multiple of 4.
+        :param int length: Number of bytes, a multiple of 4.
+        :param int polynomial: CRC polynomial.
+        :param int initial: Initial CRC value.
+        """
+        if address % 4 or length % 4:
+            raise DataLengthError("Checksum address and length must be multiples of 4.")
+        self.command(self.Command.GET_CHECKSUM, "Get checksum")
+        # Values are sent like addresses: big-endian, with XOR checksum.
+        self.write_and_ack("0xA1 address failed", self._encode_address(address))
+        self.write_and_ack("0xA1 size failed", self._encode_address(length // 4))
+        self.write_and_ack("0xA1 polynomial failed", self._encode_address(polynomial))
+        self.write_and_ack("0xA1 initial value failed", self._encode_address(initial))
+        self._wait_for_ack("0xA1 checksum failed")
+        reply = bytearray(self.read(5))
+        if len(reply) < 5 or reduce(operator.xor, reply[:4]) != reply[4]:
+            raise CommandError(f"Bad checksum reply: {reply.hex()}")
+        return struct.unpack(">I", reply[:4])[0]
+
+    @_instrumented("GO")
     def go(self, address):
         """Send the 'Go' command to start execution of firmware."""
         # pylint: disable=invalid-name
+        self._invalidate_page_cache()
         self.command(self.Command.GO, "Go")
         self.write_and_ack("0x21 go failed", self._encode_address(address))
 
+    @_instrumented("WRITE_MEMORY")
     def write_memory(self, address, data):
         """
         Write the given data to flash at the given address.
@@ -729,6 +1139,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             return
         if nr_of_bytes > self.data_transfer_size:
             raise DataLengthError("Can not write more than 256 bytes at once.")
+        self._invalidate_page_cache(address, address + nr_of_bytes)
         self.command(self.Command.WRITE_MEMORY, "Write memory")
         self.write_and_ack("0x31 address failed", self._encode_address(address))
 
@@ -740,7 +1151,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             data = bytearray(data)
             data.extend([0xFF] * padding_bytes)
 
-        self.debug(10, "    %s bytes to write" % [nr_of_bytes])
+        self.debug(10, "    [%d] bytes to write", nr_of_bytes)
         checksum = reduce(operator.xor, data, nr_of_bytes - 1)
         self.write_and_ack("0x31 programming failed", nr_of_bytes - 1, data, checksum)
         self.debug(10, "    Write memory done")
@@ -758,7 +1169,12 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             # Use erase with two-byte addresses instead.
             self.extended_erase_memory(pages)
             return
+        self._erase_memory(pages)
 
+    @_instrumented("ERASE")
+    def _erase_memory(self, pages):
+        """Erase flash memory with the ERASE command (one-byte addressing)."""
+        self._invalidate_erased_pages(pages)
         self.command(self.Command.ERASE, "Erase memory")
 
         if not pages and self.device_family == "L0":
@@ -786,9 +1202,11 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             self.debug(5, "Flash global erase")
             self.write(255, 0)
 
-        self._wait_for_ack("0x43 erase failed")
+        with self._erase_timeout(len(pages) if pages else None):
+            self._wait_for_ack("0x43 erase failed")
         self.debug(10, "    Erase memory done")
 
+    @_instrumented("EXTENDED_ERASE")
     def extended_erase_memory(self, pages=None):
         """
         Erase flash memory using two-byte addressing at the given pages.
@@ -806,6 +1224,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             flash_size = self.get_flash_size()
             pages = list(range(0, (flash_size * 1024) // self.flash_page_size))
 
+        self._invalidate_erased_pages(pages)
         self.command(self.Command.EXTENDED_ERASE, "Extended erase memory")
 
         if pages:
@@ -826,19 +1245,162 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
             self.write(page_count_bytes, page_bytes, checksum)
         else:
             # global mass erase: n=0xffff (page count) + checksum
-            # TO DO: support 0xfffe bank 1 erase / 0xfffe bank 2 erase
+            # For bank 1 / bank 2 erase, see erase_bank().
             self.debug(5, "Flash global erase")
-            self.write(b"\xff\xff\x00")
+            self._write_extended_erase_code(self.EXTENDED_ERASE_MASS)
 
-        previous_timeout_value = self.connection.timeout
-        self.connection.timeout = 30
-        print("Extended erase (0x44), this can take ten seconds or more")
-        try:
+        page_count = len(pages) if pages else None
+        expected_time = erase_time(self.get_flash_timing(), page_count)
+        if expected_time is None:
+            print("Extended erase (0x44), this can take ten seconds or more")
+        else:
+            print(f"Extended erase (0x44), expected to take up to {expected_time:.1f} s")
+        with self._erase_timeout(page_count, default_timeout=30):
             self._wait_for_ack("0x44 erasing failed")
-        finally:
-            self.connection.timeout = previous_timeout_value
         self.debug(10, "    Extended Erase memory done")
 
+    @_instrumented("EXTENDED_ERASE")
+    def erase_bank(self, bank):
+        """
+        Erase one flash bank of a dual-bank device.
+
+        This uses the bank erase special codes of the extended erase
+        command: the bank is erased at once, and the other bank is left
+        untouched.
+
+        :param int bank: Bank number, 1 or 2; see banks_from_range().
+        """
+        if bank not in self.EXTENDED_ERASE_BANK:
+            raise PageIndexError(f"Invalid flash bank: {bank}. Use 1 or 2.")
+        if not self.extended_erase:
+            raise CommandError("Bank erase requires the extended erase command (0x44).")
+
+        banks = self.device_properties.get("flash_banks")
+        if banks and len(banks) >= bank:
+            self._invalidate_page_cache(*banks[bank - 1])
+        else:
+            self._invalidate_page_cache()
+
+        self.command(self.Command.EXTENDED_ERASE, "Extended erase memory")
+        self.debug(5, f"Flash bank {bank} erase")
+        self._write_extended_erase_code(self.EXTENDED_ERASE_BANK[bank])
+        print(f"Extended erase (0x44) of flash bank {bank}")
+        with self._erase_timeout(None, default_timeout=30):
+            self._wait_for_ack("0x44 bank erase failed")
+        self.debug(10, "    Bank erase done")
+
+    def banks_from_range(self, start, end):
+        """
+        Return the numbers of the flash banks that overlap the memory range.
+
+        The bank layout is read from the device; see get_flash_banks().
+
+        :return list: Bank numbers, 1-based.
+        """
+        if self.device is None or not self.device.flags & DeviceFlag.DUAL_BANK:
+            raise Stm32LoaderError(
+                f"Bank erase is only supported on known dual-bank devices, not '{self.device}'."
+            )
+        flash_banks = self.get_flash_banks()
+        if len(flash_banks) < 2:
+            raise Stm32LoaderError("Can't erase a bank: the flash is in single-bank mode.")
+        banks = [
+            number
+            for number, (bank_start, bank_end) in enumerate(flash_banks, start=1)
+            if start < bank_end and end > bank_start
+        ]
+        if not banks:
+            raise PageIndexError(f"Address range 0x{start:08X} - 0x{end:08X} is outside flash.")
+        return banks
+
+    def get_flash_banks(self):
+        """
+        Return the (start, end) address range of each flash bank.
+
+        The split depends on the flash size and, for some devices, on
+        the bank mode option bit, so both are read from the device.
+        Raise Stm32LoaderError if either can't be read, or the layout
+        is unknown for the device: guessing may select the wrong bank.
+        """
+        return self._device_property("flash_banks", self._read_flash_banks)
+
+    def _read_flash_banks(self):
+        """Read the flash bank layout from the device."""
+        try:
+            flash_size = self.get_flash_size()
+        except CommandError as e:
+            raise Stm32LoaderError(f"Can't read the flash size for the bank layout: {e}") from e
+        if not flash_size:
+            raise Stm32LoaderError("Flash size is unknown; can't find the flash banks.")
+        option_word = None
+        dual_bank = self.device.dual_bank
+        if dual_bank is not None and dual_bank.option_address is not None:
+            try:
+                option_bytes = self.read_memory(dual_bank.option_address, 4)
+            except CommandError as e:
+                raise Stm32LoaderError(f"Can't read the bank mode option bit: {e}") from e
+            option_word = int.from_bytes(option_bytes, "little")
+        banks = self.device.flash_banks(flash_size, option_word)
+        if banks is None:
+            raise Stm32LoaderError(
+                f"Flash bank layout of {flash_size} KiB '{self.device}' is unknown."
+            )
+        return banks
+
+    def _write_extended_erase_code(self, code):
+        """Write a special page count of the extended erase command."""
+        code_bytes = struct.pack(">H", code)
+        self.write(code_bytes + bytes([code_bytes[0] ^ code_bytes[1]]))
+
+    def apply_command_timeout(self):
+        """
+        Tighten the connection's read timeout to what the device needs.
+
+        Do nothing without a timeout policy, or if the flash timing of
+        the device is unknown.
+        """
+        if self.timeout_policy is None:
+            return
+        timeout = self.timeout_policy.command_timeout(
+            self.get_flash_timing(), self.data_transfer_size
+        )
+        if timeout is None:
+            self.debug(5, "Flash timing unknown; keep command timeout")
+            return
+        self.debug(5, f"Command timeout: {timeout * 1000:.0f} ms")
+        self.connection.timeout = timeout
+
+    def get_flash_timing(self):
+        """Return the FlashTiming of the device or device family."""
+        if self.device is not None:
+            return self.device.family.flash_timing
+        try:
+            return DEVICE_FAMILIES[DeviceFamily[self.device_family]].flash_timing
+        except KeyError:
+            return FlashTiming()
+
+    @contextlib.contextmanager
+    def _erase_timeout(self, page_count, default_timeout=None):
+        """
+        Set the read timeout for waiting until an erase is done.
+
+        :param int page_count: Number of pages to erase; None for all.
+        :param float default_timeout: Timeout to use without a timeout
+          policy. Set to None to keep the connection's timeout.
+        """
+        timeout = default_timeout
+        if self.timeout_policy is not None:
+            timeout = self.timeout_policy.erase_timeout(self.get_flash_timing(), page_count)
+        if timeout is None:
+            yield
+            return
+        previous_timeout = self.connection.timeout
+        self.connection.timeout = timeout
+        try:
+            yield
+        finally:
+            self.connection.timeout = previous_timeout
+
     def write_protect(self, sectors=None) -> None:
         """Enable write protection on the given flash sectors."""
 
@@ -888,7 +1450,9 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
         self.command(self.Command.WRITE_PROTECT, "Write protect")
         checksum = reduce(operator.xor, sectors, num_sectors)
-        self.write_and_ack("0x63 write protect failed", num_sectors, sectors, checksum)
+        # The ACK follows the option byte erase and programming.
+        with self._erase_timeout(1):
+            self.write_and_ack("0x63 write protect failed", num_sectors, sectors, checksum)
 
         time.sleep(0.1)
         self.reset_from_system_memory()
@@ -898,7 +1462,9 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         """Disable write protection of the flash memory."""
         self.debug(10, "Disabling write protection")
         self.command(self.Command.WRITE_UNPROTECT, "Write unprotect")
-        self._wait_for_ack("0x73 write unprotect failed")
+        # The ACK follows the option byte erase and programming.
+        with self._erase_timeout(1):
+            self._wait_for_ack("0x73 write unprotect failed")
 
         time.sleep(0.1)
         self.reset_from_system_memory()
@@ -906,8 +1472,10 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
     def readout_protect(self):
         """Enable readout protection of the flash memory."""
+        self._invalidate_page_cache()
         self.command(self.Command.READOUT_PROTECT, "Readout protect")
-        self._wait_for_ack("0x82 readout protect failed")
+        with self._erase_timeout(1):
+            self._wait_for_ack("0x82 readout protect failed")
         self.debug(10, "    Read protect done")
 
     def readout_unprotect(self):
@@ -916,95 +1484,253 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
         Beware, this will erase the flash content.
         """
+        self._invalidate_page_cache()
         self.command(self.Command.READOUT_UNPROTECT, "Readout unprotect")
-        self._wait_for_ack("0x92 readout unprotect failed")
+        # The ACK follows the automatic mass erase.
+        with self._erase_timeout(None, default_timeout=30):
+            self._wait_for_ack("0x92 readout unprotect failed")
         self.debug(20, "    Mass erase -- this may take a while")
         time.sleep(20)
         self.debug(20, "    Unprotect / mass erase done")
         self.debug(20, "    Reset after automatic chip reset due to readout unprotect")
         self.reset_from_system_memory()
 
-    def read_memory_data(self, address, length):
+    def read_memory_data(self, address, length, journal=None):
         """
         Return flash content from the given address and byte count.
 
         Length may be more than 256 bytes.
+
+        :param TransferJournal journal: If given, record each chunk that
+          was read; see stm32loader.journal.
         """
+        if (
+            self.page_cache is not None
+            and journal is None
+            and self.is_flash_range(address, length)
+        ):
+            return self._read_memory_data_cached(address, length)
+
         data = bytearray()
         chunk_count = int(math.ceil(length / float(self.data_transfer_size)))
         self.debug(
-            10, "Read %7d bytes in %3d chunks at address 0x%X..." % (length, chunk_count, address)
+            10,
+            "Read %7d bytes in %3d chunks at address 0x%X...",
+            length,
+            chunk_count,
+            address,
+            logger=log.PROGRESS,
         )
         with self.show_progress("Reading", maximum=chunk_count) as progress_bar:
             while length:
                 read_length = min(length, self.data_transfer_size)
-                self.debug(
-                    10,
-                    "Read %(len)d bytes at 0x%(address)X"
-                    % {"address": address, "len": read_length},
-                )
-                data = data + self.read_memory(address, read_length)
+                self.debug(10, "Read %d bytes at 0x%X", read_length, address, logger=log.PROGRESS)
+                chunk = self._retry("Read", self.read_memory, address, read_length)
+                data += chunk
+                if journal is not None:
+                    journal.record(address, chunk)
                 progress_bar.next()
                 length = length - read_length
                 address = address + read_length
         return data
 
-    def write_memory_data(self, address, data):
+    def _read_memory_data_cached(self, address, length):
+        """Return flash content, reading only pages that are not cached."""
+        page_size = self.data_transfer_size
+        first_page = address - (address - self.device.flash.start) % page_size
+        pages = {
+            page: self.page_cache.get(page)
+            for page in range(first_page, address + length, page_size)
+        }
+        missing_pages = [page for page, page_data in pages.items() if page_data is None]
+        self.debug(
+            10,
+            "Read %7d bytes at address 0x%X, %d of %d chunks cached...",
+            length,
+            address,
+            len(pages) - len(missing_pages),
+            len(pages),
+            logger=log.PROGRESS,
+        )
+        with self.show_progress("Reading", maximum=len(missing_pages)) as progress_bar:
+            for page in missing_pages:
+                read_length = min(page_size, self.device.flash.end - page)
+                pages[page] = bytes(self._retry("Read", self.read_memory, page, read_length))
+                self.page_cache.put(page, pages[page])
+                progress_bar.next()
+
+        data = b"".join(pages.values())
+        offset = address - first_page
+        return bytearray(data[offset : offset + length])
+
+    def is_flash_range(self, address, length):
+        """Return True if the given range lies within the device's flash."""
+        if self.device is None or self.device.flash.size is None:
+            return False
+        return self.device.flash.start <= address and address + length <= self.device.flash.end
+
+    def _invalidate_page_cache(self, start=None, end=None):
+        """Drop cached flash content in the given range, or all of it."""
+        if self.page_cache is None:
+            return
+        if start is None:
+            self.page_cache.clear()
+        else:
+            self.page_cache.invalidate(start, end)
+
+    def _invalidate_erased_pages(self, pages):
+        """Drop cached flash content of the given flash pages."""
+        if self.page_cache is None:
+            return
+        page_ranges = [self.device.flash.page_range(page) for page in pages or []]
+        if not page_ranges or None in page_ranges:
+            # Global erase, or unknown page layout.
+            self.page_cache.clear()
+            return
+        for start, end in page_ranges:
+            self.page_cache.invalidate(start, end)
+
+    def write_memory_data(self, address, data, journal=None):
         """
         Write the given data to flash.
 
         Data length may be more than 256 bytes.
+
+        :param int address: Address to write the data to. Ignored if
+          data is an iterable of (address, chunk) pairs.
+        :param data: Bytes-like object (such as a memory-mapped file,
+          see stream.map_file()), binary file object, or iterable of
+          (address, chunk) pairs; see stm32loader.stream.
+        :param TransferJournal journal: If given, record each chunk that
+          was written; see stm32loader.journal.
         """
-        length = len(data)
-        chunk_count = int(math.ceil(length / float(self.data_transfer_size)))
-        offset = 0
-        self.debug(
-            5, "Write %6d bytes in %3d chunks at address 0x%X..." % (length, chunk_count, address)
-        )
+        length = stream.data_length(data)
+        if length is None and not hasattr(data, "read"):
+            chunks = stream.rechunk(data, self.data_transfer_size)
+        else:
+            chunks = stream.iter_chunks(address, data, self.data_transfer_size)
+        self.write_memory_chunks(chunks, journal=journal, length=length, address=address)
 
-        with self.show_progress("Writing", maximum=chunk_count) as progress_bar:
-            while length:
-                write_length = min(length, self.data_transfer_size)
+    def write_memory_chunks(self, chunks, journal=None, length=None, address=None):
+        """
+        Write (address, chunk) pairs of at most data_transfer_size bytes.
+
+        :param chunks: Iterable of (address, bytes-like object) pairs.
+        :param TransferJournal journal: If given, record each chunk that
+          was written; see stm32loader.journal.
+        :param int length: Total byte count, if known; for progress
+          and time estimates.
+        :param int address: Start address, if known; for messages.
+        """
+        chunk_count = 0 if length is None else math.ceil(length / self.data_transfer_size)
+        if length is None or address is None:
+            self.debug(5, "Write streamed data...", logger=log.PROGRESS)
+        else:
+            self.debug(
+                5,
+                "Write %6d bytes in %3d chunks at address 0x%X...",
+                length,
+                chunk_count,
+                address,
+                logger=log.PROGRESS,
+            )
+        if self.timeout_policy is not None and length is not None:
+            expected_time = self.timeout_policy.write_time(
+                self.get_flash_timing(), length, self.data_transfer_size
+            )
+            if expected_time is not None:
+                self.debug(5, "Expected write time: %.1f s", expected_time, logger=log.PROGRESS)
+
+        # A progress bar needs to know its maximum.
+        show_progress = self.show_progress if chunk_count else ShowProgress(None)
+        with show_progress("Writing", maximum=chunk_count) as progress_bar:
+            for chunk_address, chunk in chunks:
                 self.debug(
-                    10,
-                    "Write %(len)d bytes at 0x%(address)X"
-                    % {"address": address, "len": write_length},
+                    10, "Write %d bytes at 0x%X", len(chunk), chunk_address, logger=log.PROGRESS
                 )
-                self.write_memory(address, data[offset : offset + write_length])
+                self._retry(
+                    "Write", self.write_memory, chunk_address, chunk, done=self._is_written
+                )
+                if journal is not None:
+                    journal.record(chunk_address, chunk)
                 progress_bar.next()
-                length -= write_length
-                offset += write_length
-                address += write_length
+
+    def _retry(self, description, operation, address, *args, done=None):
+        """
+        Call the given chunk operation, retrying it as per the retry policy.
+
+        Resynchronize with the bootloader before each retry.
+
+        :param done: Optional callable with the operation's arguments;
+          if it returns True after resynchronizing, the failed attempt
+          did succeed and isn't retried.
+        """
+        retry = 0
+        while True:
+            start_time = time.monotonic()
+            try:
+                return operation(address, *args)
+            except CommandError as e:
+                if retry >= self.retry_policy.retries:
+                    raise
+                delay = self.retry_policy.delay(retry)
+                retry += 1
+                self.debug(
+                    5,
+                    f"{description} at 0x{address:08X} failed ({e});"
+                    f" retry {retry} of {self.retry_policy.retries}",
+                )
+                time.sleep(delay)
+                self.resynchronize()
+                self.retry_stats.record(time.monotonic() - start_time)
+                if self.stats is not None:
+                    self.stats.record_retry()
+                if done is not None and done(address, *args):
+                    self.debug(5, f"{description} at 0x{address:08X} did succeed")
+                    return None
+
+    def _is_written(self, address, data):
+        """
+        Return True if flash at the given address already holds the data.
+
+        A write whose ACK got lost did program the chunk; writing it again
+        is NACKed on flash that can't be reprogrammed.
+        """
+        try:
+            return self.read_memory(address, len(data)) == data
+        except CommandError:
+            return False
 
     @staticmethod
     def verify_data(read_data, reference_data):
         """
         Raise an error if the given data does not match its reference.
 
-        Error type is DataMismatchError.
+        Error type is DataMismatchError; its report attribute holds the
+        complete VerifyReport (see stm32loader.verify).
 
         :param read_data: Data to compare.
         :param reference_data: Data to compare, as reference.
         :return None:
         """
-        if read_data == reference_data:
+        report = compare(read_data, reference_data)
+        if report:
             return
 
         if len(read_data) != len(reference_data):
             raise DataMismatchError(
                 "Data length does not match: %d bytes vs %d bytes."
-                % (len(read_data), len(reference_data))
+                % (len(read_data), len(reference_data)),
+                report=report,
             )
 
-        # data differs; find out where and raise VerifyError
-        for address, data_pair in enumerate(zip(reference_data, read_data)):
-            reference_byte, read_byte = data_pair
-            if reference_byte != read_byte:
-                raise DataMismatchError(
-                    "Verification data does not match read data. "
-                    "First mismatch at address: 0x%X read 0x%X vs 0x%X expected."
-                    % (address, bytearray([read_byte])[0], bytearray([reference_byte])[0])
-                )
+        address = report.mismatches[0][0]
+        raise DataMismatchError(
+            "Verification data does not match read data. "
+            "First mismatch at address: 0x%X read 0x%X vs 0x%X expected."
+            % (address, read_data[address], reference_data[address]),
+            report=report,
+        )
 
     def pages_from_range(self, start, end):
         """Return page indices for the given memory range."""
@@ -1030,6 +1756,9 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
         """Enable or disable the reset IO line (if possible)."""
         if not hasattr(self.connection, "enable_reset"):
             return
+        if not getattr(self.connection, "TOGGLES_RESET", True):
+            # The reset line is not connected.
+            return
         self.connection.enable_reset(True)
         time.sleep(0.1)
         self.connection.enable_reset(False)
@@ -1044,7 +1773,7 @@ class Stm32Bootloader:  # pylint: disable=too-many-instance-attributes
 
     def _wait_for_ack(self, info=""):
         """Read a byte and raise CommandError if it's not ACK."""
-        read_data = bytearray(self.connection.read())
+        read_data = bytearray(self.read())
         if not read_data:
             raise CommandError("Can't read port or timeout")
         reply = read_data[0]
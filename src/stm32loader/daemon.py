@@ -0,0 +1,340 @@
+"""
+Keep bootloader sessions open and run jobs submitted over a Unix socket.
+
+Bringing up a bootloader session (reset, synchronize, device detection)
+takes most of a second. The daemon pays this once per serial port and
+then serves any number of jobs on the open session.
+
+Protocol: the client sends one JSON object per line, for example
+
+    {"op": "write", "address": 134217728, "file": "/tmp/firmware.bin"}
+
+Supported operations: erase, write, verify, read, go and shutdown.
+After go, the device runs its firmware, so the session is closed; the
+next job on that port opens a new one.
+Binary data is passed either as a file path on the daemon's host
+("file") or base64-encoded ("data"). A job may name a "port" to run
+on a session other than the default one. An optional "id" is copied
+into each reply.
+
+For each job, the daemon replies with any number of progress events,
+followed by exactly one result or error event; each is a JSON object on
+its own line:
+
+    {"event": "progress", "message": "Writing", "index": 3, "max": 20}
+    {"event": "result", "op": "write", "length": 5000}
+"""
+
+import base64
+import json
+import mmap
+import os
+import socket
+import socketserver
+import threading
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+from stm32loader import stream
+from stm32loader.bootloader import DataMismatchError, ShowProgress, Stm32LoaderError
+
+
+class _JobProgressBar:
+    """Report progress bar updates as events to the client."""
+
+    def __init__(self, send_event, message, max, suffix=None):  # pylint: disable=redefined-builtin
+        """Construct the progress bar; compatible to progress.bar.Bar."""
+        del suffix
+        self.send_event = send_event
+        self.message = message
+        self.maximum = max
+        self.index = 0
+
+    def next(self):
+        """Send a progress event."""
+        self.index += 1
+        self.send_event(
+            {
+                "event": "progress",
+                "message": self.message,
+                "index": self.index,
+                "max": self.maximum,
+            }
+        )
+
+    def finish(self):
+        """Do nothing; be compatible to progress.bar.Bar."""
+
+
+class BootloaderSession:
+    """Run jobs on an open Stm32Bootloader, one at a time."""
+
+    OPERATIONS = ("erase", "write", "verify", "read", "go")
+
+    def __init__(self, stm32):
+        """
+        Construct a session around a bootloader with a detected device.
+
+        :param Stm32Bootloader stm32: Bootloader that is activated and
+          has its device detected.
+        """
+        self.stm32 = stm32
+        self.lock = threading.Lock()
+
+    def run(self, job, send_event):
+        """Execute the given job and return its result as a dict."""
+        operation = job["op"]
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation!r}")
+        for field in ("address", "length"):
+            value = job.get(field)
+            # Check before sending a command the bootloader can't complete.
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+                raise ValueError(f"Job field {field!r} must be an integer, not {value!r}")
+        handler = getattr(self, f"_{operation}")
+
+        with self.lock:
+            previous_show_progress = self.stm32.show_progress
+            self.stm32.show_progress = ShowProgress(partial(_JobProgressBar, send_event))
+            try:
+                return handler(job)
+            finally:
+                self.stm32.show_progress = previous_show_progress
+
+    def close(self):
+        """Start the firmware and close the connection."""
+        with self.lock:
+            self.stm32.reset_from_flash()
+            self._disconnect()
+
+    def disconnect(self):
+        """Close the connection, leaving the device as it is."""
+        with self.lock:
+            self._disconnect()
+
+    def _disconnect(self):
+        if hasattr(self.stm32.connection, "disconnect"):
+            self.stm32.connection.disconnect()
+
+    def _erase(self, job):
+        if job.get("length") is None:
+            self.stm32.erase_memory(pages=None)
+            return {"pages": None}
+        start = job["address"]
+        pages = self.stm32.pages_from_range(start, start + job["length"])
+        self.stm32.erase_memory(pages)
+        return {"pages": len(pages)}
+
+    def _write(self, job):
+        with _job_data(job) as data:
+            self.stm32.write_memory_data(job["address"], data)
+            return {"length": len(data)}
+
+    def _verify(self, job):
+        with _job_data(job) as data:
+            read_data = self.stm32.read_memory_data(job["address"], len(data))
+            try:
+                self.stm32.verify_data(read_data, data)
+            except DataMismatchError as e:
+                return {"length": len(data), "verified": False, "message": str(e)}
+            return {"length": len(data), "verified": True}
+
+    def _read(self, job):
+        data = self.stm32.read_memory_data(job["address"], job["length"])
+        if "file" in job:
+            Path(job["file"]).write_bytes(data)
+            return {"length": len(data), "file": job["file"]}
+        return {"length": len(data), "data": base64.b64encode(data).decode("ascii")}
+
+    def _go(self, job):
+        self.stm32.go(job["address"])
+        return {"address": job["address"]}
+
+
+@contextmanager
+def _job_data(job):
+    """
+    Provide the binary data to write or verify for the given job.
+
+    Memory-mapped files are unmapped when the job is done, instead of
+    whenever the view happens to be garbage collected.
+    """
+    if "data" in job:
+        yield base64.b64decode(job["data"])
+        return
+    file_path = Path(job["file"])
+    if file_path.suffix == ".hex":
+        from stm32loader import hexfile  # pylint: disable=import-outside-toplevel
+
+        yield hexfile.load_hex(file_path)
+        return
+    data = stream.map_file(file_path)
+    mapping = data.obj
+    try:
+        yield data
+    finally:
+        data.release()
+        if isinstance(mapping, mmap.mmap):
+            try:
+                mapping.close()
+            except BufferError:
+                # A slice is still referenced; unmapped when it's collected.
+                pass
+
+
+class _JobRequestHandler(socketserver.StreamRequestHandler):
+    """Read jobs from a client connection and stream back events."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            job = {}
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    job = {}
+                    raise ValueError("A job must be a JSON object")
+                result = self.server.session_daemon.handle_job(
+                    job, partial(self.send_event, job_id=job.get("id"))
+                )
+            except (Stm32LoaderError, OSError, KeyError, ValueError, TypeError) as e:
+                self.send_event(
+                    {"event": "error", "message": f"{type(e).__name__}: {e}"}, job.get("id")
+                )
+                continue
+            self.send_event({"event": "result", "op": job["op"], **result}, job.get("id"))
+
+    def send_event(self, event, job_id=None):
+        """Send the given event to the client as a line of JSON."""
+        if job_id is not None:
+            event["id"] = job_id
+        self.wfile.write(json.dumps(event).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class SessionDaemon:
+    """Serve bootloader jobs on a Unix socket, keeping sessions open."""
+
+    def __init__(self, socket_path, session_factory, default_port=None):
+        """
+        Construct the daemon; call serve_forever() to start serving.
+
+        :param socket_path: File system path of the Unix socket.
+        :param session_factory: Callable which takes a port name and
+          returns an activated Stm32Bootloader with a detected device.
+        :param str default_port: Port to use for jobs without a "port".
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            raise Stm32LoaderError("Daemon mode requires Unix domain socket support.")
+
+        self.socket_path = Path(socket_path)
+        self.session_factory = session_factory
+        self.default_port = default_port
+        self.sessions = {}
+        self._sessions_lock = threading.Lock()
+        # Held while opening the session of a port, by port.
+        self._port_locks = {}
+        self._server = None
+
+    def session(self, port):
+        """
+        Return the session for the given port, opening it if needed.
+
+        Opening a session takes a while; only jobs for the same port wait
+        for it.
+        """
+        with self._sessions_lock:
+            if port in self.sessions:
+                return self.sessions[port]
+            port_lock = self._port_locks.setdefault(port, threading.Lock())
+
+        with port_lock:
+            with self._sessions_lock:
+                if port in self.sessions:
+                    # Opened by another job in the meantime.
+                    return self.sessions[port]
+            try:
+                stm32 = self.session_factory(port)
+            except SystemExit as e:
+                # Stm32Loader exits when it can't activate the bootloader.
+                raise Stm32LoaderError(f"Can't open bootloader session on {port}") from e
+            session = BootloaderSession(stm32)
+            with self._sessions_lock:
+                self.sessions[port] = session
+            return session
+
+    def handle_job(self, job, send_event):
+        """Run the given job on its session and return its result."""
+        if job["op"] == "shutdown":
+            # Request shutdown from outside of serve_forever's thread.
+            threading.Thread(target=self.shutdown).start()
+            return {}
+
+        port = job.get("port", self.default_port)
+        result = self.session(port).run(job, send_event)
+        if job["op"] == "go":
+            # The device left the bootloader; don't keep a dead session.
+            self.drop_session(port)
+        return result
+
+    def drop_session(self, port):
+        """Forget the session for the given port and close its connection."""
+        with self._sessions_lock:
+            session = self.sessions.pop(port, None)
+        if session is not None:
+            session.disconnect()
+
+    def serve_forever(self):
+        """Listen on the socket and handle jobs until shutdown() is called."""
+        if self.socket_path.exists():
+            # Stale socket from a previous run.
+            self.socket_path.unlink()
+
+        # Jobs read and write files as the daemon user: only allow the owner,
+        # from the moment the socket exists.
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(  # pylint: disable=no-member
+                str(self.socket_path), _JobRequestHandler
+            )
+        finally:
+            os.umask(previous_umask)
+        self._server.daemon_threads = True
+        self._server.session_daemon = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+            self.close_sessions()
+
+    def shutdown(self):
+        """Stop serving; make serve_forever() return."""
+        if self._server:
+            self._server.shutdown()
+
+    def close_sessions(self):
+        """Close all open sessions, starting the firmware on each device."""
+        with self._sessions_lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+def submit_job(socket_path, job):
+    """
+    Send the given job to a running daemon and yield its reply events.
+
+    Stop after the job's result or error event.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:  # pylint: disable=no-member
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(job).encode("utf-8") + b"\n")
+        with client.makefile("rb") as replies:
+            for line in replies:
+                event = json.loads(line)
+                yield event
+                if event["event"] in ("result", "error"):
+                    return
@@ -0,0 +1,140 @@
+"""
+Remember device detection results per serial port.
+
+Detecting the device type and reading its UID and flash size takes
+several bootloader round trips, which give the same answer every time
+the same board is connected to the same port. The cache stores these
+results and reuses them after a single round trip has confirmed that
+the board is still the same one.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from stm32loader.bootloader import CommandError
+
+
+def default_cache_path():
+    """Return the cache file path, honoring $XDG_CACHE_HOME."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "stm32loader" / "detection.json"
+
+
+def _encode_uid(uid):
+    """Return the UID as JSON-compatible value (hex string or int status)."""
+    if isinstance(uid, int):
+        return uid
+    return bytes(uid).hex()
+
+
+class DetectionCache:
+    """Store detected device type, flash size and UID per serial port."""
+
+    def __init__(self, path=None):
+        """
+        Construct the cache; it is not read until it's used.
+
+        :param path: Path of the JSON cache file. Defaults to
+          default_cache_path().
+        """
+        self.path = Path(path) if path else default_cache_path()
+
+    def load(self, port):
+        """Return the cache entry for the given port, or None."""
+        return self._read_all().get(port)
+
+    def forget(self, port):
+        """Remove the cache entry for the given port."""
+        entries = self._read_all()
+        if entries.pop(port, None) is not None:
+            self._write_all(entries)
+
+    def store(self, stm32, port, bootloader_version):
+        """
+        Store the detection results of the given bootloader.
+
+        Don't store anything if the flash size or UID can't be read.
+        """
+        try:
+            flash_size = stm32.get_flash_size()
+            uid = stm32.get_uid()
+        except CommandError:
+            return
+
+        entries = self._read_all()
+        entries[port] = {
+            "bootloader_version": bootloader_version,
+            "supported_commands": sorted(stm32.supported_commands),
+            "product_id": stm32.device.product_id,
+            "bootloader_id": stm32.device.bootloader_id,
+            "flash_size": flash_size,
+            "uid": _encode_uid(uid),
+        }
+        self._write_all(entries)
+
+    def restore(self, stm32, port, bootloader_version):
+        """
+        Apply the cached detection results to the given bootloader.
+
+        Require that the bootloader version and supported commands (as
+        returned by get()) match the cache entry. Then confirm the board
+        identity with one round trip: read the UID if the device has one,
+        else the product ID.
+
+        Forget the entry if anything does not match.
+
+        :return bool: True if the cached results were applied.
+        """
+        # pylint: disable=import-outside-toplevel
+        from stm32loader.devices import DEVICES
+
+        entry = self.load(port)
+        if entry is None:
+            return False
+
+        device = DEVICES.lookup(entry["product_id"], entry["bootloader_id"])
+        if (
+            device is None
+            or entry["bootloader_version"] != bootloader_version
+            or entry["supported_commands"] != sorted(stm32.supported_commands)
+        ):
+            self.forget(port)
+            return False
+
+        previous_device_family = stm32.device_family
+        stm32.set_device(device)
+        try:
+            if isinstance(entry["uid"], str):
+                identical = _encode_uid(stm32.get_uid()) == entry["uid"]
+            else:
+                identical = stm32.get_product_id() == entry["product_id"]
+        except CommandError:
+            identical = False
+
+        if not identical:
+            # Undo set_device().
+            stm32.device = None
+            stm32.invalidate_device_properties()
+            stm32.device_family = previous_device_family
+            stm32.update_transfer_info()
+            self.forget(port)
+            return False
+
+        stm32.device_properties["flash_size"] = entry["flash_size"]
+        if not isinstance(entry["uid"], str):
+            stm32.device_properties["uid"] = entry["uid"]
+        return True
+
+    def _read_all(self):
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_all(self, entries):
+        # Write to a temporary file and rename, to never leave a partial file.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        temporary_path.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+        os.replace(temporary_path, self.path)
@@ -52,6 +52,50 @@ class DeviceFlag(enum.IntEnum):
     # requires some data extraction.
     LONG_UID_ACCESS = 8
     FORCE_PARITY_NONE = 16
+    # Flash is split in two banks of equal size, which the extended erase
+    # command can erase individually.
+    DUAL_BANK = 32
+
+
+class FlashTiming:  # pylint: disable=too-few-public-methods
+    """
+    Hold the maximum flash erase and program times of a device family.
+
+    Values are taken from the 'Flash memory characteristics' table of
+    the data sheets, in seconds. Use None when unknown.
+    """
+
+    __slots__ = (
+        "page_erase_time",
+        "sector_erase_time",
+        "mass_erase_time",
+        "word_program_time",
+        "word_size",
+    )
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        page_erase_time=None,
+        sector_erase_time=None,
+        mass_erase_time=None,
+        word_program_time=None,
+        word_size=4,
+    ):
+        """
+        Construct FlashTiming.
+
+        :param float page_erase_time: Time to erase one (uniform) page.
+        :param float sector_erase_time: Time to erase the largest sector,
+          for families with sectors of different sizes.
+        :param float mass_erase_time: Time to erase all flash.
+        :param float word_program_time: Time to program one word.
+        :param int word_size: Number of bytes programmed at once.
+        """
+        self.page_erase_time = page_erase_time
+        self.sector_erase_time = sector_erase_time
+        self.mass_erase_time = mass_erase_time
+        self.word_program_time = word_program_time
+        self.word_size = word_size
 
 
 class DeviceFamilyInfo:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
@@ -68,6 +112,7 @@ class DeviceFamilyInfo:  # pylint: disable=too-few-public-methods,too-many-insta
         option_bytes=None,
         bootloader_id_address=None,
         flags=DeviceFlag.NONE,
+        flash_timing=None,
     ):
         self.name = name
         self.uid_address = uid_address
@@ -78,6 +123,7 @@ class DeviceFamilyInfo:  # pylint: disable=too-few-public-methods,too-many-insta
         self.option_bytes = option_bytes
         self.bootloader_id_address = bootloader_id_address
         self.family_default_flags = flags
+        self.flash_timing = flash_timing or FlashTiming()
 
 
 DEVICE_FAMILIES = {
@@ -87,6 +133,9 @@ DEVICE_FAMILIES = {
         "F0",
         flash_size_address=0x_1FFF_F7CC,
         option_bytes=(0x_1FFF_F800, 0x_1FFF_F80F),
+        flash_timing=FlashTiming(
+            page_erase_time=0.040, mass_erase_time=0.040, word_program_time=60e-6, word_size=2
+        ),
     ),
     # RM0008
     DeviceFamily.F1: DeviceFamilyInfo(
@@ -94,6 +143,9 @@ DEVICE_FAMILIES = {
         uid_address=0x_1FFF_F7E8,
         flash_size_address=0x_1FFF_F7E0,
         option_bytes=(0x_1FFF_F800, 0x_1FFF_F80F),
+        flash_timing=FlashTiming(
+            page_erase_time=0.040, mass_erase_time=0.040, word_program_time=70e-6, word_size=2
+        ),
     ),
     # RM0033
     DeviceFamily.F2: DeviceFamilyInfo(
@@ -108,6 +160,9 @@ DEVICE_FAMILIES = {
         flash_size_address=0x_1FFF_F7CC,
         flash_page_size=2048,
         bootloader_id_address=0x_1FFF_F796,
+        flash_timing=FlashTiming(
+            page_erase_time=0.040, mass_erase_time=0.040, word_program_time=70e-6, word_size=2
+        ),
     ),
     # RM0090, RM0390, RM0383, RM0402, RM0401, RM0368, RM0430, RM0386
     DeviceFamily.F4: DeviceFamilyInfo(
@@ -116,6 +171,10 @@ DEVICE_FAMILIES = {
         flash_size_address=0x_1FFF_7A22,
         bootloader_id_address=0x_1FFF_76DE,
         flags=DeviceFlag.LONG_UID_ACCESS,
+        # Sector erase: 128 KiB sector at x32 parallelism.
+        flash_timing=FlashTiming(
+            sector_erase_time=4.0, mass_erase_time=32.0, word_program_time=100e-6
+        ),
     ),
     # RM0385, RM0431
     DeviceFamily.F7: DeviceFamilyInfo(
@@ -123,16 +182,28 @@ DEVICE_FAMILIES = {
         uid_address=0x_1FF0_F420,
         flash_size_address=0x_1FF0_F442,
         bootloader_id_address=0x_1FF0_EDBE,
+        # Sector erase: 256 KiB sector at x32 parallelism.
+        flash_timing=FlashTiming(
+            sector_erase_time=4.0, mass_erase_time=32.0, word_program_time=100e-6
+        ),
     ),
     # RM0444
     DeviceFamily.G0: DeviceFamilyInfo(
-        "G0", uid_address=0x_1FFF_7590, flash_size_address=0x_1FFF_75E0
+        "G0",
+        uid_address=0x_1FFF_7590,
+        flash_size_address=0x_1FFF_75E0,
+        flash_timing=FlashTiming(
+            page_erase_time=0.040, mass_erase_time=0.040, word_program_time=125e-6, word_size=8
+        ),
     ),
     DeviceFamily.G4: DeviceFamilyInfo(
         "G4",
         uid_address=0x1FFF7590,
         flash_size_address=0x1FFF75E0,
         bootloader_id_address=0x_1FFF_6FFE,
+        flash_timing=FlashTiming(
+            page_erase_time=0.040, mass_erase_time=0.040, word_program_time=90e-6, word_size=8
+        ),
     ),
     DeviceFamily.H5: DeviceFamilyInfo(
         "H5",
@@ -143,6 +214,10 @@ DEVICE_FAMILIES = {
         uid_address=0x_1FF1_E800,
         flash_size_address=0x_1FF1_E880,
         flash_page_size=128 * 1024,
+        # Program time per 256-bit flash word.
+        flash_timing=FlashTiming(
+            sector_erase_time=4.0, mass_erase_time=16.0, word_program_time=200e-6, word_size=32
+        ),
     ),
     # FIXME TWO RMs?
     # RM0451, RM4510
@@ -154,6 +229,7 @@ DEVICE_FAMILIES = {
         flash_page_size=128,
         mass_erase=False,
         flags=DeviceFlag.LONG_UID_ACCESS,
+        flash_timing=FlashTiming(page_erase_time=0.0032, word_program_time=3.2e-3),
     ),
     DeviceFamily.L1: DeviceFamilyInfo("L1", mass_erase=False),
     # RM0394
@@ -162,6 +238,9 @@ DEVICE_FAMILIES = {
         uid_address=0x_1FFF_7590,
         flash_size_address=0x_1FFF_75E0,
         bootloader_id_address=0x_1FFF_6FFE,
+        flash_timing=FlashTiming(
+            page_erase_time=0.0245, mass_erase_time=0.0245, word_program_time=90e-6, word_size=8
+        ),
     ),
     DeviceFamily.L5: DeviceFamilyInfo(
         "L5",
@@ -10,8 +10,29 @@ kB = 1024  # pylint: disable=invalid-name
 class DeviceInfo:  # pylint: disable=too-many-instance-attributes
     """Hold info about an STM32 device."""
 
+    __slots__ = (
+        "family",
+        "device_name",
+        "product_id",
+        "bootloader_id",
+        "variant",
+        "product_line",
+        "ram",
+        "flash",
+        "system_memory",
+        "option_bytes",
+        "flags",
+        "bootloader_id_address",
+        "write_protect_supported",
+        "dual_bank",
+    )
+
     write_protect_supported: bool
 
+    # Address ranges are (start, end) tuples. The end address of ram,
+    # flash and system memory is exclusive; that of option bytes is
+    # inclusive, as listed in the reference manuals.
+
     def __init__(  # pylint: disable=too-many-positional-arguments,too-many-arguments
         self,
         device_family,
@@ -27,6 +48,7 @@ class DeviceInfo:  # pylint: disable=too-many-instance-attributes
         bootloader_id_address=None,
         flags=DeviceFlag.NONE,
         write_protect_supported=False,
+        dual_bank=None,
     ):
         self.family = DEVICE_FAMILIES[DeviceFamily[device_family]]
         self.device_name = device_name
@@ -41,6 +63,7 @@ class DeviceInfo:  # pylint: disable=too-many-instance-attributes
         self.flags = flags | self.family.family_default_flags
         self.bootloader_id_address = bootloader_id_address or self.family.bootloader_id_address
         self.write_protect_supported = write_protect_supported
+        self.dual_bank = dual_bank
 
     @property
     def ram_size(self):
@@ -67,6 +90,20 @@ class DeviceInfo:  # pylint: disable=too-many-instance-attributes
         """Return the device's flash memory size in bytes."""
         return self.flash.size
 
+    def flash_banks(self, flash_size, option_word):
+        """
+        Return the (start, end) address range of each flash bank.
+
+        :param int flash_size: Flash size in KiB, as read from the device.
+        :param int option_word: Option word holding the bank mode bits,
+          as read from the device; see DualBank.option_address.
+        :return list: One range per bank, or None if the bank layout
+          is not known for this flash size.
+        """
+        if not self.flags & DeviceFlag.DUAL_BANK:
+            return [(self.flash.start, self.flash.start + flash_size * kB)]
+        return self.dual_bank.banks(self.flash.start, flash_size, option_word)
+
     @property
     def system_memory_size(self):
         """Return the size of the system memory in bytes."""
@@ -99,9 +136,55 @@ class DeviceInfo:  # pylint: disable=too-many-instance-attributes
         return f"DeviceInfo(device_name={self.device_name!r}, variant={self.product_line!r})"
 
 
+class DualBank:  # pylint: disable=too-few-public-methods
+    """
+    Describe how a dual-bank device splits its flash.
+
+    Parts with the same product ID come with different flash sizes, and
+    some only use two banks when an option bit (DB1M, DBANK, DUALBANK)
+    is set. The split can't be derived from the device table alone.
+    """
+
+    __slots__ = ("option_address", "modes", "bank2_start")
+
+    def __init__(self, option_address, modes, bank2_start=None):
+        """
+        Construct a DualBank.
+
+        :param int option_address: Address of the 32-bit option word with
+          the bank mode bits, or None.
+        :param dict modes: Bank mode per flash size in KiB: True for
+          always dual-bank, False for single-bank, or the option word
+          bits that must be set for dual-bank mode.
+        :param int bank2_start: Start address of bank 2, if it's fixed;
+          by default, bank 2 follows bank 1.
+        """
+        self.option_address = option_address
+        self.modes = modes
+        self.bank2_start = bank2_start
+
+    def banks(self, flash_start, flash_size, option_word):
+        """
+        Return the (start, end) address range of each flash bank.
+
+        :return list: One range per bank, or None if the layout for this
+          flash size or option word isn't known.
+        """
+        mode = self.modes.get(flash_size)
+        if mode is None or (not isinstance(mode, bool) and option_word is None):
+            return None
+        size = flash_size * kB
+        if mode is False or (mode is not True and option_word & mode != mode):
+            return [(flash_start, flash_start + size)]
+        bank2_start = self.bank2_start or flash_start + size // 2
+        return [(flash_start, flash_start + size // 2), (bank2_start, bank2_start + size // 2)]
+
+
 class Flash:  # pylint: disable=too-few-public-methods
     """Represent info about a device's flash layout."""
 
+    __slots__ = ("start", "end", "page_size", "pages_per_sector", "max_write_protection_sectors")
+
     start: int | None
     end: int | None
     page_size: int | list[int] | None
@@ -168,6 +251,24 @@ class Flash:  # pylint: disable=too-few-public-methods
             f"Flash size: {self.size}, total page size: {sum(self.page_size)}"
         )
 
+    def page_range(self, page) -> tuple[int, int] | None:
+        """Return the (start, end) address range of the given page index."""
+        if self.start is None or self.page_size is None:
+            return None
+
+        if isinstance(self.page_size, int):
+            start = self.start + page * self.page_size
+            end = start + self.page_size
+        elif page < len(self.page_size):
+            start = self.start + sum(self.page_size[:page])
+            end = start + self.page_size[page]
+        else:
+            return None
+
+        if self.end is not None and end > self.end:
+            return None
+        return start, end
+
     def num_sectors(self) -> int | None:
         """Return the number of sectors in the flash memory."""
         num_pages = self.num_pages()
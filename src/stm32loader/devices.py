@@ -1,13 +1,181 @@
 """Offer information about the various STM32 device families."""
 
-from stm32loader.device_family import DeviceFlag
-from stm32loader.device_info import DeviceInfo, Flash
+from collections.abc import Mapping
+
+from stm32loader.device_family import DeviceFamily, DeviceFlag
+from stm32loader.device_info import DeviceInfo, DualBank, Flash
 
 # pylint: disable=too-many-lines
 
 
 kB = 1024  # pylint: disable=invalid-name
 
+# Bank mode option bits, as read from the option bytes.
+F4_DB1M = 1 << 14
+L4_DUALBANK = 1 << 21
+L4R_DB1M = 1 << 21
+DBANK = 1 << 22
+
+F4_DUAL_BANK = DualBank(0x_1FFF_C008, {512: False, 1024: F4_DB1M, 2048: True})
+
+
+class DeviceSpec:  # pylint: disable=too-few-public-methods
+    """
+    Hold the constructor arguments of a DeviceInfo until it is needed.
+
+    Building all DeviceInfo objects at import time is wasted effort: a
+    single run only ever needs one of them.
+    """
+
+    __slots__ = (
+        "device_family",
+        "device_name",
+        "product_id",
+        "bootloader_id",
+        "details",
+        "device",
+    )
+
+    def __init__(self, device_family, device_name, pid, bid, **details):
+        """Record the arguments for DeviceInfo(); see there for details."""
+        self.device_family = device_family
+        self.device_name = device_name
+        self.product_id = pid
+        self.bootloader_id = bid
+        self.details = details
+        # The DeviceInfo, once built.
+        self.device = None
+
+    @property
+    def full_name(self):
+        """Return the name including variant and product line."""
+        name = self.device_name
+        for suffix in (self.details.get("variant"), self.details.get("line")):
+            if suffix:
+                name += f"-{suffix}"
+        return name
+
+    def build(self):
+        """Return the DeviceInfo object, constructing it on first use."""
+        if self.device is None:
+            self.device = DeviceInfo(
+                self.device_family,
+                self.device_name,
+                self.product_id,
+                self.bootloader_id,
+                **self.details,
+            )
+        return self.device
+
+
+class DeviceIndex(Mapping):
+    """
+    Map (product ID, bootloader ID) to DeviceInfo, building devices on lookup.
+
+    Each product ID is also registered with bootloader ID None, pointing
+    to the first device with that product ID.
+    """
+
+    def __init__(self, specs):
+        """Index the given DeviceSpec objects."""
+        self._specs = {(spec.product_id, spec.bootloader_id): spec for spec in specs}
+        for spec in specs:
+            self._specs.setdefault((spec.product_id, None), spec)
+
+    def __getitem__(self, key):
+        return self._specs[key].build()
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self):
+        return len(self._specs)
+
+    def lookup(self, product_id, bootloader_id=None):
+        """
+        Return the device with the given IDs, or None if it's unknown.
+
+        Fall back to the device with matching product ID if the
+        bootloader ID is not known.
+        """
+        spec = self._specs.get((product_id, bootloader_id)) or self._specs.get((product_id, None))
+        if spec is None:
+            return None
+        return spec.build()
+
+    def find(self, specifier):
+        """
+        Return the single device matching the given name or IDs.
+
+        The specifier is either a name as understood by by_name(), or a
+        product ID with optional bootloader ID, e.g. '0x410' or '0x413:0x91'.
+
+        Raise KeyError if the specifier is unknown or ambiguous.
+        """
+        try:
+            ids = [int(part, 0) for part in specifier.split(":")]
+        except ValueError:
+            devices = self.by_name(specifier)
+        else:
+            if len(ids) == 1:
+                ids.append(None)
+            device = self.get(tuple(ids))
+            devices = [device] if device else []
+
+        if not devices:
+            raise KeyError(f"Unknown device: {specifier!r}")
+        if len(devices) > 1:
+            candidates = ", ".join(
+                f"0x{dev.product_id:03X}:0x{dev.bootloader_id:02X}"
+                for dev in devices
+                if dev.bootloader_id is not None
+            )
+            raise KeyError(
+                f"Device name {specifier!r} is ambiguous; use product and bootloader ID"
+                f" instead: {candidates}"
+            )
+        return devices[0]
+
+    def by_family(self, family):
+        """Return all devices of the given family, e.g. 'F1'."""
+        family_name = family.value if isinstance(family, DeviceFamily) else family.upper()
+        return [
+            spec.build() for spec in self._unique_specs() if spec.device_family == family_name
+        ]
+
+    def by_name(self, name):
+        """
+        Return all devices with the given name, ignoring case.
+
+        Match either the device name (e.g. 'STM32F10xxx') or the full name
+        including variant and product line ('STM32F10xxx-Medium-density').
+        """
+        name = name.lower()
+        return [
+            spec.build()
+            for spec in self._unique_specs()
+            if name in (spec.device_name.lower(), spec.full_name.lower())
+        ]
+
+    def product_names(self, names=None):
+        """
+        Return a dict of product ID to device name, without building devices.
+
+        :param dict names: Names that take precedence over the device
+          table, by product ID.
+        """
+        names = names or {}
+        return {
+            product_id: names.get(product_id, self._specs[(product_id, None)].device_name)
+            for product_id, bootloader_id in self._specs
+            if bootloader_id is None
+        }
+
+    def _unique_specs(self):
+        """Return all specs once, ignoring the bootloader ID None aliases."""
+        return list(dict.fromkeys(self._specs.values()))
+
+
 DEVICE_DETAILS = [
     # Based on ST AN2606 section "Device-dependent bootloader parameters".
     # Flash range, option bytes and flags gleaned from
@@ -29,7 +197,7 @@ DEVICE_DETAILS = [
     # 0x492 STM32WBA52xx/54xx/55xx
     # 0x4B0 STM32WBA62xx/64xx/65xx
     # FIXME flash?
-    DeviceInfo(
+    DeviceSpec(
         "C0",
         "STM32C011xx",
         0x443,
@@ -41,7 +209,7 @@ DEVICE_DETAILS = [
     ),
     # FIXME flash?
     # Error in AN2606? Ram is mentioned as 0x_2000_2000 - 0x_2000_17FF
-    DeviceInfo(
+    DeviceSpec(
         "C0",
         "STM32C031xx",
         0x453,
@@ -51,7 +219,7 @@ DEVICE_DETAILS = [
         flash=None,
         option=None,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F05xxx/030x8",
         0x440,
@@ -63,7 +231,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F7A6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F03xx4/6",
         0x444,
@@ -76,7 +244,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x442 ?
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F030xC",
         0x442,
@@ -90,7 +258,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x445 ?
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F04xxx",
         0x445,
@@ -102,7 +270,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F6A6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F070x6",
         0x445,
@@ -115,7 +283,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x448 ?
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F070xB",
         0x448,
@@ -127,7 +295,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F6A6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F071xx/072xx",
         0x448,
@@ -139,7 +307,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F6A6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F0",
         "STM32F09xxx",
         0x442,
@@ -152,7 +320,7 @@ DEVICE_DETAILS = [
         flags=DeviceFlag.OBL_LAUNCH,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F10xxx",
         line="Low-density",
@@ -164,7 +332,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F10xxx",
         line="Medium-density",
@@ -176,7 +344,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F10xxx",
         line="High-density",
@@ -187,7 +355,7 @@ DEVICE_DETAILS = [
         flash=(0x_0800_0000, 0x_0808_0000, 2 * kB, 2),
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F10xxx",
         line="Medium-density value",
@@ -200,7 +368,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F7D6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F10xxx",
         line="High-density value",
@@ -213,7 +381,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F7D6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F105xx/107xx",
         line="Connectivity",
@@ -225,7 +393,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F10xxx",
         line="XL-density",
@@ -239,7 +407,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x411 ?
-    DeviceInfo(
+    DeviceSpec(
         "F2",
         "STM32F2xxxx",
         0x411,
@@ -250,7 +418,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F2",
         "STM32F2xxxx",
         0x411,
@@ -262,7 +430,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x432 ?
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F373xx",
         0x432,
@@ -274,7 +442,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_F7A6,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F378xx",
         0x432,
@@ -287,7 +455,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x422 ?
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F302xB(C)/303xB(C)",
         0x422,
@@ -298,7 +466,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F358xx",
         0x422,
@@ -310,7 +478,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x439 ?
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F301xx/302x4(6/8)",
         0x439,
@@ -321,7 +489,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F318xx",
         0x439,
@@ -332,7 +500,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F303x4(6/8)/334xx/328xx",
         0x438,
@@ -344,7 +512,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x446 ?
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F302xD(E)/303xD(E)",
         0x446,
@@ -355,7 +523,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_F800, 0x_1FFF_F80F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F3",
         "STM32F398xx",
         0x446,
@@ -367,7 +535,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x413 ?
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F40xxx/41xxx",
         0x413,
@@ -378,7 +546,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         bootloader_id_address=0x_1FFF_77DE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F40xxx/41xxx",
         0x413,
@@ -391,7 +559,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x419 ?
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F42xxx/43xxx",
         0x419,
@@ -400,8 +568,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7800),
         flash=(0x_0800_0000, 0x_0820_0000, Flash.F4_DUAL_BANK_PAGE_SIZE),
         option=(0x_1FFE_C000, 0x_1FFF_C00F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=F4_DUAL_BANK,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F42xxx/43xxx",
         0x419,
@@ -410,9 +580,11 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7800),
         flash=(0x_0800_0000, 0x_0820_0000, Flash.F4_DUAL_BANK_PAGE_SIZE),
         option=(0x_1FFE_C000, 0x_1FFF_C00F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=F4_DUAL_BANK,
     ),
     # FIXME Check RAM upper end.
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F401xB(C)",
         0x423,
@@ -423,7 +595,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F401xD(E)",
         0x433,
@@ -434,7 +606,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F410xx",
         0x458,
@@ -445,7 +617,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F411xx",
         0x431,
@@ -456,7 +628,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F412xx",
         0x441,
@@ -467,7 +639,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F446xx",
         0x421,
@@ -478,7 +650,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F469xx/479xx",
         0x434,
@@ -487,8 +659,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7800),
         flash=(0x_0800_0000, 0x_0820_0000, Flash.F4_DUAL_BANK_PAGE_SIZE),
         option=(0x_1FFE_C000, 0x_1FFF_C00F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=F4_DUAL_BANK,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F4",
         "STM32F413xx/423xx",
         0x463,
@@ -498,7 +672,7 @@ DEVICE_DETAILS = [
         flash=(0x_0800_0000, 0x_0818_0000, Flash.F4_EXTENDED_PAGE_SIZE),
         option=(0x_1FFF_C000, 0x_1FFF_C00F),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F7",
         "STM32F72xxx/73xxx",
         0x452,
@@ -510,7 +684,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x449 ?
-    DeviceInfo(
+    DeviceSpec(
         "F7",
         "STM32F74xxx/75xxx",
         0x449,
@@ -521,7 +695,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_0000, 0x_1FFF_001F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F7",
         "STM32F74xxx/75xxx",
         0x449,
@@ -532,7 +706,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_0000, 0x_1FFF_001F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "F7",
         "STM32F76xxx/77xxx",
         0x451,
@@ -543,7 +717,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_0000, 0x_1FFF_001F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "G0",
         "STM32G03xxx/04xxx",
         0x466,
@@ -555,7 +729,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_1FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "G0",
         "STM32G07xxx/08xxx",
         0x460,
@@ -569,7 +743,7 @@ DEVICE_DETAILS = [
     ),
     # FIXME different flash size for both devices with PID=0x467 ?
     # FIXME dual banks for system
-    DeviceInfo(
+    DeviceSpec(
         "G0",
         "STM32G0B0xx",
         0x467,
@@ -581,7 +755,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_9FFE,
     ),
     # FIXME dual banks for system
-    DeviceInfo(
+    DeviceSpec(
         "G0",
         "STM32G0B1xx/0C1xx",
         0x467,
@@ -593,7 +767,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_9FFE,
     ),
     # FIXME: STM32flash has 0x_2000_4800 as upper system range.
-    DeviceInfo(
+    DeviceSpec(
         "G0",
         "STM32G05xxx/061xx",
         0x456,
@@ -604,7 +778,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_7800, 0x_1FFF_787F),
         bootloader_id_address=0x_1FFF_1FFE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "G4",
         "STM32G431xx/441xx",
         0x468,
@@ -614,7 +788,7 @@ DEVICE_DETAILS = [
         flash=(0x_0800_0000, 0x_0802_0000, 2 * kB),
         option=(0x_1FFF_7800, 0x_1FFF_782F),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "G4",
         "STM32G47xxx/48xxx",
         0x469,
@@ -623,8 +797,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7000),
         flash=(0x_0800_0000, 0x_0808_0000, 2 * kB),
         option=(0x_1FFF_7800, 0x_1FFF_782F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=DualBank(0x_1FFF_7800, {128: DBANK, 256: DBANK, 512: DBANK}, 0x_0804_0000),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "G4",
         "STM32G491xx/A1xx",
         0x479,
@@ -635,7 +811,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_7800, 0x_1FFF_782F),
     ),
     # FIXME Flash and option bytes?
-    DeviceInfo(
+    DeviceSpec(
         "H5",
         "STM32H503xx",
         0x474,
@@ -645,7 +821,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_0BF8_FFFE,
     ),
     # FIXME Flash and option bytes?
-    DeviceInfo(
+    DeviceSpec(
         "H5",
         "STM32H563xx/573xx",
         0x484,
@@ -654,7 +830,7 @@ DEVICE_DETAILS = [
         system=(0x_0BF9_7000, 0x_0BFA_0000),
         bootloader_id_address=0x_0BF9_FAFE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "H7",
         "STM32H72xxx/73xxx",
         0x483,
@@ -666,7 +842,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF1_E7FE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "H7",
         "STM32H74xxx/75xxx",
         0x450,
@@ -676,9 +852,11 @@ DEVICE_DETAILS = [
         flash=(0x_0800_0000, 0x_0820_0000, 128 * kB, 1),
         option=None,
         bootloader_id_address=0x_1FF1_E7FE,
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=DualBank(None, {128: False, 1024: True, 2048: True}, 0x_0810_0000),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "H7",
         "STM32H7A3xx/B3xx",
         0x480,
@@ -689,7 +867,7 @@ DEVICE_DETAILS = [
         option=None,
         bootloader_id_address=0x_1FF1_3FFE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L0",
         "STM32L01xxx/02xxx",
         0x457,
@@ -701,7 +879,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_0FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L0",
         "STM32L031xx/041xx",
         0x425,
@@ -713,7 +891,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_0FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L0",
         "STM32L05xxx/06xxx",
         0x417,
@@ -727,7 +905,7 @@ DEVICE_DETAILS = [
     ),
     # FIXME different flash size for both devices with PID=0x447 ?
     # Note: STM32flash has 0x_2000_2000 as lower system range.
-    DeviceInfo(
+    DeviceSpec(
         "L0",
         "STM32L07xxx/08xxx",
         0x447,
@@ -739,7 +917,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_1FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L0",
         "STM32L07xxx/08xxx",
         0x447,
@@ -751,7 +929,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_1FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L1",
         "STM32L1xxx6(8/B)",
         line="Medium-density ULP",
@@ -764,7 +942,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_0FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L1",
         "STM32L1xxx6(8/B)A",
         0x429,
@@ -776,7 +954,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_0FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L1",
         "STM32L1xxxC",
         0x427,
@@ -788,7 +966,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_1FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L1",
         "STM32L1xxxD",
         0x436,
@@ -800,7 +978,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FF0_1FFE,
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L1",
         "STM32L1xxxE",
         0x437,
@@ -813,7 +991,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # Note: Stm32flash has 0x_2000_3100 as ram start.
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L412xx/422xx",
         line="Low-density",
@@ -825,7 +1003,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_7800, 0x_1FFF_780F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L43xxx/44xxx",
         0x435,
@@ -836,7 +1014,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_7800, 0x_1FFF_780F),
         write_protect_supported=True,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L45xxx/46xxx",
         0x462,
@@ -849,7 +1027,7 @@ DEVICE_DETAILS = [
         write_protect_supported=True,
     ),
     # FIXME different flash size for both devices with PID=0x415 ?
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L47xxx/48xxx",
         0x415,
@@ -858,8 +1036,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7000),
         flash=(0x_0800_0000, 0x_0810_0000, 2 * kB),
         option=(0x_1FFF_7800, 0x_1FFF_F80F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=DualBank(0x_1FFF_7800, {256: L4_DUALBANK, 512: L4_DUALBANK, 1024: True}),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L47xxx/48xxx",
         0x415,
@@ -868,8 +1048,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7000),
         flash=(0x_0800_0000, 0x_0810_0000, 2 * kB),
         option=(0x_1FFF_7800, 0x_1FFF_F80F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=DualBank(0x_1FFF_7800, {256: L4_DUALBANK, 512: L4_DUALBANK, 1024: True}),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L496xx/4A6xx",
         0x461,
@@ -878,8 +1060,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7000),
         flash=(0x_0800_0000, 0x_0810_0000, 2 * kB),
         option=(0x_1FFF_7800, 0x_1FFF_F80F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=DualBank(0x_1FFF_7800, {512: L4_DUALBANK, 1024: True}),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L4Rxx/4Sxx",
         0x470,
@@ -888,8 +1072,10 @@ DEVICE_DETAILS = [
         system=(0x_1FFF_0000, 0x_1FFF_7000),
         flash=(0x_0800_0000, 0x_0810_0000, 2 * kB),
         option=(0x_1FFF_7800, 0x_1FFF_F80F),
+        flags=DeviceFlag.DUAL_BANK,
+        dual_bank=DualBank(0x_1FFF_7800, {1024: DBANK | L4R_DB1M, 2048: DBANK}),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L4",
         "STM32L4P5xx/Q5xx",
         0x471,
@@ -899,7 +1085,7 @@ DEVICE_DETAILS = [
         flash=(0x_0800_0000, 0x_0810_0000, 4 * kB),
         option=(0x_1FF0_0000, 0x_1FF0_000F),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "L5",
         "STM32L552xx/562xx",
         0x472,
@@ -911,7 +1097,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_0BF9_7FFE,
     ),
     # FIXME flash config ?
-    DeviceInfo(
+    DeviceSpec(
         "WBA",
         "STM32WBA52xx",
         0x492,
@@ -920,7 +1106,7 @@ DEVICE_DETAILS = [
         system=(0x_0BF8_8000, 0x_0BF9_0000),
         bootloader_id_address=0x_0BF8_FEFE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "WB",
         "STM32WB10xx/15xx",
         0x494,
@@ -931,7 +1117,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_7800, 0x_1FFF_787F),
         bootloader_id_address=0x_1FFF_6FFE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "WB",
         "STM32WB30xx/35xx/50xx/55xx",
         0x495,
@@ -942,7 +1128,7 @@ DEVICE_DETAILS = [
         option=(0x_1FFF_8000, 0x_1FFF_807F),
         bootloader_id_address=0x_1FFF_6FFE,
     ),
-    DeviceInfo(
+    DeviceSpec(
         "WL",
         "STM32WLE5xx/WL55xx",
         0x497,
@@ -954,7 +1140,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_1FFF_3EFE,
     ),
     # FIXME flash config?
-    DeviceInfo(
+    DeviceSpec(
         "U5",
         "STM32U535xx/545xx",
         0x455,
@@ -964,7 +1150,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_0BF9_9EFE,
     ),
     #
-    DeviceInfo(
+    DeviceSpec(
         "U5",
         "STM32U575xx/585xx",
         0x482,
@@ -976,7 +1162,7 @@ DEVICE_DETAILS = [
         bootloader_id_address=0x_0BF9_9EFE,
     ),
     # FIXME flash config?
-    DeviceInfo(
+    DeviceSpec(
         "U5",
         "STM32U595xx/599xx/5A9xx",
         0x481,
@@ -988,7 +1174,7 @@ DEVICE_DETAILS = [
     # Not yet in AN2606.  Bootloader IDs are unknown.
     # Assumption: 'Medium-density performance' refers to F1 series, and F103.
     # FIXME No bootloader ID address?
-    DeviceInfo(
+    DeviceSpec(
         "F1",
         "STM32F103x8/B",
         line="Medium-density performance",
@@ -1001,7 +1187,7 @@ DEVICE_DETAILS = [
     ),
     # WBA, WB, WL or simply 'W'?
     # FIXME bootloader ID address?
-    DeviceInfo(
+    DeviceSpec(
         "W",
         "STM32W",
         variant="128kB",
@@ -1012,7 +1198,7 @@ DEVICE_DETAILS = [
         flash=(0x_0800_0000, 0x_0802_0000, 1 * kB, 4),
         option=(0x_0804_0800, 0x_0804_080F),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "W",
         "STM32W",
         variant="256kB",
@@ -1024,7 +1210,7 @@ DEVICE_DETAILS = [
         option=(0x_0804_0800, 0x_0804_080F),
     ),
     # ST BlueNRG
-    DeviceInfo(
+    DeviceSpec(
         "NRG",
         "BlueNRG-1",
         pid=0x03,
@@ -1033,7 +1219,7 @@ DEVICE_DETAILS = [
         system=(0x_1000_0000, 0x_1000_0800),
         flash=(0x_1004_0000, 0x_1006_8000, 2 * kB),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "NRG",
         "BlueNRG-2",
         pid=0x2F,
@@ -1042,7 +1228,7 @@ DEVICE_DETAILS = [
         system=(0x_1000_0000, 0x_1000_0800),
         flash=(0x_1004_0000, 0x_1008_0000, 2 * kB),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "NRG",
         "STM32WB06/07 (BlueNRG-LP)",
         pid=0x3F,
@@ -1051,7 +1237,7 @@ DEVICE_DETAILS = [
         system=(0x_1000_0000, 0x_1000_1800),
         flash=(0x_1004_0000, 0x_1008_0000, 2 * kB),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "NRG",
         "STM32WB05 (BlueNRG-LPS)",
         pid=0x3B,
@@ -1060,7 +1246,7 @@ DEVICE_DETAILS = [
         system=(0x_1000_0000, 0x_1000_1800),
         flash=(0x_1004_0000, 0x_1007_0000, 2 * kB),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "NRG",
         "STM32WB09",
         pid=0x06,
@@ -1069,7 +1255,7 @@ DEVICE_DETAILS = [
         system=(0x_1000_0000, 0x_1000_1800),
         flash=(0x_1004_0000, 0x_100C_0000, 2 * kB),
     ),
-    DeviceInfo(
+    DeviceSpec(
         "NRG",
         "STM32WL3x",
         pid=0x5F,
@@ -1079,14 +1265,14 @@ DEVICE_DETAILS = [
         flash=(0x_1004_0000, 0x_1008_0000, 2 * kB),
     ),
     # Wiznet W7500
-    DeviceInfo("WIZ", "Wiznet W7500", 0x801, bid=None, ram=None, system=None),
+    DeviceSpec("WIZ", "Wiznet W7500", 0x801, bid=None, ram=None, system=None),
     # GigaDevice GD32VW553 series
     # Uses 0x06 command to get part number (pid is 4-byte ASCII
     # in little-endian).
     # Find these pid in GD32_ISP_CLI(Linux)->libGD_MCU_DLL.so
     # ->BuildMap_GD32103
     # pid "6KIP" = 0x36 0x4B 0x49 0x50 -> 0x50494B36
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553KIQ6",
         pid=0x50494B36,
@@ -1094,10 +1280,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08200000, 4 * kB),  # 2MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "6KMP" = 0x36 0x4B 0x4D 0x50 -> 0x504D4B36
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553KMQ6",
         pid=0x504D4B36,
@@ -1105,10 +1291,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08400000, 4 * kB),  # 4MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "6HIP" = 0x36 0x48 0x49 0x50 -> 0x50494836
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553HIQ6",
         pid=0x50494836,
@@ -1116,10 +1302,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08200000, 4 * kB),  # 2MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "6HMP" = 0x36 0x48 0x4D 0x50 -> 0x504D4836
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553HMQ6",
         pid=0x504D4836,
@@ -1127,10 +1313,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08400000, 4 * kB),  # 4MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "7KIP" = 0x37 0x4B 0x49 0x50 -> 0x50494B37
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553KIQ7",
         pid=0x50494B37,
@@ -1138,10 +1324,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08200000, 4 * kB),  # 2MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "7KMP" = 0x37 0x4B 0x4D 0x50 -> 0x504D4B37
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553KMQ7",
         pid=0x504D4B37,
@@ -1149,10 +1335,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08400000, 4 * kB),  # 4MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "7HIP" = 0x37 0x48 0x49 0x50 -> 0x50494837
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553HIQ7",
         pid=0x50494837,
@@ -1160,10 +1346,10 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08200000, 4 * kB),  # 2MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
     # pid "7HMP" = 0x37 0x48 0x4D 0x50 -> 0x504D4837
-    DeviceInfo(
+    DeviceSpec(
         "GD32VW55X",
         "GD32VW553HMQ7",
         pid=0x504D4837,
@@ -1171,14 +1357,58 @@ DEVICE_DETAILS = [
         ram=(0x20000000, 0x20050000),  # 320KB
         system=(0x0BF40000, 0x0BF80000),
         flash=(0x08000000, 0x08400000, 4 * kB),  # 4MB, 4KB pages
-        option=(0x0FFC0000, 0x0FFC0100),
+        option=(0x0FFC0000, 0x0FFC00FF),
     ),
 ]
 
-DEVICES = {(dev.product_id, dev.bootloader_id): dev for dev in DEVICE_DETAILS}
+DEVICES = DeviceIndex(DEVICE_DETAILS)
 
-# If devices are not yet registered with bootloader_id == None, then do so.
-for device in DEVICE_DETAILS:
-    if (device.product_id, None) in DEVICES:
-        continue
-    DEVICES[(device.product_id, None)] = device
+# Device names of stm32loader.bootloader.CHIP_IDS, as they were before the
+# device table existed.
+CHIP_ID_NAMES = {
+    0x412: "STM32F10x Low-density",
+    0x444: "STM32F03xx4/6",
+    0x410: "STM32F10x Medium-density",
+    0x420: "STM32F10x Medium-density value line",
+    0x460: "STM32G0x1",
+    0x468: "STM32G431xx/STM32G441xx",
+    0x469: "STM32G47xxx/48xxx",
+    0x414: "STM32F10x High-density",
+    0x428: "STM32F10x High-density value line",
+    0x430: "STM3210xx XL-density",
+    0x417: "STM32L05xxx/06xxx",
+    0x416: "STM32L1xxx6(8/B) Medium-density ultralow power line",
+    0x411: "STM32F2xxx",
+    0x433: "STM32F4xxD/E",
+    0x432: "STM32F373xx/378xx",
+    0x422: "STM32F302xB(C)/303xB(C)/358xx",
+    0x439: "STM32F301xx/302x4(6/8)/318xx",
+    0x438: "STM32F303x4(6/8)/334xx/328xx",
+    0x446: "STM32F302xD(E)/303xD(E)/398xx",
+    0x413: "STM32F405xx/07xx and STM32F415xx/17xx",
+    0x419: "STM32F42xxx and STM32F43xxx",
+    0x452: "STM32F72xxx/73xxx",
+    0x449: "STM32F74xxx/75xxx",
+    0x451: "STM32F76xxx/77xxx",
+    0x483: "STM32H72xxx/73xxx",
+    0x450: "STM32H74xxx/75xxx",
+    0x480: "STM32H7A3xx/B3xx",
+    0x435: "STM32L4xx",
+    0x000003: "BlueNRG-1 160kB",
+    0x00002F: "BlueNRG-2 256kB",
+    0x440: "STM32F030x8",
+    0x445: "STM32F070x6",
+    0x448: "STM32F070xB",
+    0x442: "STM32F030xC",
+    0x457: "STM32L01xxx/02xxx",
+    0x497: "STM32WLE5xx/WL55xx",
+    0x801: "Wiznet W7500",
+    0x50494B36: "GD32VW553KIQ6",
+    0x504D4B36: "GD32VW553KMQ6",
+    0x50494836: "GD32VW553HIQ6",
+    0x504D4836: "GD32VW553HMQ6",
+    0x50494B37: "GD32VW553KIQ7",
+    0x504D4B37: "GD32VW553KMQ7",
+    0x50494837: "GD32VW553HIQ7",
+    0x504D4837: "GD32VW553HMQ7",
+}
@@ -1,8 +1,11 @@
 """Fake bootloader connection for testing purposes."""
 
 import struct
+from functools import reduce
+from operator import xor
 
 from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.verify import stm32_crc32
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-many-positional-arguments
@@ -23,21 +26,24 @@ class FakeConnection:
         #   0x11=READ_MEMORY 0x31=WRITE_MEMORY
         #   0x43=ERASE 0x44=EXTENDED_ERASE
         Command.GET: [7, 0x05, [0x0, 0x01, 0x02, 0x11, 0x31, 0x43, 0x44], ACK],
+        # Version 5, option bytes
+        Command.GET_VERSION: [[0x05, 0x00, 0x00], ACK],
         # Product ID: 0x422
         Command.GET_ID: [1, [0x04, 0x22]],
     }
 
-    READ_RESPONSES = {
-        # Read flash size, F1.
-        (0x_1FFF_F7E0, 2): [[0x00, 0x01]],
-        # Read flash size, F3.
-        (0x_1FFF_F7CC, 2): [[0x00, 0x01]],
-        # Read device UID, F1.
-        (0x_1FFF_F7E8, 12): [[1, 0, 3, 2, 7, 6, 5, 4, 0xB, 0xA, 9, 8]],
-        # Read device UID, F3.
-        (0x_1FFF_F7AC, 12): [[1, 0, 3, 2, 7, 6, 5, 4, 0xB, 0xA, 9, 8]],
-        # Read Bootloader ID.
-        (0x_1FFF_F796, 1): [0x41],
+    # Contents of system memory and device registers, by address.
+    SYSTEM_MEMORY = {
+        # Flash size, F1.
+        0x_1FFF_F7E0: [0x00, 0x01],
+        # Flash size, F3.
+        0x_1FFF_F7CC: [0x00, 0x01],
+        # Device UID, F1.
+        0x_1FFF_F7E8: [1, 0, 3, 2, 7, 6, 5, 4, 0xB, 0xA, 9, 8],
+        # Device UID, F3.
+        0x_1FFF_F7AC: [1, 0, 3, 2, 7, 6, 5, 4, 0xB, 0xA, 9, 8],
+        # Bootloader ID.
+        0x_1FFF_F796: [0x41],
     }
 
     def __init__(self):
@@ -48,6 +54,14 @@ class FakeConnection:
         self.flash_offset = 0x_0800_0000
         self.flash_size = 2 * 1024 * 1024
         self.flash_memory = bytearray(2 * 1024 * 1024)
+        self.ram_offset = 0x_2000_0000
+        self.ram_memory = bytearray(64 * 1024)
+        self.go_address = None
+        self.system_memory = {
+            address + offset: value
+            for address, values in self.SYSTEM_MEMORY.items()
+            for offset, value in enumerate(values)
+        }
 
         # Start coroutine.
         next(self.receiver)
@@ -63,6 +77,7 @@ class FakeConnection:
 
             # No CRC is sent for SYNCHRONIZE
             if command_value == self.Command.SYNCHRONIZE:
+                self.ack()
                 continue
 
             # Receive CRC byte.
@@ -92,8 +107,15 @@ class FakeConnection:
                     self.next_return.append(
                         list(self.flash_memory[flash_offset : flash_offset + length])
                     )
+                elif self.ram_offset <= address < self.ram_offset + len(self.ram_memory):
+                    ram_offset = address - self.ram_offset
+                    self.next_return.append(
+                        list(self.ram_memory[ram_offset : ram_offset + length])
+                    )
                 else:
-                    self.next_return.extend(self.READ_RESPONSES[(address, length)])
+                    self.next_return.append(
+                        [self.system_memory.get(address + i, 0xFF) for i in range(length)]
+                    )
             elif command_value == self.Command.EXTENDED_ERASE.value:
                 pages_bytes = yield
                 pages = struct.unpack(">H", pages_bytes[0:2])
@@ -113,9 +135,34 @@ class FakeConnection:
                     f"Length does not match byte count: {len(data)} vs {byte_count}"
                 )
 
-                # Record data in flash memory.
-                flash_offset = address - 0x_0800_0000
-                self.flash_memory[flash_offset : flash_offset + byte_count] = data
+                if self.ram_offset <= address < self.ram_offset + len(self.ram_memory):
+                    ram_offset = address - self.ram_offset
+                    self.ram_memory[ram_offset : ram_offset + byte_count] = data
+                else:
+                    # Record data in flash memory.
+                    flash_offset = address - 0x_0800_0000
+                    self.flash_memory[flash_offset : flash_offset + byte_count] = data
+                # Don't hold on to the caller's buffer until the next write.
+                del data
+
+            elif command_value == self.Command.GET_CHECKSUM.value:
+                address = struct.unpack(">I", (yield)[0:4])[0]
+                word_count = struct.unpack(">I", (yield)[0:4])[0]
+                _polynomial = yield
+                initial = struct.unpack(">I", (yield)[0:4])[0]
+                flash_offset = address - self.flash_offset
+                crc = stm32_crc32(
+                    self.flash_memory[flash_offset : flash_offset + 4 * word_count], initial
+                )
+                crc_bytes = list(struct.pack(">I", crc))
+                self.next_return.extend(
+                    [self.ACK, self.ACK, crc_bytes + [reduce(xor, crc_bytes)]]
+                )
+
+            elif command_value == self.Command.GO.value:
+                address_bytes = yield
+                self.go_address = struct.unpack(">I", address_bytes[0:4])[0]
+                self.ack()
 
             elif command_value == self.Command.WRITE_PROTECT.value:
                 number_of_pages_bytes = yield
@@ -155,6 +202,7 @@ class FakeConfiguration:
         self.erase = erase
         self.write = write
         self.read = False
+        self.snapshot = None
         self.verify = verify
         self.write_protect = write_protect
         self.write_unprotect = write_unprotect
@@ -166,3 +214,21 @@ class FakeConfiguration:
         self.address = 0x_0800_0000
         self.go_address = None
         self.family = family
+        self.port = None
+        self.fast_connect = False
+        self.tight_timeouts = False
+        self.bank_erase = False
+        self.dry_run = False
+        self.protocol_log = None
+        self.record_trace = None
+        self.verify_diff = None
+        self.stub = False
+        self.no_reset = False
+        self.verify_checksum = False
+        self.ram = False
+        self.stats = False
+        self.baud = 115200
+        self.resume = False
+        self.cache_detection = False
+        self.device = None
+        self.check_device_id = False
@@ -0,0 +1,180 @@
+"""Emulated flashing stub, to test the stub protocol without hardware."""
+
+import struct
+import zlib
+
+from stm32loader.emulated.fake import FakeConnection
+from stm32loader.stub import CRC, REQUEST, SYNC, Opcode, Status, encode_reply
+
+# pylint: disable=missing-function-docstring
+
+
+class StubEmulator:
+    """
+    Emulate the device side of the stub protocol, as a connection.
+
+    Like the real stub, acknowledge a WRITE frame when it is received and
+    program it when the next frame arrives, reporting programming errors
+    in the next reply.
+    """
+
+    PAGE_SIZE = 2048
+
+    def __init__(self, flash_memory, flash_offset=0x_0800_0000, max_payload=4096):
+        """
+        Construct a StubEmulator.
+
+        :param bytearray flash_memory: Flash content; modified in place.
+        :param int flash_offset: Address of the first flash byte.
+        :param int max_payload: Frame payload size to announce.
+        """
+        self.flash_memory = flash_memory
+        self.flash_offset = flash_offset
+        self.max_payload = max_payload
+        self.timeout = 2
+        # Address to fail programming at, to test error reports.
+        self.fail_address = None
+        self.frames = []
+        self._input = bytearray()
+        self._output = bytearray()
+        self._pending_write = None
+        self._error_address = None
+
+    def write(self, data):
+        self._input += data
+        while len(self._input) >= REQUEST.size + CRC.size:
+            _sync, _opcode, _sequence, _zero, _address, length = REQUEST.unpack_from(self._input)
+            frame_size = REQUEST.size + length + CRC.size
+            if len(self._input) < frame_size:
+                break
+            frame = bytes(self._input[:frame_size])
+            del self._input[:frame_size]
+            self._handle(frame)
+        return len(data)
+
+    def read(self, length=1):
+        data = bytes(self._output[:length])
+        del self._output[:length]
+        return data
+
+    def _handle(self, frame):
+        sync, opcode, sequence, _zero, address, length = REQUEST.unpack_from(frame)
+        payload = frame[REQUEST.size : REQUEST.size + length]
+        (checksum,) = CRC.unpack_from(frame, REQUEST.size + length)
+        self.frames.append((opcode, address, length))
+        if sync != SYNC or checksum != zlib.crc32(frame[: REQUEST.size + length]):
+            self._reply(opcode, sequence, Status.CRC_ERROR)
+            return
+
+        # Program the buffered frame while this one was received.
+        self._program_pending()
+        if self._error_address is not None:
+            self._reply(opcode, sequence, Status.FLASH_ERROR, self._error_address)
+            return
+
+        if opcode == Opcode.HELLO:
+            self._reply(opcode, sequence, Status.OK, self.max_payload)
+        elif opcode == Opcode.WRITE:
+            if not self._in_flash(address, length) or length > self.max_payload:
+                self._reply(opcode, sequence, Status.BAD_ADDRESS, address)
+                return
+            self._pending_write = (address, payload)
+            self._reply(opcode, sequence, Status.OK)
+        elif opcode == Opcode.FLUSH:
+            self._reply(opcode, sequence, Status.OK)
+        elif opcode == Opcode.ERASE:
+            (erase_length,) = struct.unpack("<I", payload)
+            if not self._in_flash(address, erase_length):
+                self._reply(opcode, sequence, Status.BAD_ADDRESS, address)
+                return
+            start = address - self.flash_offset
+            start -= start % self.PAGE_SIZE
+            end = address - self.flash_offset + erase_length
+            end += -end % self.PAGE_SIZE
+            self.flash_memory[start:end] = b"\xff" * (end - start)
+            self._reply(opcode, sequence, Status.OK)
+        elif opcode == Opcode.CHECKSUM:
+            (checksum_length,) = struct.unpack("<I", payload)
+            if not self._in_flash(address, checksum_length):
+                self._reply(opcode, sequence, Status.BAD_ADDRESS, address)
+                return
+            start = address - self.flash_offset
+            crc = zlib.crc32(self.flash_memory[start : start + checksum_length])
+            self._reply(opcode, sequence, Status.OK, crc)
+        else:
+            self._reply(opcode, sequence, Status.BAD_REQUEST)
+
+    def _program_pending(self):
+        if self._pending_write is None:
+            return
+        address, payload = self._pending_write
+        self._pending_write = None
+        if self.fail_address is not None and address <= self.fail_address < address + len(
+            payload
+        ):
+            self._error_address = self.fail_address
+            return
+        start = address - self.flash_offset
+        self.flash_memory[start : start + len(payload)] = payload
+
+    def _in_flash(self, address, length):
+        return self.flash_offset <= address and address + length <= self.flash_offset + len(
+            self.flash_memory
+        )
+
+    def _reply(self, opcode, sequence, status, value=0):
+        self._output += encode_reply(opcode, sequence, status, value)
+
+
+class StubDevice(FakeConnection):
+    """
+    Emulate a device that runs the given stub image after GO.
+
+    Until GO, behave like FakeConnection. If GO starts the stub image,
+    hand the connection over to a StubEmulator on the same flash. Any
+    other code doesn't respond. A reset returns to the bootloader.
+    """
+
+    TOGGLES_RESET = True
+
+    def __init__(self, stub_image=None):
+        super().__init__()
+        self.stub_image = stub_image
+        self.stub = None
+        self.running = False
+
+    def enable_reset(self, enable=True):
+        if enable:
+            # Back to the bootloader.
+            self.stub = None
+            self.running = False
+            self.next_return = []
+            self.receiver = self.receive()
+            next(self.receiver)
+
+    def write(self, data):
+        if self.stub is not None:
+            return self.stub.write(data)
+        if self.running:
+            return len(data)
+        super().write(data)
+        if self.go_address is not None:
+            self._start(self.go_address)
+            self.go_address = None
+        return len(data)
+
+    def read(self, length=1):
+        if self.next_return or (self.stub is None and not self.running):
+            # Bootloader replies, including the ACK of GO.
+            return super().read(length)
+        if self.stub is not None:
+            return self.stub.read(length)
+        return b""
+
+    def _start(self, address):
+        offset = address - self.ram_offset
+        code = bytes(self.ram_memory[offset : offset + len(self.stub_image or b"")])
+        if self.stub_image and code == self.stub_image:
+            self.stub = StubEmulator(self.flash_memory, self.flash_offset)
+        else:
+            self.running = True
@@ -2,11 +2,6 @@
 
 from stm32loader.bootloader import MissingDependencyError
 
-try:
-    import intelhex
-except ImportError:
-    intelhex = None
-
 
 def load_hex(file_path: str) -> bytes:
     """
@@ -14,10 +9,13 @@ def load_hex(file_path: str) -> bytes:
 
     Addresses should start at zero and always increment.
     """
-    if intelhex is None:
+    # Import on first use: intelhex is optional and slow to import.
+    try:
+        import intelhex  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
         raise MissingDependencyError(
             "Please install package 'intelhex' in order to read .hex files."
-        )
+        ) from e
 
     hex_content = intelhex.IntelHex()
     hex_content.loadhex(str(file_path))
@@ -0,0 +1,177 @@
+"""
+Record the progress of long transfers, so they can be resumed.
+
+Writing or reading a few megabytes over a UART takes minutes. When the
+transfer is interrupted (crash, bumped cable), the journal tells which
+chunks were done, and a new run can continue from there.
+
+The journal is a JSON-lines file: a header with the transfer's key (the
+device UID, operation, address, length and image hash), followed by one
+line per finished chunk. Lines are only appended, and synced to disk
+once per batch of chunks. Chunks after the last sync may be lost on a
+crash; they're verified or transferred again when resuming.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from stm32loader.detection_cache import default_cache_path
+
+
+def default_journal_directory():
+    """Return the directory for journal files, honoring $XDG_CACHE_HOME."""
+    return default_cache_path().parent / "journal"
+
+
+def transfer_key(operation, uid, address, length, data=None):
+    """
+    Return a dict identifying a transfer.
+
+    :param str operation: 'write' or 'read'.
+    :param str uid: Formatted device UID (or another device identity).
+    :param int address: Start address of the transfer.
+    :param int length: Number of bytes to transfer.
+    :param bytes data: Data to write; only its hash is kept.
+    """
+    key = {"operation": operation, "uid": uid, "address": address, "length": length}
+    if data is not None:
+        key["sha256"] = hashlib.sha256(data).hexdigest()
+    return key
+
+
+class TransferJournal:
+    """Append-only journal of the finished chunks of a transfer."""
+
+    def __init__(self, key, directory=None, sync_interval=16, output_file=None):
+        """
+        Construct the journal; call open() before recording chunks.
+
+        :param dict key: Identification of the transfer, see transfer_key().
+        :param directory: Directory to store the journal file in.
+          Defaults to default_journal_directory().
+        :param int sync_interval: Number of chunks to record between syncs.
+        :param output_file: Binary file object opened for writing. If
+          given, record() stores each chunk's data in it, at the chunk's
+          offset from the transfer's start address (for reads).
+        """
+        self.key = key
+        self.sync_interval = sync_interval
+        self.output_file = output_file
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+        self.path = Path(directory or default_journal_directory()) / f"{digest[:16]}.jsonl"
+        self.chunks = []
+        self._file = None
+        self._unsynced = 0
+
+    def load(self):
+        """Read the chunks recorded by an earlier run of the same transfer."""
+        self.chunks = []
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return self.chunks
+        try:
+            if not lines or json.loads(lines[0]).get("key") != self.key:
+                return self.chunks
+            for line in lines[1:]:
+                start, end = json.loads(line)["done"]
+                self.chunks.append((start, end))
+        except (ValueError, KeyError, TypeError):
+            # A crash may leave a partial last line; keep what was complete.
+            pass
+        return self.chunks
+
+    def confirmed_length(self):
+        """Return the number of bytes done, contiguous from the start."""
+        end = self.key["address"]
+        for start, chunk_end in sorted(self.chunks):
+            if start > end:
+                break
+            end = max(end, chunk_end)
+        return end - self.key["address"]
+
+    def open(self, resume=True):
+        """
+        Open the journal for recording.
+
+        :param bool resume: Keep the chunks of an earlier run (as read
+          by load()); else start a new journal.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.chunks:
+            self._file = self.path.open("a", encoding="utf-8")
+            return
+        self.chunks = []
+        self._file = self.path.open("w", encoding="utf-8")
+        self._file.write(json.dumps({"key": self.key}) + "\n")
+        self.sync()
+
+    def record(self, address, data):
+        """Record that the chunk of data at the given address is done."""
+        if self.output_file is not None:
+            self.output_file.seek(address - self.key["address"])
+            self.output_file.write(data)
+        self._file.write(json.dumps({"done": [address, address + len(data)]}) + "\n")
+        self.chunks.append((address, address + len(data)))
+        self._unsynced += 1
+        if self._unsynced >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Write recorded chunks (and their data) to disk."""
+        if self.output_file is not None:
+            self.output_file.flush()
+            os.fsync(self.output_file.fileno())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """Sync and close the journal; keep it for a later resume."""
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    def finish(self):
+        """Close and remove the journal; the transfer is complete."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+def resume_write_offset(stm32, journal, data):
+    """
+    Return the offset in data from which to continue an interrupted write.
+
+    Chunks recorded after the journal's last sync may have been lost,
+    and the chunk that was in flight may be partially written. Read back
+    these uncertain chunks and continue at the first one that doesn't
+    match the data.
+
+    :return int: Offset to continue writing from, or None if the flash
+      holds other data where it should be erased; the write can't be
+      resumed then.
+    """
+    confirmed_length = journal.confirmed_length()
+    if not confirmed_length:
+        return 0
+
+    address = journal.key["address"]
+    chunk_size = stm32.data_transfer_size
+    check_start = max(0, confirmed_length - journal.sync_interval * chunk_size)
+    check_start -= check_start % chunk_size
+    check_end = min(len(data), confirmed_length + chunk_size)
+    flash_data = stm32.read_memory_data(address + check_start, check_end - check_start)
+
+    for offset in range(check_start, check_end, chunk_size):
+        expected = data[offset : offset + chunk_size]
+        actual = flash_data[offset - check_start : offset - check_start + len(expected)]
+        if actual == expected:
+            continue
+        if all(value == 0xFF for value in actual):
+            return offset
+        return None
+    return check_end
@@ -0,0 +1,113 @@
+"""
+Log messages of stm32loader through the logging module.
+
+Messages go to per-subsystem loggers:
+
+* stm32loader.protocol: bootloader commands and their results;
+* stm32loader.progress: per-chunk messages of long transfers;
+* stm32loader.transport: every byte sent and received. This one is
+  off unless a protocol log is started, see start_protocol_log().
+
+The verbosity levels of the command line (0 quiet to 10 verbose and
+beyond) map to logging levels: 0 is WARNING, 5 is INFO and 10 is DEBUG.
+Callers check the verbosity before logging and pass message arguments
+separately, so a disabled message costs an integer comparison and is
+never formatted.
+
+The command line calls enable_console() to print messages to stdout, as
+stm32loader always did. Applications using stm32loader as a library get
+its messages through their own logging configuration; without one, the
+messages are dropped.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOGGER = logging.getLogger("stm32loader")
+PROTOCOL = logging.getLogger("stm32loader.protocol")
+PROGRESS = logging.getLogger("stm32loader.progress")
+TRANSPORT = logging.getLogger("stm32loader.transport")
+
+
+def log_level(verbosity):
+    """Return the logging level for a message of the given verbosity."""
+    return max(1, logging.WARNING - 2 * verbosity)
+
+
+class ConsoleHandler(logging.Handler):
+    """Print log messages to the current sys.stdout."""
+
+    def emit(self, record):
+        try:
+            print(self.format(record), file=sys.stdout)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format log records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data = getattr(record, "data", None)
+        if data is not None:
+            entry["data"] = data.hex()
+        return json.dumps(entry)
+
+
+_CONSOLE_HANDLER = ConsoleHandler()
+
+
+def enable_console():
+    """Print stm32loader messages to stdout, as the command line does."""
+    LOGGER.addHandler(_CONSOLE_HANDLER)
+    # Verbosity is checked before logging; let every message through.
+    LOGGER.setLevel(1)
+    LOGGER.propagate = False
+
+
+def disable_console():
+    """Stop printing messages; propagate them to the root logger instead."""
+    LOGGER.removeHandler(_CONSOLE_HANDLER)
+    LOGGER.propagate = True
+
+
+def start_protocol_log(path):
+    """
+    Write all serial traffic to the given file, as JSON lines.
+
+    Records are handed to a background thread through a queue, so
+    writing the file never holds up the serial transfers.
+
+    :return: Callable that stops the log and closes the file.
+    """
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(path, mode="w", encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    TRANSPORT.addHandler(queue_handler)
+    TRANSPORT.setLevel(logging.DEBUG)
+    listener.start()
+
+    def stop():
+        TRANSPORT.removeHandler(queue_handler)
+        TRANSPORT.setLevel(logging.WARNING)
+        listener.stop()
+        file_handler.close()
+
+    return stop
+
+
+# Keep serial traffic out of the console, and off until asked for.
+TRANSPORT.propagate = False
+TRANSPORT.setLevel(logging.WARNING)
+# Don't print warnings through logging's last resort handler in libraries.
+LOGGER.addHandler(logging.NullHandler())
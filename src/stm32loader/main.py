@@ -20,37 +20,43 @@
 
 """Flash firmware to STM32 microcontrollers over a serial connection."""
 
+import copy
 import sys
+import zlib
 from pathlib import Path
 from types import SimpleNamespace
 
-import serial
-
-try:
-    from progress.bar import ChargingBar as progress_bar
-except ImportError:
-    progress_bar = None
-
-from stm32loader import args, bootloader, hexfile
+from stm32loader import args
 from stm32loader.device_family import DEVICE_FAMILIES, DeviceFamily, DeviceFlag
-from stm32loader.uart import SerialConnection
+
+# Modules such as pyserial, progress, intelhex and the bootloader itself
+# are imported where they are used, so that --help, --version and
+# argument errors don't pay for importing them.
+# pylint: disable=import-outside-toplevel
 
 
 class Stm32Loader:
     """Main application: parse arguments and handle commands."""
 
-    # serial link bit parity, compatible to pyserial serial.PARTIY_EVEN
-    PARITY = {"even": serial.PARITY_EVEN, "none": serial.PARITY_NONE}
+    # serial link bit parity, equal to pyserial's serial.PARITY_EVEN
+    # and serial.PARITY_NONE (avoid importing pyserial at startup)
+    PARITY = {"even": "E", "none": "N"}
 
     def __init__(self):
         """Construct Stm32Loader object with default settings."""
         self.stm32 = None
         self.configuration = SimpleNamespace()
+        # Known after connect() in case of --fast-connect.
+        self.bootloader_version = None
+        # With --ram, the image runs from RAM; a reset would stop it.
+        self.running_from_ram = False
 
-    def debug(self, level, message):
-        """Log a message to stderror if its level is low enough."""
+    def debug(self, level, message, *message_args):
+        """Log a message if its level is low enough; see stm32loader.log."""
         if self.configuration.verbosity >= level:
-            print(message)
+            from stm32loader import log
+
+            log.LOGGER.log(log.log_level(level), message, *message_args)
 
     def parse_arguments(self, arguments):
         """Parse the list of command-line arguments."""
@@ -59,14 +65,23 @@ class Stm32Loader:
         # parse successful, process options further
         self.configuration.parity = Stm32Loader.PARITY[self.configuration.parity.lower()]
 
+        if self.configuration.device and not self.configuration.family:
+            self.configuration.family = self.configuration.device.family.name
+
         if self.configuration.family:
             family = DeviceFamily[self.configuration.family]
             family_flags = DEVICE_FAMILIES[family].family_default_flags
             if family_flags & DeviceFlag.FORCE_PARITY_NONE:
-                self.configuration.parity = serial.PARITY_NONE
+                self.configuration.parity = Stm32Loader.PARITY["none"]
 
     def connect(self):
         """Connect to the bootloader UART over an RS-232 serial port."""
+        from stm32loader import bootloader
+        from stm32loader.retry import RetryPolicy
+        from stm32loader.stats import TransferStats
+        from stm32loader.timeouts import TimeoutPolicy
+        from stm32loader.uart import SerialConnection
+
         serial_connection = SerialConnection(
             self.configuration.port, self.configuration.baud, self.configuration.parity
         )
@@ -93,19 +108,39 @@ class Stm32Loader:
         serial_connection.swap_rts_dtr = self.configuration.swap_rts_dtr
         serial_connection.reset_active_high = self.configuration.reset_active_high
         serial_connection.boot0_active_low = self.configuration.boot0_active_low
+        serial_connection.reset_connected = not self.configuration.no_reset
+
+        connection = serial_connection
+        if self.configuration.record_trace:
+            from stm32loader.trace import TraceRecorder
+
+            connection = TraceRecorder(serial_connection, self.configuration.record_trace)
 
         show_progress = self._get_progress_bar(self.configuration.no_progress)
+        timeout_policy = None
+        if self.configuration.tight_timeouts:
+            timeout_policy = TimeoutPolicy(baud_rate=self.configuration.baud)
+        stats = None
+        if self.configuration.stats:
+            stats = TransferStats(baud_rate=self.configuration.baud)
 
         self.stm32 = bootloader.Stm32Bootloader(
-            serial_connection,
+            connection,
             verbosity=self.configuration.verbosity,
             show_progress=show_progress,
+            device=self.configuration.device,
             device_family=self.configuration.family,
+            retry_policy=RetryPolicy(retries=self.configuration.retries),
+            timeout_policy=timeout_policy,
+            stats=stats,
         )
 
         try:
             print("Activating bootloader (select UART)")
-            self.stm32.reset_from_system_memory()
+            if self.configuration.fast_connect:
+                self.bootloader_version = self.stm32.activate_pipelined()
+            else:
+                self.stm32.reset_from_system_memory()
         except bootloader.CommandError:
             print(
                 "Can't init into bootloader. Ensure that BOOT0 is enabled and reset the device.",
@@ -118,14 +153,60 @@ class Stm32Loader:
         """Run all operations as defined by the configuration."""
         # pylint: disable=too-many-branches
         # pylint: disable=too-many-statements
+        # pylint: disable=too-many-locals
+        from stm32loader import bootloader
+        from stm32loader.plan import build_plan
+
         binary_data = None
         if self.configuration.write or self.configuration.verify:
             data_file_path = Path(self.configuration.data_file)
             if data_file_path.suffix == ".hex":
+                from stm32loader import hexfile
+
                 binary_data = hexfile.load_hex(data_file_path)
             else:
-                binary_data = data_file_path.read_bytes()
-        if self.configuration.unprotect:
+                from stm32loader import stream
+
+                binary_data = stream.map_file(data_file_path)
+        if self.configuration.ram:
+            self._prepare_ram_image(binary_data)
+        write_journal = None
+        write_offset = 0
+        if self.configuration.write and self.configuration.resume and not self.configuration.ram:
+            if not self.configuration.dry_run:
+                write_journal, write_offset = self._open_write_journal(binary_data)
+        # Combine protection changes in as few resets as possible.
+        option_bytes = self._option_byte_transaction()
+        try:
+            plan = build_plan(
+                self.configuration,
+                self.stm32,
+                self._timeout_policy(),
+                data_length=None if binary_data is None else len(binary_data),
+                write_offset=write_offset,
+                combine_protection=option_bytes is not None,
+            )
+        except bootloader.Stm32LoaderError as e:
+            print(f"Can't perform the operations: {e}", file=sys.stderr)
+            sys.exit(1)
+        if self.configuration.dry_run:
+            print(plan.describe())
+            return
+        self.debug(5, plan.describe())
+        for name, reason in plan.skipped:
+            self.debug(0, f"Skip {name}: {reason}")
+
+        if "snapshot" in plan:
+            # Capture the device state as found, before changing anything.
+            from stm32loader import snapshot
+
+            manifest = snapshot.take_snapshot(self.stm32, self.configuration.snapshot)
+            self.debug(
+                0,
+                f"Snapshot of {len(manifest['regions'])} regions"
+                f" stored in {self.configuration.snapshot}",
+            )
+        if "readout-unprotect" in plan:
             try:
                 self.stm32.readout_unprotect()
             except bootloader.CommandError:
@@ -133,7 +214,7 @@ class Stm32Loader:
                 self.debug(0, "Quit")
                 self.stm32.reset_from_flash()
                 sys.exit(1)
-        if self.configuration.protect:
+        if "readout-protect" in plan:
             try:
                 self.stm32.readout_protect()
             except bootloader.CommandError:
@@ -142,18 +223,29 @@ class Stm32Loader:
                 self.stm32.reset_from_flash()
                 sys.exit(1)
 
-        if self.configuration.write_unprotect:
+        if "write-unprotect" in plan:
             try:
-                self.stm32.write_unprotect()
-            except bootloader.CommandError:
+                if option_bytes is None:
+                    self.stm32.write_unprotect()
+                else:
+                    option_bytes.write_unprotect()
+                    option_bytes.commit()
+            except (bootloader.CommandError, bootloader.DataMismatchError):
                 self.debug(0, "Flash write unprotect failed")
                 self.debug(0, "Quit")
                 self.stm32.reset_from_flash()
                 sys.exit(1)
 
-        if self.configuration.erase:
+        stub_client = None
+        if "erase" in plan or "write" in plan:
+            stub_client = self._load_stub()
+        if "erase" in plan:
             try:
-                if self.configuration.length is None:
+                if stub_client is not None:
+                    self._erase_with_stub(stub_client)
+                elif self.configuration.bank_erase:
+                    self._erase_banks()
+                elif self.configuration.length is None:
                     # Erase full device.
                     self.debug(0, "Performing full erase...")
                     self.stm32.erase_memory(pages=None)
@@ -178,10 +270,31 @@ class Stm32Loader:
                 )
                 self.stm32.reset_from_flash()
                 sys.exit(1)
-        if self.configuration.write:
-            self.stm32.write_memory_data(self.configuration.address, binary_data)
+        if "write" in plan and stub_client is not None:
+            self.debug(0, "Writing through the flashing stub...")
+            stub_client.write_memory_data(
+                self.configuration.address + write_offset, binary_data[write_offset:]
+            )
+        elif "write" in plan:
+            try:
+                self.stm32.write_memory_data(
+                    self.configuration.address + write_offset,
+                    binary_data[write_offset:],
+                    journal=write_journal,
+                )
+            finally:
+                if write_journal:
+                    write_journal.close()
+            if write_journal:
+                write_journal.finish()
+        stub_checksum = None
+        if stub_client is not None:
+            if "verify" in plan and self.configuration.verify_checksum:
+                stub_checksum = stub_client.checksum(self.configuration.address, len(binary_data))
+            # Leave the stub; the remaining steps use the ROM bootloader.
+            self.stm32.reset_from_system_memory()
 
-        if self.configuration.write_protect:
+        if "write-protect" in plan:
             try:
                 self.stm32.write_protect(sectors=None)
             except bootloader.CommandError:
@@ -190,32 +303,381 @@ class Stm32Loader:
                 self.stm32.reset_from_flash()
                 sys.exit(1)
 
-        if self.configuration.verify:
+        if (
+            "verify" in plan
+            and self.configuration.verify_checksum
+            and self._verify_checksum(binary_data, stub_checksum)
+        ):
+            print("Verification OK (checksum)")
+        elif "verify" in plan:
             read_data = self.stm32.read_memory_data(self.configuration.address, len(binary_data))
             try:
                 bootloader.Stm32Bootloader.verify_data(read_data, binary_data)
                 print("Verification OK")
             except bootloader.DataMismatchError as e:
                 print("Verification FAILED: %s" % e, file=sys.stderr)
+                self._report_mismatches(e.report)
                 sys.exit(1)
-        if not self.configuration.write and self.configuration.read:
-            read_data = self.stm32.read_memory_data(
-                self.configuration.address, self.configuration.length
-            )
-            with open(self.configuration.data_file, "wb") as out_file:
-                out_file.write(read_data)
-        if self.configuration.go_address is not None:
+        read_step = plan.step("read")
+        if read_step is not None:
+            if read_step.blank:
+                with open(self.configuration.data_file, "wb") as out_file:
+                    out_file.write(b"\xff" * self.configuration.length)
+            elif self.configuration.resume:
+                self._read_resumable()
+            else:
+                read_data = self.stm32.read_memory_data(
+                    self.configuration.address, self.configuration.length
+                )
+                with open(self.configuration.data_file, "wb") as out_file:
+                    out_file.write(read_data)
+        if "protect" in plan:
+            self._commit_protection(option_bytes)
+        if "go" in plan:
             self.stm32.go(self.configuration.go_address)
+            self.running_from_ram = self.configuration.ram
+
+    def _timeout_policy(self):
+        """Return the TimeoutPolicy of the bootloader, or a default one."""
+        from stm32loader.timeouts import TimeoutPolicy
+
+        return self.stm32.timeout_policy or TimeoutPolicy(baud_rate=self.configuration.baud)
+
+    def _option_byte_transaction(self):
+        """Return an OptionByteTransaction, or None if unsupported."""
+        from stm32loader.option_bytes import OptionByteTransaction
+
+        if not OptionByteTransaction.supports(self.stm32.device):
+            return None
+        return OptionByteTransaction(self.stm32)
+
+    def _commit_protection(self, option_bytes):
+        """Enable write and/or readout protection with a single reset."""
+        from stm32loader import bootloader
+
+        try:
+            if self.configuration.write_protect:
+                option_bytes.write_protect()
+            if self.configuration.protect:
+                option_bytes.readout_protect()
+            option_bytes.commit()
+        except (bootloader.CommandError, bootloader.DataMismatchError) as e:
+            self.debug(0, f"Flash protect failed: {e}")
+            self.debug(0, "Quit")
+            self.stm32.reset_from_flash()
+            sys.exit(1)
+
+    def _erase_banks(self):
+        """Erase the flash bank(s) holding address to address + length."""
+        start_address = self.configuration.address
+        end_address = start_address + (self.configuration.length or 1)
+        banks = self.stm32.banks_from_range(start_address, end_address)
+        self.debug(0, f"Performing bank erase (bank {', '.join(map(str, banks))})...")
+        for bank in banks:
+            self.stm32.erase_bank(bank)
+
+    def _prepare_ram_image(self, binary_data):
+        """Check the --ram image; point --address and --go-address at it."""
+        from stm32loader import ram
+
+        try:
+            address = ram.load_address(self.stm32.device, self.configuration.address)
+            stack_pointer, reset_handler = ram.check_image(
+                self.stm32.device, address, binary_data
+            )
+        except ram.RamImageError as e:
+            print(f"Can't run the image from RAM: {e}", file=sys.stderr)
+            sys.exit(1)
+        self.configuration.address = address
+        if self.configuration.go_address is None:
+            self.configuration.go_address = address
+        self.debug(
+            5,
+            f"RAM image at 0x{address:08X}: stack pointer 0x{stack_pointer:08X},"
+            f" reset handler 0x{reset_handler:08X}",
+        )
+
+    def _load_stub(self):
+        """
+        Start the flashing stub with --stub, if there is one for the device.
+
+        :return StubClient: The running stub, or None to use the ROM
+          bootloader.
+        """
+        if not self._stub_allowed():
+            return None
+        if self.configuration.resume:
+            self.debug(0, "The flashing stub does not support --resume; use the ROM bootloader")
+            return None
+        from stm32loader import stub
+
+        return stub.load_stub(self.stm32)
+
+    def _stub_allowed(self):
+        """Return True if --stub may upload and start the flashing stub."""
+        # Only run code in RAM when asked to.
+        if not self.configuration.stub or self.configuration.ram:
+            return False
+        if self.configuration.no_reset:
+            # Without a reset, there's no way back from the stub.
+            self.debug(0, "The flashing stub needs RESET; use the ROM bootloader")
+            return False
+        return True
+
+    def _erase_with_stub(self, stub_client):
+        """Erase flash as configured, through the flashing stub."""
+        flash = self.stm32.device.flash
+        address = self.configuration.address
+        if self.configuration.bank_erase:
+            end_address = address + (self.configuration.length or 1)
+            banks = self.stm32.banks_from_range(address, end_address)
+            ranges = [self.stm32.get_flash_banks()[bank - 1] for bank in banks]
+        elif self.configuration.length is None:
+            ranges = [(flash.start, flash.end)]
+        else:
+            ranges = [(address, address + self.configuration.length)]
+        for start, end in ranges:
+            self.debug(0, f"Erasing 0x{start:X} - 0x{end:X} through the flashing stub...")
+            stub_client.erase(start, end - start)
+
+    def _device_identity(self):
+        """Return the device UID as string, or else the product ID."""
+        from stm32loader import bootloader
+
+        try:
+            uid = self.stm32.get_uid()
+        except bootloader.CommandError:
+            uid = None
+        if isinstance(uid, (bytes, bytearray)):
+            return self.stm32.format_uid(uid)
+        return f"product-id-0x{self.stm32.device.product_id:03X}"
+
+    def _open_write_journal(self, binary_data):
+        """
+        Open the journal for the write, resuming an earlier run if possible.
+
+        :return tuple: The journal and the offset in the data to continue
+          writing from.
+        """
+        from stm32loader import journal
+
+        address = self.configuration.address
+        write_journal = journal.TransferJournal(
+            journal.transfer_key(
+                "write", self._device_identity(), address, len(binary_data), binary_data
+            )
+        )
+        offset = 0
+        if write_journal.load():
+            offset = journal.resume_write_offset(self.stm32, write_journal, binary_data)
+            if offset is None:
+                self.debug(0, "Flash content differs from the interrupted write; start over")
+                offset = 0
+        write_journal.open(resume=bool(offset))
+        if offset:
+            self.debug(
+                0,
+                f"Resuming write at 0x{address + offset:08X}"
+                f" ({offset} of {len(binary_data)} bytes done)",
+            )
+        return write_journal, offset
+
+    def _read_resumable(self):
+        """
+        Read memory into the data file, continuing an interrupted read.
+
+        The data file is written while reading, and synced together with
+        the journal, so each recorded chunk is known to be in the file.
+        """
+        from stm32loader import journal
+
+        address = self.configuration.address
+        length = self.configuration.length
+        data_file_path = Path(self.configuration.data_file)
+        resumable = data_file_path.exists()
+        with data_file_path.open("r+b" if resumable else "wb") as out_file:
+            read_journal = journal.TransferJournal(
+                journal.transfer_key("read", self._device_identity(), address, length),
+                output_file=out_file,
+            )
+            offset = read_journal.confirmed_length() if resumable and read_journal.load() else 0
+            read_journal.open(resume=bool(offset))
+            if offset:
+                self.debug(0, f"Resuming read at 0x{address + offset:08X}")
+            try:
+                self.stm32.read_memory_data(
+                    address + offset, length - offset, journal=read_journal
+                )
+            finally:
+                read_journal.close()
+            out_file.truncate(length)
+        read_journal.finish()
+
+    def run_daemon(self):
+        """Keep bootloader sessions open and serve jobs on a Unix socket."""
+        from stm32loader import bootloader, daemon
+        from stm32loader.page_cache import PageCache
+
+        def open_session(port):
+            loader = Stm32Loader()
+            loader.configuration = copy.copy(self.configuration)
+            loader.configuration.port = port
+            loader.connect()
+            loader.detect_device()
+            # The daemon holds the port; only its own jobs change the flash.
+            loader.stm32.page_cache = PageCache()
+            return loader.stm32
+
+        session_daemon = daemon.SessionDaemon(
+            self.configuration.daemon, open_session, default_port=self.configuration.port
+        )
+        # Bring up the default session right away to report problems early.
+        try:
+            session_daemon.session(self.configuration.port)
+        except bootloader.Stm32LoaderError:
+            sys.exit(1)
+        self.debug(0, f"Serving bootloader jobs on {self.configuration.daemon}")
+        try:
+            session_daemon.serve_forever()
+        except KeyboardInterrupt:
+            # Sessions are closed when serve_forever() exits.
+            pass
+
+    def start_protocol_log(self):
+        """
+        Start logging serial traffic if --protocol-log is given.
+
+        :return: Callable that stops the log.
+        """
+        if not self.configuration.protocol_log:
+            return lambda: None
+        from stm32loader import log
+
+        return log.start_protocol_log(self.configuration.protocol_log)
 
     def reset(self):
-        """Reset the microcontroller."""
+        """Reset the microcontroller, unless it runs an image from RAM."""
+        if self.running_from_ram:
+            return
         self.stm32.reset_from_flash()
 
+    def report_retries(self):
+        """Show how many transfers were retried, if any."""
+        if self.stm32.retry_stats:
+            self.debug(0, f"Recovered from transfer errors: {self.stm32.retry_stats}")
+
+    def _verify_checksum(self, binary_data, stub_checksum=None):
+        """
+        Compare the CRC32 of the data with a checksum from the device.
+
+        Use the bootloader's GET_CHECKSUM command if it has one, or else
+        the flashing stub (see stm32loader.stub), with --stub only.
+
+        :param int stub_checksum: Checksum the stub already calculated.
+        :return bool: True if the checksums match. False if they differ,
+          or no checksum is available; then read back to verify.
+        """
+        from stm32loader import stub, verify
+
+        address = self.configuration.address
+        capabilities = self.stm32.capabilities
+        if stub_checksum is not None:
+            device_checksum = stub_checksum
+            expected_checksum = zlib.crc32(binary_data)
+        elif (
+            capabilities is not None
+            and capabilities.supports(self.stm32.Command.GET_CHECKSUM)
+            and address % 4 == 0
+        ):
+            padded_data = verify.pad_to_words(binary_data)
+            device_checksum = self.stm32.get_checksum(address, len(padded_data))
+            expected_checksum = verify.stm32_crc32(padded_data)
+        else:
+            stub_client = None
+            if self._stub_allowed():
+                stub_client = stub.load_stub(self.stm32)
+            if stub_client is None:
+                self.debug(0, "No checksum support on the device; verify by reading back")
+                return False
+            try:
+                device_checksum = stub_client.checksum(address, len(binary_data))
+            finally:
+                self.stm32.reset_from_system_memory()
+            expected_checksum = zlib.crc32(binary_data)
+
+        if device_checksum != expected_checksum:
+            self.debug(
+                0,
+                f"Checksum 0x{device_checksum:08X} differs from 0x{expected_checksum:08X};"
+                " read back to find the differences",
+            )
+            return False
+        return True
+
+    def _report_mismatches(self, report):
+        """Show all mismatches of a failed verify, and write --verify-diff."""
+        report.address = self.configuration.address
+        print(report.describe(self.stm32.flash_page_size), file=sys.stderr)
+        if self.configuration.verify_diff:
+            report.write_diff(self.configuration.verify_diff)
+            print(f"Wrote diff to {self.configuration.verify_diff}", file=sys.stderr)
+
+    def close_trace(self):
+        """Finish the trace file of --record-trace."""
+        if self.configuration.record_trace:
+            self.stm32.connection.close()
+
+    def report_stats(self):
+        """Show command latencies and throughput, with --stats."""
+        if self.stm32.stats is not None:
+            self.debug(0, self.stm32.stats.report())
+
     def detect_device(self) -> None:
         """Detect the STM32 device type by querying bootloader and regs."""
-        boot_version = self.stm32.get()
+        boot_version = self.bootloader_version
+        if boot_version is None:
+            boot_version = self.stm32.get()
         self.debug(0, "Bootloader version: 0x%X" % boot_version)
-        self.stm32.detect_device()
+
+        if self.configuration.device:
+            # Device is declared; skip detection.
+            if self.configuration.check_device_id:
+                self.check_device_id()
+            self._show_device()
+            self.stm32.apply_command_timeout()
+            return
+
+        detection_cache = None
+        if self.configuration.cache_detection:
+            from stm32loader.detection_cache import DetectionCache
+
+            detection_cache = DetectionCache()
+
+        if detection_cache and detection_cache.restore(
+            self.stm32, self.configuration.port, boot_version
+        ):
+            self.debug(5, "Device details restored from detection cache")
+        else:
+            self.stm32.detect_device()
+            if detection_cache:
+                detection_cache.store(self.stm32, self.configuration.port, boot_version)
+        self._show_device()
+        self.stm32.apply_command_timeout()
+
+    def check_device_id(self):
+        """Exit if the product ID differs from the declared device."""
+        product_id = self.stm32.get_product_id()
+        expected_product_id = self.stm32.device.product_id
+        if product_id != expected_product_id:
+            self.debug(
+                0,
+                f"Device mismatch: expected chip ID 0x{expected_product_id:03X}"
+                f" ({self.stm32.device}), found 0x{product_id:03X}",
+            )
+            sys.exit(1)
+
+    def _show_device(self):
+        """Show the device's bootloader ID, chip ID and model."""
         if self.stm32.device.bootloader_id is not None:
             self.debug(5, f"Bootloader ID: 0x{self.stm32.device.bootloader_id:02X}")
         self.debug(0, f"Chip ID: 0x{self.stm32.device.product_id:03X}")
@@ -223,6 +685,8 @@ class Stm32Loader:
 
     def read_device_uid(self):
         """Show chip UID."""
+        from stm32loader import bootloader
+
         try:
             device_uid = self.stm32.get_uid()
         except bootloader.CommandError as e:
@@ -238,6 +702,8 @@ class Stm32Loader:
 
     def read_flash_size(self):
         """Show chip flash size."""
+        from stm32loader import bootloader
+
         try:
             flash_size = self.stm32.get_flash_size()
         except bootloader.CommandError as e:
@@ -252,9 +718,16 @@ class Stm32Loader:
 
     @staticmethod
     def _get_progress_bar(no_progress=False):
-        if no_progress or not progress_bar:
+        if no_progress:
+            return None
+
+        try:
+            from progress.bar import ChargingBar as progress_bar
+        except ImportError:
             return None
 
+        from stm32loader import bootloader
+
         return bootloader.ShowProgress(progress_bar)
 
 
@@ -264,17 +737,33 @@ def main(*arguments, **kwargs):
 
     Default usage is to supply *sys.argv[1:].
     """
+    from stm32loader import log  # pylint: disable=import-outside-toplevel
+
+    log.enable_console()
     try:
         loader = Stm32Loader()
         loader.parse_arguments(arguments)
-        loader.connect()
+        stop_protocol_log = loader.start_protocol_log()
         try:
-            loader.detect_device()
-            loader.read_device_uid()
-            loader.read_flash_size()
-            loader.perform_commands()
+            if loader.configuration.daemon:
+                loader.run_daemon()
+                return
+            loader.connect()
+            try:
+                loader.detect_device()
+                if loader.configuration.info or not loader.configuration.device:
+                    loader.read_device_uid()
+                    loader.read_flash_size()
+                loader.perform_commands()
+            finally:
+                loader.report_retries()
+                loader.report_stats()
+                try:
+                    loader.reset()
+                finally:
+                    loader.close_trace()
         finally:
-            loader.reset()
+            stop_protocol_log()
     except SystemExit:
         if not kwargs.get("avoid_system_exit", False):
             raise
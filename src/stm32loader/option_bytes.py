@@ -0,0 +1,183 @@
+"""
+Change protection and other option bytes with a single reset.
+
+Each protection command of the bootloader (write protect, readout
+protect and their opposites) makes the device reset, after which the
+bootloader needs to be activated again. Changing several settings in a
+row pays for that reset and resynchronization each time.
+
+An OptionByteTransaction reads the option bytes once, stages all
+changes, writes them with a single WRITE_MEMORY command (which resets
+the device once) and reads them back to confirm.
+
+This is supported for the F0, F1 and F3 families, which share a 16-byte
+option byte layout where each value is followed by its complement.
+"""
+
+import time
+
+from stm32loader.bootloader import (
+    CommandError,
+    DataMismatchError,
+    PageIndexError,
+    Stm32LoaderError,
+)
+
+OPTION_BYTES_SIZE = 16
+
+# Offsets of the option byte values; each complement follows its value.
+RDP_OFFSET = 0
+USER_OFFSET = 2
+DATA_OFFSETS = (4, 6)
+WRP_OFFSETS = (8, 10, 12, 14)
+
+# Readout protection levels per family (RM0360, RM0008, RM0316).
+# Level 2 (0xCC on F0/F3) disables the bootloader for good; it's not
+# offered here.
+RDP_LEVEL_0 = {"F0": 0xAA, "F1": 0xA5, "F3": 0xAA}
+RDP_LEVEL_1 = {"F0": 0xBB, "F1": 0x00, "F3": 0xBB}
+
+
+class OptionByteTransaction:
+    """Stage option byte changes and apply them with one reset."""
+
+    def __init__(self, stm32):
+        """
+        Construct the transaction; nothing is read until it's needed.
+
+        :param Stm32Bootloader stm32: Bootloader of a detected device,
+          see supports().
+        """
+        if not self.supports(stm32.device):
+            raise Stm32LoaderError(
+                f"Option byte transactions are not supported for '{stm32.device}'."
+            )
+        self.stm32 = stm32
+        self.family = stm32.device.family.name
+        self.address = stm32.device.option_bytes[0]
+        # Option bytes as read from the device, and with the staged changes.
+        self.current = None
+        self.staged = None
+
+    @staticmethod
+    def supports(device):
+        """
+        Return True if the device has the F0/F1/F3 option byte layout.
+
+        The write protection bits are only known for devices that
+        support write protection.
+        """
+        if device is None or device.family.name not in RDP_LEVEL_0:
+            return False
+        if not device.write_protect_supported:
+            return False
+        if device.option_bytes is None:
+            return False
+        start, end = device.option_bytes
+        return end - start + 1 == OPTION_BYTES_SIZE
+
+    @property
+    def pending(self):
+        """Return True if there are staged changes."""
+        return self.staged is not None and self.staged != self.current
+
+    def read(self):
+        """
+        Read the option bytes from the device; drop staged changes.
+
+        This fails while readout protection is enabled; use
+        Stm32Bootloader.readout_unprotect() then.
+        """
+        self.current = bytes(self.stm32.read_memory(self.address, OPTION_BYTES_SIZE))
+        self.staged = bytearray(self.current)
+        return self.current
+
+    def write_protect(self, sectors=None):
+        """
+        Stage write protection of the given flash sectors.
+
+        :param iterable sectors: Sector indices (0-31); each bit of the
+          WRP option bytes covers one sector. Set to None for all flash.
+        """
+        if sectors is None:
+            sectors = range(8 * len(WRP_OFFSETS))
+        wrp = self._wrp()
+        for sector in sectors:
+            if not 0 <= sector < 8 * len(WRP_OFFSETS):
+                raise PageIndexError(f"Write protection sector out of range: {sector}.")
+            wrp &= ~(1 << sector)
+        self._stage_wrp(wrp)
+
+    def write_unprotect(self):
+        """Stage disabling write protection of all flash."""
+        self._stage_wrp(0xFFFF_FFFF)
+
+    def readout_protect(self):
+        """Stage enabling readout protection (level 1)."""
+        self._stage(RDP_OFFSET, RDP_LEVEL_1[self.family])
+
+    def readout_unprotect(self):
+        """
+        Stage disabling readout protection.
+
+        Beware: when readout protection was enabled, the device
+        erases all flash.
+        """
+        self._stage(RDP_OFFSET, RDP_LEVEL_0[self.family])
+
+    def set_user(self, value):
+        """Stage a new value of the USER option byte."""
+        self._stage(USER_OFFSET, value)
+
+    def set_data(self, index, value):
+        """Stage a new value of the DATA0 or DATA1 option byte."""
+        self._stage(DATA_OFFSETS[index], value)
+
+    def commit(self):
+        """
+        Write the staged option bytes, reset once and confirm the result.
+
+        Do nothing if no changes are staged.
+
+        :return bytes: Option bytes after the change.
+        """
+        if not self.pending:
+            return self.current
+
+        staged = bytes(self.staged)
+        self.stm32.debug(10, f"Writing option bytes: {staged.hex()}")
+        # The bootloader resets the device after writing the option bytes.
+        self.stm32.write_memory(self.address, staged)
+        time.sleep(0.1)
+        self.stm32.reset_from_system_memory()
+
+        if staged[RDP_OFFSET] != RDP_LEVEL_0[self.family]:
+            # Readout protection blocks reading them back.
+            self.current = staged
+            return self.current
+
+        try:
+            written = self.read()
+        except CommandError as e:
+            raise DataMismatchError("Can't read back the option bytes.") from e
+        if written != staged:
+            raise DataMismatchError(
+                f"Option bytes differ after writing:"
+                f" expected {staged.hex()}, got {written.hex()}."
+            )
+        return written
+
+    def _stage(self, offset, value):
+        if self.staged is None:
+            self.read()
+        self.staged[offset] = value
+        self.staged[offset + 1] = value ^ 0xFF
+
+    def _wrp(self):
+        if self.staged is None:
+            self.read()
+        return int.from_bytes(bytes(self.staged[offset] for offset in WRP_OFFSETS), "little")
+
+    def _stage_wrp(self, wrp):
+        for index, offset in enumerate(WRP_OFFSETS):
+            self._stage(offset, (wrp >> (8 * index)) & 0xFF)
@@ -0,0 +1,62 @@
+"""
+Keep flash contents that were read earlier in the same session.
+
+Reading flash over a UART takes a while, and long-lived sessions (the
+daemon, interactive scripting) tend to read the same regions repeatedly:
+verify, snapshot, verify again. The bootloader stores each read in this
+cache, per aligned page, and drops pages as soon as they are written
+or erased.
+"""
+
+from collections import OrderedDict
+
+
+class PageCache:
+    """Least-recently-used cache of memory pages, keyed by address."""
+
+    def __init__(self, max_bytes=1024 * 1024):
+        """
+        Construct an empty cache.
+
+        :param int max_bytes: Maximum total size of the cached pages.
+          The least recently used pages are dropped to stay below it.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, address):
+        """Return the page starting at the given address, or None."""
+        data = self._pages.get(address)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(address)
+        return data
+
+    def put(self, address, data):
+        """Store the page starting at the given address."""
+        self.invalidate(address, address + len(data))
+        self._pages[address] = bytes(data)
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _address, evicted = self._pages.popitem(last=False)
+            self.size -= len(evicted)
+
+    def invalidate(self, start, end):
+        """Drop all pages that overlap the given address range."""
+        for address, data in list(self._pages.items()):
+            if address < end and address + len(data) > start:
+                del self._pages[address]
+                self.size -= len(data)
+
+    def clear(self):
+        """Drop all pages."""
+        self._pages.clear()
+        self.size = 0
@@ -0,0 +1,264 @@
+"""
+Turn the requested operations into a plan without redundant steps.
+
+The command line asks for operations independently: unprotect, erase,
+write, verify, read, protect, go. Some of them imply others. Readout
+unprotect erases all flash, so an extra erase only costs time, and
+reading a range that was just erased gives 0xFF without asking the
+device. Protection changes that can be combined are applied with a
+single reset.
+
+The plan lists the steps to run with their estimated duration; with
+--dry-run it is printed instead of run.
+"""
+
+from stm32loader.device_family import FlashTiming
+from stm32loader.timeouts import erase_time
+
+# Seconds to reset the device and activate the bootloader again.
+RESET_TIME = 0.7
+
+# Seconds that readout unprotect waits for the mass erase.
+READOUT_UNPROTECT_TIME = 20
+
+# RAM is written as fast as the data arrives.
+RAM_TIMING = FlashTiming(word_program_time=0.0)
+
+
+class Step:  # pylint: disable=too-few-public-methods
+    """One operation of a plan."""
+
+    __slots__ = ("name", "description", "estimate", "resets", "blank")
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, name, description, estimate=None, resets=0, blank=False
+    ):
+        """
+        Construct a Step.
+
+        :param str name: Operation name, such as 'erase' or 'verify'.
+        :param str description: What the step does, for humans.
+        :param float estimate: Expected duration in seconds, if known.
+        :param int resets: Number of device resets the step causes.
+        :param bool blank: For reads: the range is known to be erased,
+          so it needn't be read from the device.
+        """
+        self.name = name
+        self.description = description
+        self.estimate = estimate
+        self.resets = resets
+        self.blank = blank
+
+    def __str__(self):
+        estimate = "" if self.estimate is None else f"~{self.estimate:.1f} s"
+        return f"{self.name:<18} {estimate:>10}  {self.description}"
+
+
+class Plan:
+    """Ordered steps to run, and the steps that were left out."""
+
+    def __init__(self):
+        """Construct an empty plan."""
+        self.steps = []
+        self.skipped = []
+
+    def __contains__(self, name):
+        return self.step(name) is not None
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def add(self, step):
+        """Add the step to the plan."""
+        self.steps.append(step)
+
+    def skip(self, name, reason):
+        """Record that the named operation is left out, and why."""
+        self.skipped.append((name, reason))
+
+    def step(self, name):
+        """Return the step with the given name, or None."""
+        for step in self.steps:
+            if step.name == name:
+                return step
+        return None
+
+    @property
+    def estimate(self):
+        """Return the total estimated duration of the known steps."""
+        return sum(step.estimate for step in self.steps if step.estimate is not None)
+
+    @property
+    def resets(self):
+        """Return the number of device resets of the plan."""
+        return sum(step.resets for step in self.steps)
+
+    def describe(self):
+        """Return the plan as human-readable text."""
+        lines = ["Plan:"]
+        lines.extend(f"  {number}. {step}" for number, step in enumerate(self.steps, start=1))
+        if not self.steps:
+            lines.append("  (nothing to do)")
+        for name, reason in self.skipped:
+            lines.append(f"  skip {name}: {reason}")
+        lines.append(f"Estimated time: ~{self.estimate:.1f} s, {self.resets} resets")
+        return "\n".join(lines)
+
+
+def build_plan(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    configuration,
+    stm32,
+    timeout_policy,
+    data_length=None,
+    write_offset=0,
+    combine_protection=False,
+):
+    """
+    Return the Plan for the operations requested in the configuration.
+
+    :param configuration: Parsed command line arguments.
+    :param Stm32Bootloader stm32: Bootloader of the detected device.
+    :param TimeoutPolicy timeout_policy: Used for the time estimates.
+    :param int data_length: Size of the data to write or verify.
+    :param int write_offset: Offset in the data to continue an
+      interrupted write from, see stm32loader.journal.
+    :param bool combine_protection: Apply write protection and readout
+      protection in a single step at the end (see
+      stm32loader.option_bytes).
+    """
+    # pylint: disable=too-many-branches
+    plan = Plan()
+    flash_timing = stm32.get_flash_timing()
+    transfer_size = stm32.data_transfer_size
+    address = configuration.address
+
+    if configuration.snapshot:
+        plan.add(Step("snapshot", f"store all memory regions in {configuration.snapshot}"))
+    if configuration.unprotect:
+        plan.add(
+            Step(
+                "readout-unprotect",
+                "disable readout protection; erases all flash",
+                READOUT_UNPROTECT_TIME + RESET_TIME,
+                resets=1,
+            )
+        )
+    if configuration.protect and not combine_protection:
+        plan.add(Step("readout-protect", "enable readout protection", RESET_TIME, resets=1))
+    if configuration.write_unprotect:
+        plan.add(Step("write-unprotect", "disable write protection", RESET_TIME, resets=1))
+
+    if configuration.erase:
+        if configuration.ram:
+            plan.skip("erase", "--ram writes to RAM, not flash")
+        elif configuration.unprotect:
+            plan.skip("erase", "readout unprotect already erases all flash")
+        elif write_offset:
+            plan.skip("erase", "resuming an interrupted write")
+        else:
+            plan.add(_erase_step(configuration, stm32, flash_timing))
+
+    if configuration.write:
+        length = data_length - write_offset
+        plan.add(
+            Step(
+                "write",
+                f"write {length} bytes{' to RAM' if configuration.ram else ''}"
+                f" at 0x{address + write_offset:08X}",
+                timeout_policy.write_time(
+                    RAM_TIMING if configuration.ram else flash_timing, length, transfer_size
+                ),
+            )
+        )
+    if configuration.write_protect and not combine_protection:
+        plan.add(Step("write-protect", "enable write protection", RESET_TIME, resets=1))
+    if configuration.verify:
+        if configuration.verify_checksum:
+            description = f"compare the checksum of {data_length} bytes at 0x{address:08X}"
+            # Reading back is the fallback; estimate for that.
+            description += " (or read back)"
+        else:
+            description = f"read back and compare {data_length} bytes at 0x{address:08X}"
+        plan.add(
+            Step(
+                "verify",
+                description,
+                timeout_policy.read_time(data_length, transfer_size),
+            )
+        )
+    if configuration.read and not configuration.write:
+        length = configuration.length
+        erased = "erase" in plan or "readout-unprotect" in plan
+        if erased and length is not None and stm32.is_flash_range(address, length):
+            plan.add(
+                Step(
+                    "read",
+                    f"store {length} erased bytes (0xFF) in {configuration.data_file};"
+                    " no device read needed",
+                    0.0,
+                    blank=True,
+                )
+            )
+        else:
+            plan.add(
+                Step(
+                    "read",
+                    f"read {length} bytes at 0x{address:08X}",
+                    timeout_policy.read_time(length or 0, transfer_size),
+                )
+            )
+    if combine_protection and (configuration.write_protect or configuration.protect):
+        names = [
+            name
+            for name, requested in (
+                ("write", configuration.write_protect),
+                ("readout", configuration.protect),
+            )
+            if requested
+        ]
+        plan.add(
+            Step(
+                "protect",
+                f"enable {' and '.join(names)} protection with one option byte write",
+                RESET_TIME,
+                resets=1,
+            )
+        )
+    if configuration.go_address is not None:
+        plan.add(
+            Step(
+                "go",
+                f"start {'the RAM image ' if configuration.ram else ''}execution"
+                f" at 0x{configuration.go_address:08X}",
+            )
+        )
+    return plan
+
+
+def _erase_step(configuration, stm32, flash_timing):
+    """Return the erase Step as configured."""
+    address = configuration.address
+    if configuration.bank_erase:
+        end = address + (configuration.length or 1)
+        banks = stm32.banks_from_range(address, end)
+        return Step(
+            "erase",
+            f"erase flash bank {', '.join(map(str, banks))}",
+            _sum_known([erase_time(flash_timing) for _bank in banks]),
+        )
+    if configuration.length is None:
+        return Step("erase", "erase all flash", erase_time(flash_timing))
+    end = address + configuration.length
+    pages = stm32.pages_from_range(address, end)
+    return Step(
+        "erase",
+        f"erase 0x{address:08X} - 0x{end:08X} ({len(pages)} pages)",
+        erase_time(flash_timing, len(pages)),
+    )
+
+
+def _sum_known(values):
+    """Return the sum of the values, or None if any is unknown."""
+    if None in values:
+        return None
+    return sum(values)
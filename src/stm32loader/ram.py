@@ -0,0 +1,75 @@
+"""
+Load a firmware image into RAM and run it, without touching flash.
+
+Test firmware that is only run once doesn't need to be in flash: loading
+it into RAM skips the erase, is faster to write, and doesn't wear the
+flash. The image must be linked for RAM, with its vector table at the
+start: the GO command loads the stack pointer from the first word and
+jumps to the reset handler in the second.
+
+DeviceInfo.ram lists the RAM the bootloader leaves free, so the image
+must fit in there; it's checked before writing anything.
+"""
+
+import struct
+
+from stm32loader.bootloader import Stm32LoaderError
+
+
+class RamImageError(Stm32LoaderError):
+    """Exception: image can't be loaded into RAM or run from there."""
+
+
+def ram_ranges(device):
+    """Return the (start, end) ranges of usable RAM of the device."""
+    if not device or not device.ram:
+        return []
+    if isinstance(device.ram[0], tuple):
+        return list(device.ram)
+    return [device.ram]
+
+
+def load_address(device, address=None):
+    """
+    Return the RAM address to load an image to.
+
+    :param DeviceInfo device: Detected device.
+    :param int address: Requested address; if it's not in RAM, use the
+      start of the first usable RAM range.
+    """
+    ranges = ram_ranges(device)
+    if not ranges:
+        raise RamImageError(f"RAM layout of {device} is unknown")
+    if address is not None and any(start <= address < end for start, end in ranges):
+        return address
+    return ranges[0][0]
+
+
+def check_image(device, address, data):
+    """
+    Check that the image fits in RAM and has a valid vector table.
+
+    :return tuple: The initial stack pointer and the reset handler.
+    """
+    ranges = ram_ranges(device)
+    if len(data) < 8:
+        raise RamImageError("Image is too short to hold a vector table")
+    image_range = next(((start, end) for start, end in ranges if start <= address < end), None)
+    if image_range is None:
+        raise RamImageError(f"Address 0x{address:08X} is not in usable RAM")
+    if address + len(data) > image_range[1]:
+        raise RamImageError(
+            f"Image of {len(data)} bytes does not fit in RAM at 0x{address:08X}"
+            f" (usable RAM ends at 0x{image_range[1]:08X})"
+        )
+    stack_pointer, reset_handler = struct.unpack_from("<II", data)
+    if stack_pointer % 4 or not any(start < stack_pointer <= end for start, end in ranges):
+        raise RamImageError(f"Initial stack pointer 0x{stack_pointer:08X} is not in RAM")
+    if not reset_handler & 1:
+        raise RamImageError(f"Reset handler 0x{reset_handler:08X} is not Thumb code")
+    if not address <= reset_handler & ~1 < address + len(data):
+        raise RamImageError(
+            f"Reset handler 0x{reset_handler:08X} is outside the image;"
+            f" is it linked for RAM at 0x{address:08X}?"
+        )
+    return stack_pointer, reset_handler
@@ -0,0 +1,131 @@
+"""
+Serve several small memory reads with as few READ_MEMORY commands as possible.
+
+Each READ_MEMORY command takes three acknowledged round trips, no matter
+whether it reads 1 or 256 bytes. Registers such as the device UID, the
+flash size and the bootloader ID are often only a few bytes apart, so
+one read of a larger window can serve all of them.
+"""
+
+
+class ReadWindow:
+    """Represent one READ_MEMORY transfer serving one or more requests."""
+
+    __slots__ = ("start", "end", "requests", "block")
+
+    def __init__(self, start, end, requests, block=False):
+        """
+        Construct a ReadWindow.
+
+        :param int start: First address to read.
+        :param int end: Address right after the last byte to read.
+        :param list requests: (address, length) tuples served by this window.
+        :param bool block: True if the window needs an aligned block read.
+        """
+        self.start = start
+        self.end = end
+        self.requests = requests
+        self.block = block
+
+    @property
+    def length(self):
+        """Return the number of bytes to read."""
+        return self.end - self.start
+
+    def extract(self, data, request):
+        """Return the part of the window's data that answers the request."""
+        address, length = request
+        offset = address - self.start
+        return bytes(data[offset : offset + length])
+
+    def __repr__(self):
+        return f"ReadWindow(0x{self.start:08X}, 0x{self.end:08X}, {self.requests!r})"
+
+
+def plan_reads(requests, window_size, block_size=None, block_requests=None):
+    """
+    Merge the given read requests into the fewest windows of window_size.
+
+    Requests that fit in the same window end up in the same window;
+    a request that is larger than window_size gets a window of its own.
+
+    :param requests: Iterable of (address, length) tuples.
+    :param int window_size: Maximum number of bytes in a single read.
+    :param int block_size: If given, windows serving block_requests start
+      at a multiple of block_size and are padded to window_size. Some
+      devices can only read their identity registers this way.
+    :param block_requests: Requests that need such a block read; by
+      default, all of them.
+    :return list: ReadWindow objects, sorted by address.
+    """
+    windows = []
+    for address, length in sorted(set(requests)):
+        end = address + length
+        block = bool(block_size) and (
+            block_requests is None or (address, length) in block_requests
+        )
+        if windows:
+            window = windows[-1]
+            start = window.start - window.start % block_size if block else window.start
+            if end - start <= window_size:
+                window.start = start
+                window.end = max(window.end, end)
+                window.requests.append((address, length))
+                window.block = window.block or block
+                continue
+        start = address - address % block_size if block else address
+        windows.append(ReadWindow(start, end, [(address, length)], block))
+
+    for window in windows:
+        if window.block:
+            window.end = max(window.end, window.start + window_size)
+    return windows
+
+
+def read_planned(  # pylint: disable=too-many-arguments
+    read, requests, window_size, block_size=None, errors=(), *, block_requests=None, failures=None
+):
+    """
+    Read all requested memory ranges and return them by request.
+
+    When reading a merged window fails with one of the given errors,
+    read its requests one by one instead; the window may span memory
+    that can't be read. A failed read is not repeated: single-request
+    windows and block reads are not retried. Requests that fail are
+    left out of the result.
+
+    :param read: Callable taking address and length, returning bytes.
+    :param requests: Iterable of (address, length) tuples.
+    :param int window_size: See plan_reads().
+    :param int block_size: See plan_reads().
+    :param tuple errors: Exception types that indicate an unreadable range.
+    :param block_requests: See plan_reads().
+    :param dict failures: If given, receives the error of each request
+      that couldn't be read.
+    :return dict: Bytes read, keyed by (address, length).
+    """
+    if failures is None:
+        failures = {}
+    results = {}
+    windows = plan_reads(requests, window_size, block_size, block_requests)
+    for window in windows:
+        try:
+            data = read(window.start, window.length)
+        except errors as e:
+            if window.block or len(window.requests) == 1:
+                failures.update(dict.fromkeys(window.requests, e))
+            else:
+                _read_alone(read, window.requests, errors, results, failures)
+            continue
+        for request in window.requests:
+            results[request] = window.extract(data, request)
+    return results
+
+
+def _read_alone(read, requests, errors, results, failures):
+    """Read each request on its own; store the data or the error."""
+    for address, length in requests:
+        try:
+            results[(address, length)] = bytes(read(address, length))
+        except errors as e:
+            failures[(address, length)] = e
@@ -0,0 +1,50 @@
+"""
+Decide how often and when to retry a failed data transfer.
+
+A single garbled byte on a long serial line shouldn't abort a transfer
+of several minutes. The bootloader retries the failed chunk instead,
+after bringing the bootloader back in sync.
+"""
+
+
+class RetryPolicy:  # pylint: disable=too-few-public-methods
+    """Number of retries per chunk and the backoff between them."""
+
+    def __init__(self, retries=3, backoff=0.05, backoff_factor=2.0, max_backoff=1.0):
+        """
+        Construct a RetryPolicy.
+
+        :param int retries: Maximum number of retries per chunk; 0 disables.
+        :param float backoff: Seconds to wait before the first retry.
+        :param float backoff_factor: Multiply the wait time by this for
+          each next retry of the same chunk.
+        :param float max_backoff: Maximum number of seconds to wait.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+    def delay(self, retry):
+        """Return the seconds to wait before the given retry (0-based)."""
+        return min(self.backoff * self.backoff_factor**retry, self.max_backoff)
+
+
+class RetryStats:
+    """Count retries and the time lost to them."""
+
+    def __init__(self):
+        """Construct RetryStats without any retries."""
+        self.retries = 0
+        self.time_lost = 0.0
+
+    def record(self, seconds):
+        """Record one retry, which took the given number of seconds."""
+        self.retries += 1
+        self.time_lost += seconds
+
+    def __bool__(self):
+        return bool(self.retries)
+
+    def __str__(self):
+        return f"{self.retries} retries, {self.time_lost:.2f} s lost"
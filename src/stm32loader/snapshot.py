@@ -0,0 +1,261 @@
+"""Read all memory regions of a device into a single archive."""
+
+import hashlib
+import json
+import zipfile
+
+from stm32loader import __version__
+from stm32loader.bootloader import CommandError, Stm32Bootloader
+
+MANIFEST_NAME = "manifest.json"
+
+# Registers read with read_memory_batch instead of in a memory window.
+IDENTITY_REGISTERS = ("uid", "flash_size", "bootloader_id")
+
+
+class MemoryRegion:  # pylint: disable=too-few-public-methods
+    """Represent a named, contiguous range of device memory."""
+
+    def __init__(self, name, start, end):
+        """
+        Construct a MemoryRegion.
+
+        :param str name: Name of the region; used as file name in the archive.
+        :param int start: First address of the region.
+        :param int end: Address right after the last byte of the region.
+        """
+        self.name = name
+        self.start = start
+        self.end = end
+
+    @property
+    def size(self):
+        """Return the size of the region in bytes."""
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"MemoryRegion({self.name!r}, 0x{self.start:08X}, 0x{self.end:08X})"
+
+
+def _address_ranges(address_range):
+    """Return a list of (start, end) tuples from one or more ranges."""
+    if address_range is None:
+        return []
+    if isinstance(address_range[0], tuple):
+        return list(address_range)
+    return [address_range]
+
+
+def device_regions(device, flash_size=None):
+    """
+    Return all readable memory regions of the given device.
+
+    :param DeviceInfo device: The device.
+    :param int flash_size: Flash size in KiB, as read from the device.
+      Defaults to the flash size in the device table.
+    """
+    regions = []
+
+    if device.flash is not None and device.flash.size:
+        flash_end = device.flash.end
+        if flash_size:
+            flash_end = device.flash.start + flash_size * 1024
+        regions.append(MemoryRegion("flash", device.flash.start, flash_end))
+
+    system_ranges = _address_ranges(device.system_memory)
+    for index, (start, end) in enumerate(system_ranges):
+        name = "system_memory" if len(system_ranges) == 1 else f"system_memory_{index}"
+        regions.append(MemoryRegion(name, start, end))
+
+    option_ranges = _address_ranges(device.option_bytes)
+    for index, (start, end) in enumerate(option_ranges):
+        name = "option_bytes" if len(option_ranges) == 1 else f"option_bytes_{index}"
+        # The device table lists the inclusive end address.
+        regions.append(MemoryRegion(name, start, end + 1))
+
+    if device.family.uid_address:
+        regions.append(
+            MemoryRegion("uid", device.family.uid_address, device.family.uid_address + 12)
+        )
+    if device.family.flash_size_address:
+        regions.append(
+            MemoryRegion(
+                "flash_size",
+                device.family.flash_size_address,
+                device.family.flash_size_address + 2,
+            )
+        )
+    if device.bootloader_id_address:
+        regions.append(
+            MemoryRegion(
+                "bootloader_id", device.bootloader_id_address, device.bootloader_id_address + 1
+            )
+        )
+
+    return regions
+
+
+def coalesce_regions(regions, max_gap):
+    """
+    Group the given regions into as few contiguous read windows as possible.
+
+    Overlapping regions, and regions that are separated by no more than
+    max_gap bytes, end up in the same window. Reading a few bytes of
+    padding is much cheaper than the round trips of an extra read command.
+
+    :return list: List of (start, end, regions) tuples, sorted by address.
+    """
+    windows = []
+    for region in sorted(regions, key=lambda r: (r.start, r.end)):
+        if windows and region.start - windows[-1][1] <= max_gap:
+            start, end, members = windows[-1]
+            windows[-1] = (start, max(end, region.end), members + [region])
+        else:
+            windows.append((region.start, region.end, [region]))
+    return windows
+
+
+def _region_entry(region, data=None, error=None):
+    """Return the manifest entry of the given region."""
+    entry = {"name": region.name, "address": region.start, "size": region.size}
+    if error is not None:
+        entry["error"] = str(error)
+    else:
+        entry["file"] = f"{region.name}.bin"
+        entry["sha256"] = hashlib.sha256(data).hexdigest()
+    return entry
+
+
+def _read_identity_registers(stm32, registers):
+    """
+    Read the identity registers with as few aligned reads as possible.
+
+    :return tuple: Dict of data and dict of read errors, both by region name.
+    """
+    requests = {region.name: (region.start, region.size) for region in registers}
+    # Only UID and flash size need aligned block reads on some devices.
+    block_requests = [
+        request for name, request in requests.items() if name in ("uid", "flash_size")
+    ]
+    failures = {}
+    data = stm32.read_memory_batch(
+        requests.values(), block_requests=block_requests, failures=failures
+    )
+    region_data = {name: data[request] for name, request in requests.items() if request in data}
+    errors = {
+        name: failures.get(request, "Not read")
+        for name, request in requests.items()
+        if request not in data
+    }
+    return region_data, errors
+
+
+def _read_regions(stm32, regions, max_gap):
+    """
+    Read the given regions in as few windows as possible.
+
+    A window that can't be read is retried region by region, so that one
+    unreadable region doesn't lose the others.
+
+    :return tuple: Dict of data and dict of read errors, both by region name.
+    """
+    region_data = {}
+    errors = {}
+    for start, end, members in coalesce_regions(regions, max_gap):
+        stm32.debug(5, f"Snapshot of {', '.join(r.name for r in members)}")
+        try:
+            window_data = stm32.read_memory_data(start, end - start)
+        except CommandError as e:
+            if len(members) == 1:
+                errors[members[0].name] = e
+                continue
+            stm32.debug(5, f"Window 0x{start:08X} failed, reading its regions one by one")
+            for region in members:
+                try:
+                    region_data[region.name] = bytes(
+                        stm32.read_memory_data(region.start, region.size)
+                    )
+                except CommandError as region_error:
+                    errors[region.name] = region_error
+            continue
+
+        for region in members:
+            region_data[region.name] = bytes(
+                window_data[region.start - start : region.end - start]
+            )
+    return region_data, errors
+
+
+def _read_all(stm32, regions, max_gap):
+    """
+    Read the given memory regions and identity registers.
+
+    :return tuple: Dict of data and dict of read errors, both by region name.
+    """
+    registers = [region for region in regions if region.name in IDENTITY_REGISTERS]
+    memory = [region for region in regions if region.name not in IDENTITY_REGISTERS]
+    region_data, errors = _read_regions(stm32, memory, max_gap)
+    register_data, register_errors = _read_identity_registers(stm32, registers)
+    region_data.update(register_data)
+    errors.update(register_errors)
+    return region_data, errors
+
+
+def take_snapshot(stm32, file_path, max_gap=None):
+    """
+    Read all memory regions of the device and store them in a zip archive.
+
+    The flash region covers the flash size reported by the device. Identity
+    registers are read with Stm32Bootloader.read_memory_batch, which knows
+    about devices that only allow aligned block reads there.
+
+    The archive holds one .bin file per region, plus a JSON manifest
+    describing the device and the address, size and SHA-256 of each region.
+    Regions that can not be read (e.g. due to readout protection) are
+    recorded in the manifest with their error message.
+
+    :param Stm32Bootloader stm32: Bootloader with a detected device.
+    :param file_path: Path of the zip archive to write.
+    :param int max_gap: Maximum number of bytes between regions to read
+      them in one go. Defaults to the bootloader's data transfer size.
+    :return dict: The manifest.
+    """
+    device = stm32.device
+    if max_gap is None:
+        max_gap = stm32.data_transfer_size
+
+    manifest = {
+        "stm32loader_version": __version__,
+        "device_name": str(device),
+        "product_id": device.product_id,
+        "bootloader_id": device.bootloader_id,
+        "regions": [],
+    }
+
+    try:
+        flash_size = stm32.get_flash_size()
+    except CommandError:
+        flash_size = None
+
+    regions = device_regions(device, flash_size)
+    region_data, errors = _read_all(stm32, regions, max_gap)
+
+    for region in regions:
+        if region.name in region_data:
+            entry = _region_entry(region, data=region_data[region.name])
+        else:
+            entry = _region_entry(region, error=errors[region.name])
+        manifest["regions"].append(entry)
+
+    if "uid" in region_data:
+        manifest["uid"] = Stm32Bootloader.format_uid(region_data["uid"])
+    if "flash_size" in region_data:
+        flash_size_bytes = region_data["flash_size"]
+        manifest["flash_size_kib"] = flash_size_bytes[0] + (flash_size_bytes[1] << 8)
+
+    with zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in region_data.items():
+            archive.writestr(f"{name}.bin", data)
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+    return manifest
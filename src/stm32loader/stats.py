@@ -0,0 +1,168 @@
+"""
+Measure where the time of a bootloader session goes.
+
+A slow programming station may be limited by the USB serial adapter's
+latency, the baud rate, flash programming time or the host. The
+TransferStats object counts bytes and measures each command, the time
+spent sending and the time spent waiting for replies, so the numbers
+tell which one it is.
+
+Instrumentation is off unless a TransferStats object is given to the
+bootloader; then each measurement costs a clock read and a few
+additions.
+"""
+
+import bisect
+import math
+
+from stm32loader.timeouts import BITS_PER_BYTE
+
+
+class LatencyHistogram:
+    """Count durations in buckets of roughly doubling size."""
+
+    # Upper bounds of the buckets, in seconds.
+    BOUNDS = (
+        0.0005,
+        0.001,
+        0.002,
+        0.005,
+        0.01,
+        0.02,
+        0.05,
+        0.1,
+        0.2,
+        0.5,
+        1.0,
+        2.0,
+        5.0,
+        10.0,
+        math.inf,
+    )
+
+    def __init__(self):
+        """Construct an empty histogram."""
+        self.buckets = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.failures = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds, failed=False):
+        """Add one duration."""
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.failures += failed
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    @property
+    def mean(self):
+        """Return the mean duration, or 0 if nothing was recorded."""
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket of the given percentile."""
+        threshold = self.count * percent / 100
+        seen = 0
+        for bound, bucket_count in zip(self.BOUNDS, self.buckets):
+            seen += bucket_count
+            if seen >= threshold and seen:
+                return min(bound, self.maximum)
+        return 0.0
+
+    def __str__(self):
+        return (
+            f"{self.count:6d} x  mean {self.mean * 1000:8.2f} ms"
+            f"  p90 <= {self.percentile(90) * 1000:8.2f} ms"
+            f"  max {self.maximum * 1000:8.2f} ms"
+            f"  {self.failures} failed"
+        )
+
+
+class TransferStats:  # pylint: disable=too-many-instance-attributes
+    """Counters and latency histograms of a bootloader session."""
+
+    def __init__(self, baud_rate=None):
+        """
+        Construct TransferStats without any measurements.
+
+        :param int baud_rate: Baud rate of the connection, to compare
+          the effective throughput with.
+        """
+        self.baud_rate = baud_rate
+        self.commands = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.send_time = 0.0
+        self.receive_time = 0.0
+        self.retries = 0
+        self._hooks = []
+
+    def add_hook(self, callback):
+        """
+        Call the given callback after each measured command.
+
+        The callback receives the command name, its duration in seconds
+        and whether it failed.
+        """
+        self._hooks.append(callback)
+
+    def record_command(self, name, seconds, failed=False):
+        """Record the duration of one command."""
+        histogram = self.commands.get(name)
+        if histogram is None:
+            histogram = self.commands[name] = LatencyHistogram()
+        histogram.record(seconds, failed)
+        for callback in self._hooks:
+            callback(name, seconds, failed)
+
+    def record_send(self, byte_count, seconds):
+        """Record bytes written to the connection."""
+        self.bytes_sent += byte_count
+        self.send_time += seconds
+
+    def record_receive(self, byte_count, seconds):
+        """Record bytes read from the connection, including the wait."""
+        self.bytes_received += byte_count
+        self.receive_time += seconds
+
+    def record_retry(self):
+        """Record one retried chunk."""
+        self.retries += 1
+
+    @property
+    def command_time(self):
+        """Return the total duration of all measured commands."""
+        return sum(histogram.total for histogram in self.commands.values())
+
+    @property
+    def effective_throughput(self):
+        """Return the bytes moved per second of command time."""
+        if not self.command_time:
+            return 0.0
+        return (self.bytes_sent + self.bytes_received) / self.command_time
+
+    @property
+    def theoretical_throughput(self):
+        """Return the bytes per second the baud rate allows, or None."""
+        if not self.baud_rate:
+            return None
+        return self.baud_rate / BITS_PER_BYTE
+
+    def report(self):
+        """Return the measurements as human-readable text."""
+        lines = [f"{name:<16} {histogram}" for name, histogram in sorted(self.commands.items())]
+        lines.append(
+            f"Sent {self.bytes_sent} bytes in {self.send_time:.2f} s,"
+            f" received {self.bytes_received} bytes in {self.receive_time:.2f} s"
+            " (including waiting for replies)"
+        )
+        throughput = f"Throughput {self.effective_throughput:.0f} bytes/s"
+        if self.theoretical_throughput:
+            throughput += (
+                f" of {self.theoretical_throughput:.0f} bytes/s at {self.baud_rate} baud"
+                f" ({100 * self.effective_throughput / self.theoretical_throughput:.0f}%)"
+            )
+        lines.append(f"{throughput}, {self.retries} retries")
+        return "\n".join(lines)
@@ -0,0 +1,100 @@
+"""
+Feed data to the write path in chunks, without copying whole images.
+
+write_memory_data() used to slice an in-memory copy of the image. Now
+the data can be any buffer, a binary file object, or an iterable of
+(address, chunk) pairs, such as content generated per device. Image
+files are memory-mapped (see map_file()), so the operating system pages
+them in as the chunks are sent, and a multi-MiB image costs no more
+Python memory than a single chunk.
+"""
+
+import mmap
+import os
+
+
+def map_file(path):
+    """
+    Return the content of the file as a read-only memoryview.
+
+    The view is backed by a memory map; it stays valid after the file
+    is closed, for as long as the view is referenced.
+    """
+    with open(path, "rb") as image_file:
+        if os.fstat(image_file.fileno()).st_size == 0:
+            # Empty files can't be mapped.
+            return memoryview(b"")
+        return memoryview(mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def data_length(data):
+    """Return the byte count of a buffer or file, or None if unknown."""
+    if hasattr(data, "read"):
+        try:
+            return os.fstat(data.fileno()).st_size - data.tell()
+        except (AttributeError, OSError, ValueError):
+            return None
+    if hasattr(data, "__len__"):
+        return len(data)
+    return None
+
+
+def iter_chunks(address, data, chunk_size):
+    """
+    Yield (address, chunk) pairs that cover the data.
+
+    Chunks of buffers are memoryview slices; nothing is copied.
+
+    :param int address: Address of the first byte.
+    :param data: Bytes-like object, or binary file object to read from
+      its current position.
+    :param int chunk_size: Maximum number of bytes per chunk.
+    """
+    if hasattr(data, "read"):
+        while chunk := data.read(chunk_size):
+            yield address, chunk
+            address += len(chunk)
+        return
+    try:
+        view = memoryview(data).cast("B")
+    except TypeError:
+        # Plain sequence of byte values, such as a list.
+        view = data
+    for offset in range(0, len(view), chunk_size):
+        yield address + offset, view[offset : offset + chunk_size]
+
+
+def rechunk(chunks, chunk_size):
+    """
+    Yield (address, chunk) pairs of at most chunk_size bytes.
+
+    Large chunks are split; small chunks at consecutive addresses are
+    joined, so generators can yield pieces of any size without causing
+    a command per piece.
+
+    :param chunks: Iterable of (address, bytes-like object) pairs.
+    :param int chunk_size: Maximum number of bytes per chunk.
+    """
+    pending_address = None
+    pending = bytearray()
+    for address, data in chunks:
+        if pending and address != pending_address + len(pending):
+            yield pending_address, bytes(pending)
+            pending.clear()
+        if not pending:
+            pending_address = address
+        for piece_address, piece in iter_chunks(address, data, chunk_size):
+            if not pending and len(piece) == chunk_size:
+                # Full chunk: pass it on without copying.
+                yield piece_address, piece
+                pending_address = piece_address + chunk_size
+                continue
+            room = chunk_size - len(pending)
+            pending += piece[:room]
+            if len(pending) == chunk_size:
+                yield pending_address, bytes(pending)
+                pending.clear()
+                pending += piece[room:]
+                pending_address = piece_address + room
+    if pending:
+        yield pending_address, bytes(pending)
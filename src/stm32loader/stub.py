@@ -0,0 +1,284 @@
+"""
+Program flash through a flashing agent (stub) running from RAM.
+
+The ROM bootloader accepts at most 256 bytes per WRITE_MEMORY and only
+acknowledges a chunk after it is programmed, so the UART idles while
+the flash is busy. Like esptool, stm32loader can instead upload a small
+flashing agent to RAM with WRITE_MEMORY, start it with GO, and stream
+large frames to it. The stub receives the next frame while it programs
+the previous one.
+
+Stub images are raw binaries, linked to run from the start of the
+device's usable RAM (DeviceInfo.ram). They start with a vector table:
+the GO command takes the stack pointer and entry point from it. Flash
+controllers differ per family, so the StubRegistry holds one image per
+device family. stm32loader doesn't ship stub binaries; register them
+with REGISTRY.register(), or put them in the directory given by the
+STM32LOADER_STUB_DIR environment variable as <family>.bin, such as
+f4.bin. Without a stub, the caller keeps using the ROM bootloader.
+
+The stub only leaves through a hardware reset into the ROM bootloader,
+so it's only used on connections that control the reset line.
+
+Protocol, all little-endian:
+
+* Request: sync byte 0xA5, opcode, sequence number, zero, address
+  (32 bits), payload length (32 bits), payload, CRC32 of all of these.
+* Reply: sync byte 0xA5, opcode | 0x80, sequence number, status, value
+  (32 bits), CRC32 of all of these.
+
+HELLO replies with the maximum payload size. WRITE is acknowledged as
+soon as the frame is received intact; a programming error is reported
+by the next reply, with the failing address as value. FLUSH waits for
+programming to finish. ERASE erases the pages overlapping address and
+length; CHECKSUM replies with the CRC32 of that range.
+"""
+
+import contextlib
+import enum
+import os
+import struct
+import zlib
+from pathlib import Path
+
+from stm32loader import log, stream
+from stm32loader.bootloader import CommandError, Stm32LoaderError
+
+SYNC = 0xA5
+REQUEST = struct.Struct("<BBBBII")
+REPLY = struct.Struct("<BBBBI")
+CRC = struct.Struct("<I")
+
+# Frames sent before waiting for the oldest reply; the stub has two
+# frame buffers.
+WINDOW = 2
+
+
+class Opcode(enum.IntEnum):
+    """Stub protocol request types."""
+
+    HELLO = 0x01
+    ERASE = 0x02
+    WRITE = 0x03
+    FLUSH = 0x04
+    CHECKSUM = 0x05
+
+
+class Status(enum.IntEnum):
+    """Stub protocol reply status values."""
+
+    OK = 0x00
+    CRC_ERROR = 0x01
+    FLASH_ERROR = 0x02
+    BAD_ADDRESS = 0x03
+    BAD_REQUEST = 0x04
+
+
+class StubError(Stm32LoaderError):
+    """Exception: the flashing stub failed or did not respond."""
+
+
+def encode_request(opcode, sequence, address=0, payload=b""):
+    """Return a request frame, with CRC32."""
+    frame = REQUEST.pack(SYNC, opcode, sequence & 0xFF, 0, address, len(payload)) + bytes(payload)
+    return frame + CRC.pack(zlib.crc32(frame))
+
+
+def encode_reply(opcode, sequence, status, value=0):
+    """Return a reply frame, with CRC32."""
+    frame = REPLY.pack(SYNC, opcode | 0x80, sequence & 0xFF, status, value)
+    return frame + CRC.pack(zlib.crc32(frame))
+
+
+class StubRegistry:
+    """Find the stub image for a device family."""
+
+    def __init__(self, directory=None):
+        """
+        Construct a StubRegistry.
+
+        :param directory: Directory with <family>.bin images, to use
+          for families without a registered image.
+        """
+        self.directory = directory
+        self._images = {}
+
+    def register(self, family, image):
+        """
+        Register the stub image for the given family.
+
+        :param str family: Device family name, such as 'F4'.
+        :param bytes image: Raw binary, linked for the RAM start.
+        """
+        self._images[family.upper()] = bytes(image)
+
+    def find(self, family):
+        """Return the stub image for the given family name, or None."""
+        image = self._images.get(family.upper())
+        if image is not None:
+            return image
+        if self.directory is None:
+            return None
+        path = Path(self.directory) / f"{family.lower()}.bin"
+        if not path.is_file():
+            return None
+        return path.read_bytes()
+
+
+REGISTRY = StubRegistry(os.environ.get("STM32LOADER_STUB_DIR"))
+
+
+class StubClient:
+    """Host side of the stub protocol."""
+
+    def __init__(self, stm32, erase_timeout=30):
+        """
+        Construct a StubClient, talking over the bootloader's connection.
+
+        Call hello() before anything else.
+
+        :param Stm32Bootloader stm32: Bootloader whose connection runs
+          the stub. Its read() and write() are used, so stats and
+          protocol logs include the stub traffic.
+        :param float erase_timeout: Seconds to wait for ERASE and FLUSH.
+        """
+        self.stm32 = stm32
+        self.erase_timeout = erase_timeout
+        self.max_payload = None
+        self._sequence = 0
+
+    def hello(self):
+        """Check that the stub runs; return its maximum payload size."""
+        self.max_payload = self._transact(Opcode.HELLO)
+        return self.max_payload
+
+    def erase(self, address, length):
+        """Erase the flash pages overlapping the given range."""
+        with self._timeout(self.erase_timeout):
+            self._transact(Opcode.ERASE, address, struct.pack("<I", length))
+
+    def checksum(self, address, length):
+        """Return the CRC32 of the given memory range, as zlib.crc32()."""
+        with self._timeout(self.erase_timeout):
+            return self._transact(Opcode.CHECKSUM, address, struct.pack("<I", length))
+
+    def flush(self):
+        """Wait until all written data is programmed."""
+        with self._timeout(self.erase_timeout):
+            self._transact(Opcode.FLUSH)
+
+    def write_memory_data(self, address, data):
+        """
+        Write the data to flash in frames of max_payload bytes.
+
+        Keep WINDOW frames in flight, so the stub can receive a frame
+        while programming the previous one. Finish with flush().
+
+        :param data: Any data write_memory_data() of the bootloader
+          accepts; see stm32loader.stream.
+        """
+        if stream.data_length(data) is None and not hasattr(data, "read"):
+            frames = stream.rechunk(data, self.max_payload)
+        else:
+            frames = stream.iter_chunks(address, data, self.max_payload)
+        in_flight = []
+        for frame_address, payload in frames:
+            if len(in_flight) == WINDOW:
+                self._receive_reply(*in_flight.pop(0))
+            self.stm32.debug(
+                10,
+                "Stub write %d bytes at 0x%X",
+                len(payload),
+                frame_address,
+                logger=log.PROGRESS,
+            )
+            in_flight.append(self._send_request(Opcode.WRITE, frame_address, payload))
+        for request in in_flight:
+            self._receive_reply(*request)
+        self.flush()
+
+    def _transact(self, opcode, address=0, payload=b""):
+        return self._receive_reply(*self._send_request(opcode, address, payload))
+
+    def _send_request(self, opcode, address, payload):
+        sequence = self._sequence
+        self._sequence = (self._sequence + 1) & 0xFF
+        self.stm32.write(encode_request(opcode, sequence, address, payload))
+        return opcode, sequence
+
+    def _receive_reply(self, opcode, sequence):
+        reply = bytes(self.stm32.read(REPLY.size + CRC.size))
+        if len(reply) < REPLY.size + CRC.size:
+            raise StubError(f"No reply from stub to {opcode.name}")
+        (checksum,) = CRC.unpack_from(reply, REPLY.size)
+        if checksum != zlib.crc32(reply[: REPLY.size]):
+            raise StubError(f"Corrupt reply from stub to {opcode.name}")
+        sync, reply_opcode, reply_sequence, status, value = REPLY.unpack_from(reply)
+        if sync != SYNC or reply_opcode != opcode | 0x80 or reply_sequence != sequence:
+            raise StubError(f"Unexpected reply from stub to {opcode.name}: {reply.hex()}")
+        if status != Status.OK:
+            try:
+                status = Status(status).name
+            except ValueError:
+                status = hex(status)
+            raise StubError(f"Stub {opcode.name} failed: {status} (0x{value:08X})")
+        return value
+
+    @contextlib.contextmanager
+    def _timeout(self, timeout):
+        """Raise the connection's read timeout for the duration of a block."""
+        connection = self.stm32.connection
+        previous_timeout = connection.timeout
+        connection.timeout = max(timeout, previous_timeout)
+        try:
+            yield
+        finally:
+            connection.timeout = previous_timeout
+
+
+def load_stub(stm32, registry=None):
+    """
+    Upload the stub for the detected device to RAM and start it.
+
+    If there's no stub for the device family, it doesn't fit in RAM, or
+    the connection doesn't advertise reset control (TOGGLES_RESET), keep
+    using the ROM bootloader.
+    If the stub doesn't respond, reset the device back into the ROM
+    bootloader.
+
+    :param Stm32Bootloader stm32: Bootloader of the detected device.
+    :param StubRegistry registry: Where to find stubs; default REGISTRY.
+    :return StubClient: Running stub, or None to use the ROM bootloader.
+    """
+    registry = registry or REGISTRY
+    device = stm32.device
+    if device is None or not device.ram or device.flash.size is None:
+        return None
+    if not getattr(stm32.connection, "TOGGLES_RESET", False):
+        # Without a reset, there's no way back from the stub.
+        stm32.debug(0, "Can't reset the device to leave a flashing stub; use the ROM bootloader")
+        return None
+    image = registry.find(device.family.name)
+    if image is None:
+        stm32.debug(5, "No flashing stub for %s devices", device.family.name)
+        return None
+    ram_start, ram_end = device.ram[0] if isinstance(device.ram[0], tuple) else device.ram
+    if len(image) > ram_end - ram_start:
+        stm32.debug(0, "Flashing stub does not fit in RAM; use the ROM bootloader")
+        return None
+
+    stm32.debug(5, "Upload %d byte flashing stub to 0x%X", len(image), ram_start)
+    stm32.write_memory_data(ram_start, image)
+    stm32.go(ram_start)
+    client = StubClient(stm32)
+    try:
+        max_payload = client.hello()
+    except StubError as e:
+        stm32.debug(0, f"Flashing stub did not start ({e}); use the ROM bootloader")
+        try:
+            stm32.reset_from_system_memory()
+        except CommandError as reset_error:
+            raise StubError("Can't return to the ROM bootloader") from reset_error
+        return None
+    stm32.debug(5, "Flashing stub running; %d byte frames", max_payload)
+    return client
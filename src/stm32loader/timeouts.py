@@ -0,0 +1,117 @@
+"""
+Derive command timeouts and time estimates from the device's flash timing.
+
+The serial connection has a single read timeout, which has to be long
+enough for the slowest command. That makes a dead or unresponsive
+device take seconds to notice. Knowing the baud rate and how long the
+flash takes to program and erase (see device_family.FlashTiming), each
+command can get a deadline that fits its size instead.
+"""
+
+import math
+
+# Start bit, 8 data bits, parity bit and stop bit.
+BITS_PER_BYTE = 11
+
+
+def transfer_time(byte_count, baud_rate):
+    """Return the seconds needed to send the given number of bytes."""
+    return byte_count * BITS_PER_BYTE / baud_rate
+
+
+def program_time(flash_timing, byte_count):
+    """
+    Return the seconds needed to program the given number of bytes.
+
+    :param FlashTiming flash_timing: Flash characteristics of the device.
+    :return float: Time in seconds, or None if unknown.
+    """
+    if flash_timing.word_program_time is None:
+        return None
+    return math.ceil(byte_count / flash_timing.word_size) * flash_timing.word_program_time
+
+
+def erase_time(flash_timing, page_count=None):
+    """
+    Return the seconds needed to erase the given number of pages.
+
+    :param FlashTiming flash_timing: Flash characteristics of the device.
+    :param int page_count: Number of pages (or sectors) to erase.
+      Set to None for a mass erase.
+    :return float: Time in seconds, or None if unknown.
+    """
+    if page_count is None:
+        return flash_timing.mass_erase_time
+    page_erase_time = flash_timing.page_erase_time or flash_timing.sector_erase_time
+    if page_erase_time is None:
+        return None
+    return page_count * page_erase_time
+
+
+class TimeoutPolicy:
+    """Calculate operation-sized deadlines for bootloader commands."""
+
+    # Seconds to wait for an erase of unknown duration.
+    FALLBACK_ERASE_TIMEOUT = 30
+
+    def __init__(self, baud_rate=115200, margin=2.0, latency=0.1):
+        """
+        Construct a TimeoutPolicy.
+
+        :param int baud_rate: Baud rate of the serial connection.
+        :param float margin: Multiply expected durations by this.
+        :param float latency: Seconds to add to each deadline, for
+          serial adapter latency and bootloader processing.
+        """
+        self.baud_rate = baud_rate
+        self.margin = margin
+        self.latency = latency
+
+    def command_timeout(self, flash_timing, transfer_size):
+        """
+        Return the read timeout for regular commands, such as a write.
+
+        The slowest regular command transfers a full chunk of data,
+        and may need to program it before replying.
+
+        :return float: Timeout in seconds, or None if the program time
+          of the flash is unknown.
+        """
+        chunk_program_time = program_time(flash_timing, transfer_size)
+        if chunk_program_time is None:
+            return None
+        chunk_transfer_time = transfer_time(transfer_size + 2, self.baud_rate)
+        return self.latency + self.margin * (chunk_transfer_time + chunk_program_time)
+
+    def erase_timeout(self, flash_timing, page_count=None):
+        """
+        Return the seconds to wait for an erase command to finish.
+
+        Use FALLBACK_ERASE_TIMEOUT if the erase time is unknown.
+        """
+        expected_time = erase_time(flash_timing, page_count)
+        if expected_time is None:
+            return self.FALLBACK_ERASE_TIMEOUT
+        page_list_time = transfer_time(2 * (page_count or 0) + 3, self.baud_rate)
+        return self.latency + self.margin * (expected_time + page_list_time)
+
+    def write_time(self, flash_timing, byte_count, transfer_size):
+        """
+        Return the expected seconds to write the given number of bytes.
+
+        :return float: Time in seconds, or None if unknown.
+        """
+        chunk_program_time = program_time(flash_timing, transfer_size)
+        if chunk_program_time is None:
+            return None
+        chunk_count = math.ceil(byte_count / transfer_size)
+        # Command, address and length bytes, with checksums.
+        chunk_transfer_time = transfer_time(transfer_size + 9, self.baud_rate)
+        return chunk_count * (chunk_transfer_time + chunk_program_time)
+
+    def read_time(self, byte_count, transfer_size):
+        """Return the expected seconds to read the given number of bytes."""
+        chunk_count = math.ceil(byte_count / transfer_size)
+        # Command, address and length bytes with checksums, and the ACKs.
+        overhead_time = transfer_time(12, self.baud_rate)
+        return transfer_time(byte_count, self.baud_rate) + chunk_count * overhead_time
@@ -0,0 +1,201 @@
+"""
+Record the serial traffic of a session, and replay it without hardware.
+
+TraceRecorder wraps a connection (SerialConnection, or anything with
+read() and write()) and stores every chunk of bytes in each direction
+with its timestamp in a compact binary file. TraceReplayer plays such a
+file back to Stm32Bootloader as a fake connection, which makes a
+recorded session into a deterministic test, and read_trace() and
+reply_latencies() help to find where a session spent its time.
+
+File format: the MAGIC header, followed by one record per read() or
+write() call: direction (b'W' or b'R'), microseconds since the start
+(unsigned 64-bit) and data length (unsigned 32-bit), all little-endian,
+then the data itself.
+"""
+
+import struct
+import time
+
+from stm32loader.bootloader import Stm32LoaderError
+
+MAGIC = b"STM32TRACE1\n"
+RECORD_HEADER = struct.Struct("<cQI")
+
+WRITE = b"W"
+READ = b"R"
+
+
+class TraceMismatchError(Stm32LoaderError):
+    """Exception: replayed session deviates from the recorded trace."""
+
+
+class TraceRecord:  # pylint: disable=too-few-public-methods
+    """One read() or write() call of a recorded session."""
+
+    __slots__ = ("direction", "timestamp", "data")
+
+    def __init__(self, direction, timestamp, data):
+        """
+        Construct a TraceRecord.
+
+        :param bytes direction: WRITE or READ.
+        :param float timestamp: Seconds since the start of the trace.
+        :param bytes data: Bytes written or read.
+        """
+        self.direction = direction
+        self.timestamp = timestamp
+        self.data = data
+
+    def __repr__(self):
+        return f"TraceRecord({self.direction!r}, {self.timestamp:.6f}, {self.data.hex()!r})"
+
+
+def read_trace(path):
+    """Return the TraceRecords stored in the given trace file."""
+    with open(path, "rb") as trace_file:
+        if trace_file.read(len(MAGIC)) != MAGIC:
+            raise Stm32LoaderError(f"Not a stm32loader trace file: {path}")
+        records = []
+        while header := trace_file.read(RECORD_HEADER.size):
+            if len(header) < RECORD_HEADER.size:
+                # Truncated by a crash; keep the complete records.
+                break
+            direction, microseconds, length = RECORD_HEADER.unpack(header)
+            data = trace_file.read(length)
+            if len(data) < length:
+                break
+            records.append(TraceRecord(direction, microseconds / 1e6, data))
+    return records
+
+
+def reply_latencies(records):
+    """
+    Return the time between each write and the read that follows it.
+
+    :return list: (timestamp of the write, seconds until the reply) tuples.
+    """
+    latencies = []
+    last_write = None
+    for record in records:
+        if record.direction == WRITE:
+            last_write = record
+        elif last_write is not None:
+            latencies.append((last_write.timestamp, record.timestamp - last_write.timestamp))
+            last_write = None
+    return latencies
+
+
+class TraceRecorder:
+    """Connection wrapper that records all traffic to a trace file."""
+
+    def __init__(self, connection, path):
+        """
+        Construct a TraceRecorder and start a new trace file.
+
+        :param connection: Object supporting read() and write(), such as
+          SerialConnection. Other attributes are passed through.
+        :param path: Path of the trace file to write.
+        """
+        self.connection = connection
+        self._file = open(path, "wb")  # pylint: disable=consider-using-with
+        self._file.write(MAGIC)
+        self._start_time = time.monotonic()
+
+    def __getattr__(self, name):
+        # Pass through enable_reset(), enable_boot0(), TOGGLES_RESET etc.
+        return getattr(self.connection, name)
+
+    @property
+    def timeout(self):
+        """Get the timeout of the wrapped connection."""
+        return self.connection.timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        """Set the timeout of the wrapped connection."""
+        self.connection.timeout = timeout
+
+    def write(self, data):
+        """Write the data to the connection and record it."""
+        result = self.connection.write(data)
+        self._record(WRITE, bytes(data))
+        return result
+
+    def read(self, *args):
+        """Read from the connection and record the data."""
+        data = self.connection.read(*args)
+        self._record(READ, bytes(data))
+        return data
+
+    def close(self):
+        """Close the trace file."""
+        if not self._file.closed:
+            self._file.close()
+
+    def _record(self, direction, data):
+        microseconds = int((time.monotonic() - self._start_time) * 1e6)
+        self._file.write(RECORD_HEADER.pack(direction, microseconds, len(data)))
+        self._file.write(data)
+
+
+class TraceReplayer:
+    """Fake connection that replays a recorded trace."""
+
+    def __init__(self, records, strict=True, realtime=False):
+        """
+        Construct a TraceReplayer.
+
+        :param records: TraceRecords, or the path of a trace file.
+        :param bool strict: Raise TraceMismatchError if the bootloader
+          writes other data than was recorded.
+        :param bool realtime: Wait as long as the recorded session did
+          before each reply, to reproduce its timing.
+        """
+        if not isinstance(records, list):
+            records = read_trace(records)
+        self.records = records
+        self.strict = strict
+        self.realtime = realtime
+        self.timeout = 5
+        self.position = 0
+        self._start_time = time.monotonic()
+
+    def write(self, data):
+        """Check the written data against the next recorded write."""
+        record = self._next_record(WRITE)
+        if self.strict and bytes(data) != record.data:
+            raise TraceMismatchError(
+                f"Record {self.position - 1}: wrote {bytes(data).hex()},"
+                f" recorded {record.data.hex()}"
+            )
+        return len(record.data)
+
+    def read(self, length=1):
+        """Return the data of the next recorded read."""
+        record = self._next_record(READ)
+        if self.strict and len(record.data) > length:
+            raise TraceMismatchError(
+                f"Record {self.position - 1}: read {length} bytes, recorded {len(record.data)}"
+            )
+        if self.realtime:
+            delay = record.timestamp - (time.monotonic() - self._start_time)
+            if delay > 0:
+                time.sleep(delay)
+        return record.data
+
+    @property
+    def finished(self):
+        """Return True if all records were replayed."""
+        return self.position >= len(self.records)
+
+    def _next_record(self, direction):
+        if self.finished:
+            raise TraceMismatchError("Replayed session continues after the end of the trace")
+        record = self.records[self.position]
+        if record.direction != direction:
+            raise TraceMismatchError(
+                f"Record {self.position}: expected {record.direction!r}, got {direction!r}"
+            )
+        self.position += 1
+        return record
@@ -33,6 +33,9 @@ class SerialConnection:
 
     # pylint: disable=too-many-instance-attributes
 
+    # The boot0 line is assumed to be connected; see Stm32Bootloader.
+    TOGGLES_BOOT0 = True
+
     def __init__(self, serial_port, baud_rate=115200, parity="E"):
         """Construct a SerialConnection (not yet connected)."""
         self.serial_port = serial_port
@@ -42,6 +45,7 @@ class SerialConnection:
         self.swap_rts_dtr = False
         self.reset_active_high = False
         self.boot0_active_low = False
+        self.reset_connected = True
 
         # don't connect yet; caller should use connect() separately
         self.serial_connection = None
@@ -92,6 +96,11 @@ class SerialConnection:
         """Read the given amount of bytes from the serial connection."""
         return self.serial_connection.read(*args, **kwargs)
 
+    @property
+    def TOGGLES_RESET(self):  # pylint: disable=invalid-name
+        """Return True if the reset line is connected; see Stm32Bootloader."""
+        return self.reset_connected
+
     def enable_reset(self, enable=True):
         """Enable or disable the reset IO line."""
         # reset on the STM32 is active low (0 Volt puts the MCU in reset)
@@ -120,6 +129,9 @@ class SerialConnection:
         else:
             self.serial_connection.setRTS(level)
 
-    def flush_imput_buffer(self):
+    def flush_input_buffer(self):
         """Flush the input buffer to remove any stale read data."""
         self.serial_connection.reset_input_buffer()
+
+    # Misspelled name of earlier versions.
+    flush_imput_buffer = flush_input_buffer
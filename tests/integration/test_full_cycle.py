@@ -1,10 +1,27 @@
+import struct
 from pathlib import Path
+from unittest.mock import MagicMock
 
+import pytest
+
+from stm32loader import bootloader, log, stub
 from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.devices import DEVICES
 from stm32loader.emulated.fake import FakeConfiguration, FakeConnection
+from stm32loader.emulated.stub import StubDevice
 from stm32loader.main import Stm32Loader
+from stm32loader.stub import StubRegistry
 
 FIRMWARE_FILE = Path(__file__).parent / "../../firmware/generic_boot20_pc13.binary.bin"
+STUB_IMAGE = b"\x00\xa0\x00\x20\x09\x14\x00\x20stub code"
+
+
+@pytest.fixture
+def console():
+    # As enabled by main().
+    log.enable_console()
+    yield
+    log.disable_console()
 
 
 def test_erase_write_verify_passes():
@@ -45,3 +62,188 @@ def test_write_protect_passes():
     loader.read_device_uid()
     loader.read_flash_size()
     loader.perform_commands()
+
+
+def test_declared_device_skips_detection():
+    loader = Stm32Loader()
+    loader.configuration = FakeConfiguration(
+        erase=False,
+        write=False,
+        verify=False,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file=None,
+    )
+    loader.configuration.device = DEVICES[(0x422, 0x41)]
+    loader.configuration.check_device_id = True
+    loader.connection = FakeConnection()
+    loader.stm32 = Stm32Bootloader(loader.connection, device=loader.configuration.device)
+    loader.stm32.detect_device = MagicMock()
+
+    loader.detect_device()
+    loader.perform_commands()
+    loader.stm32.detect_device.assert_not_called()
+
+
+def test_dry_run_prints_plan_without_changing_flash(console, capsys):
+    loader = Stm32Loader()
+    loader.configuration = FakeConfiguration(
+        erase=True,
+        write=True,
+        verify=True,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file=FIRMWARE_FILE,
+    )
+    loader.configuration.dry_run = True
+    loader.connection = FakeConnection()
+    loader.stm32 = Stm32Bootloader(loader.connection, device_family="F1", verbosity=5)
+    loader.stm32.erase_memory = MagicMock()
+    loader.stm32.write_memory_data = MagicMock()
+
+    loader.detect_device()
+    loader.perform_commands()
+
+    assert "Plan:" in capsys.readouterr().out
+    loader.stm32.erase_memory.assert_not_called()
+    loader.stm32.write_memory_data.assert_not_called()
+
+
+def test_erase_write_verify_through_stub_passes(monkeypatch, console, capsys):
+    monkeypatch.setattr(bootloader.time, "sleep", lambda _seconds: None)
+    registry = StubRegistry()
+    registry.register("F3", STUB_IMAGE)
+    monkeypatch.setattr(stub, "REGISTRY", registry)
+    loader = Stm32Loader()
+    loader.configuration = FakeConfiguration(
+        erase=True,
+        write=True,
+        verify=True,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file=FIRMWARE_FILE,
+    )
+    loader.configuration.stub = True
+    loader.connection = StubDevice(STUB_IMAGE)
+    loader.stm32 = Stm32Bootloader(loader.connection, verbosity=5)
+
+    loader.detect_device()
+    loader.perform_commands()
+
+    firmware = FIRMWARE_FILE.read_bytes()
+    assert loader.connection.flash_memory[: len(firmware)] == firmware
+    output = capsys.readouterr().out
+    assert "Writing through the flashing stub" in output
+    assert "Verification OK" in output
+
+
+def checksum_loader(firmware_file, get_checksum=True):
+    loader = Stm32Loader()
+    loader.configuration = FakeConfiguration(
+        erase=False,
+        write=False,
+        verify=True,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file=firmware_file,
+    )
+    loader.configuration.verify_checksum = True
+    loader.connection = FakeConnection()
+    if get_checksum:
+        commands = [0x0, 0x01, 0x02, 0x11, 0x31, 0x43, 0x44, 0xA1]
+        loader.connection.COMMAND_RESPONSES = {
+            **FakeConnection.COMMAND_RESPONSES,
+            Stm32Bootloader.Command.GET: [8, 0x05, commands, FakeConnection.ACK],
+        }
+    loader.stm32 = Stm32Bootloader(loader.connection, verbosity=5)
+    loader.detect_device()
+    return loader
+
+
+def test_verify_checksum_skips_read_back(tmp_path, console, capsys):
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(b"firmware")
+    loader = checksum_loader(firmware_file)
+    loader.connection.flash_memory[:8] = b"firmware"
+    loader.stm32.read_memory_data = MagicMock()
+
+    loader.perform_commands()
+
+    assert "Verification OK (checksum)" in capsys.readouterr().out
+    loader.stm32.read_memory_data.assert_not_called()
+
+
+def test_verify_checksum_reads_back_without_device_support(tmp_path, console, capsys):
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(b"firmware")
+    loader = checksum_loader(firmware_file, get_checksum=False)
+    loader.connection.flash_memory[:8] = b"firmware"
+
+    loader.perform_commands()
+
+    output = capsys.readouterr().out
+    assert "No checksum support" in output
+    assert "Verification OK\n" in output
+
+
+def test_verify_checksum_without_stub_option_does_not_load_stub(tmp_path, monkeypatch):
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(b"firmware")
+    loader = checksum_loader(firmware_file, get_checksum=False)
+    loader.connection.flash_memory[:8] = b"firmware"
+    load_stub = MagicMock(return_value=None)
+    monkeypatch.setattr(stub, "load_stub", load_stub)
+
+    loader.perform_commands()
+    load_stub.assert_not_called()
+
+    loader.configuration.stub = True
+    loader.configuration.no_reset = True
+    loader.perform_commands()
+    load_stub.assert_not_called()
+
+    loader.configuration.no_reset = False
+    loader.perform_commands()
+    load_stub.assert_called_once_with(loader.stm32)
+
+
+def test_verify_checksum_mismatch_reads_back_to_locate_differences(tmp_path, console, capsys):
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(b"firmware")
+    loader = checksum_loader(firmware_file)
+    loader.connection.flash_memory[:8] = b"firmwarE"
+
+    with pytest.raises(SystemExit):
+        loader.perform_commands()
+
+    assert "First mismatch at address: 0x7" in capsys.readouterr().err
+
+
+def test_ram_mode_runs_image_from_ram_without_touching_flash(tmp_path):
+    ram_image = struct.pack("<II", 0x2000_A000, 0x2000_1409) + b"test firmware"
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(ram_image)
+    loader = Stm32Loader()
+    loader.configuration = FakeConfiguration(
+        erase=True,
+        write=True,
+        verify=True,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file=firmware_file,
+    )
+    loader.configuration.ram = True
+    loader.connection = FakeConnection()
+    loader.connection.flash_memory[:] = b"\xaa" * len(loader.connection.flash_memory)
+    loader.stm32 = Stm32Bootloader(loader.connection, verbosity=5)
+    loader.stm32.reset_from_flash = MagicMock()
+
+    loader.detect_device()
+    loader.perform_commands()
+    loader.reset()
+
+    ram_offset = 0x1400
+    assert loader.connection.ram_memory[ram_offset : ram_offset + len(ram_image)] == ram_image
+    assert loader.connection.go_address == 0x2000_1400
+    assert set(loader.connection.flash_memory) == {0xAA}
+    loader.stm32.reset_from_flash.assert_not_called()
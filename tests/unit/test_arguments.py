@@ -19,6 +19,13 @@ def test_parse_arguments_with_standard_args_passes(program):
     program.parse_arguments(["-p", "port", "-b", "9600", "-q"])
 
 
+def test_parse_arguments_no_reset(program):
+    program.parse_arguments(["-p", "port"])
+    assert not program.configuration.no_reset
+    program.parse_arguments(["-p", "port", "--no-reset"])
+    assert program.configuration.no_reset
+
+
 @pytest.mark.parametrize(
     "help_argument",
     ["-h", "--help"],
@@ -51,3 +58,43 @@ def test_parse_arguments_write_unprotect(program):
 
 def test_parse_arguments_write_protect(program):
     program.parse_arguments(["--write-protect"])
+
+
+def test_parse_arguments_device_resolves_device_info(program):
+    program.parse_arguments(["-p", "port", "--device", "0x413:0x91"])
+    assert program.configuration.device.product_id == 0x413
+    assert program.configuration.device.bootloader_id == 0x91
+    assert program.configuration.family == "F4"
+
+
+def test_parse_arguments_unknown_device_raises_systemexit(program, capsys):
+    with pytest.raises(SystemExit):
+        program.parse_arguments(["-p", "port", "--device", "STM32F999"])
+    _output, error_output = capsys.readouterr()
+    assert "Unknown device" in error_output
+
+
+def test_parse_arguments_retries_defaults_to_three(program):
+    program.parse_arguments(["-p", "port"])
+    assert program.configuration.retries == 3
+    program.parse_arguments(["-p", "port", "--retries", "0"])
+    assert program.configuration.retries == 0
+
+
+def test_parse_arguments_ram_needs_write(program, capsys):
+    with pytest.raises(SystemExit):
+        program.parse_arguments(["-p", "port", "--ram"])
+    _output, error_output = capsys.readouterr()
+    assert "--ram needs --write" in error_output
+    program.parse_arguments(["-p", "port", "--ram", "-w", "test.bin"])
+    assert program.configuration.ram
+
+
+def test_parse_arguments_snapshot_has_its_own_file(program, capsys):
+    program.parse_arguments(["-p", "port", "--snapshot", "snapshot.zip", "-w", "fw.bin"])
+    assert program.configuration.snapshot == "snapshot.zip"
+    assert program.configuration.data_file == "fw.bin"
+    with pytest.raises(SystemExit):
+        program.parse_arguments(["-p", "port", "--snapshot", "fw.bin", "-w", "fw.bin"])
+    _output, error_output = capsys.readouterr()
+    assert "--snapshot would overwrite FILE.BIN" in error_output
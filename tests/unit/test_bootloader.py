@@ -1,5 +1,6 @@
 """Unit tests for the Stm32Loader class."""
 
+import threading
 from unittest.mock import MagicMock
 
 import pytest
@@ -8,6 +9,7 @@ from stm32loader import bootloader as Stm32
 from stm32loader.bootloader import PageIndexError, Stm32Bootloader
 from stm32loader.device_info import DeviceInfo
 from stm32loader.devices import DEVICES
+from stm32loader.emulated.fake import FakeConnection
 
 # pylint: disable=missing-docstring, redefined-outer-name
 
@@ -204,6 +206,87 @@ def test_extended_erase_with_pages_sends_two_byte_sector_addresses_with_single_b
     assert write.data_was_written(b"\x00\x01\x00\x02\x00\x04\x0f\xf0\xfb")
 
 
+@pytest.fixture
+def dual_bank_bootloader(connection):
+    # STM32F42xxx/43xxx, two banks of 1 MiB.
+    bootloader = Stm32Bootloader(connection, device=DEVICES[(0x419, 0x91)])
+    bootloader.extended_erase = True
+    bootloader.get_flash_size = MagicMock(return_value=2048)
+    # Option bytes with DB1M cleared.
+    bootloader.read_memory = MagicMock(return_value=bytearray(b"\xff\x0f\x00\xf0"))
+    return bootloader
+
+
+@pytest.mark.parametrize("bank, written", [(1, b"\xff\xfe\x01"), (2, b"\xff\xfd\x02")])
+def test_erase_bank_sends_bank_erase_code_with_checksum(
+    dual_bank_bootloader, write, bank, written
+):
+    dual_bank_bootloader.erase_bank(bank)
+    assert write.data_was_written(written)
+
+
+def test_erase_bank_without_extended_erase_raises_command_error(bootloader):
+    with pytest.raises(Stm32.CommandError, match="extended erase"):
+        bootloader.erase_bank(1)
+
+
+@pytest.mark.parametrize(
+    "start, end, banks",
+    [
+        (0x_0800_0000, 0x_0800_4000, [1]),
+        (0x_0810_0000, 0x_0820_0000, [2]),
+        (0x_080F_C000, 0x_0810_4000, [1, 2]),
+    ],
+)
+def test_banks_from_range_selects_banks_from_flash_layout(
+    dual_bank_bootloader, start, end, banks
+):
+    assert dual_bank_bootloader.banks_from_range(start, end) == banks
+
+
+def test_banks_from_range_splits_1m_flash_with_db1m_set(dual_bank_bootloader):
+    dual_bank_bootloader.get_flash_size.return_value = 1024
+    dual_bank_bootloader.read_memory.return_value = bytearray(b"\xff\x4f\x00\xb0")
+    assert dual_bank_bootloader.banks_from_range(0x_0808_0000, 0x_0808_4000) == [2]
+    dual_bank_bootloader.read_memory.assert_called_once_with(0x_1FFF_C008, 4)
+
+
+def test_banks_from_range_refuses_single_bank_mode(dual_bank_bootloader):
+    dual_bank_bootloader.get_flash_size.return_value = 1024
+    with pytest.raises(Stm32.Stm32LoaderError, match="single-bank mode"):
+        dual_bank_bootloader.banks_from_range(0x_0800_0000, 0x_0800_4000)
+
+
+@pytest.mark.parametrize("flash_size", [Stm32.CommandError("NACK"), None, 1536])
+def test_banks_from_range_refuses_unknown_flash_size(dual_bank_bootloader, flash_size):
+    dual_bank_bootloader.get_flash_size.side_effect = [flash_size]
+    with pytest.raises(Stm32.Stm32LoaderError):
+        dual_bank_bootloader.banks_from_range(0x_0800_0000, 0x_0800_4000)
+
+
+def test_banks_from_range_refuses_unreadable_bank_mode(dual_bank_bootloader):
+    dual_bank_bootloader.get_flash_size.return_value = 1024
+    dual_bank_bootloader.read_memory.side_effect = Stm32.CommandError("NACK")
+    with pytest.raises(Stm32.Stm32LoaderError, match="option bit"):
+        dual_bank_bootloader.banks_from_range(0x_0800_0000, 0x_0800_4000)
+
+
+def test_get_flash_banks_uses_fixed_bank2_address(connection):
+    # STM32G47xxx/48xxx with 256 KiB and DBANK set.
+    bootloader = Stm32Bootloader(connection, device=DEVICES[(0x469, 0xD5)])
+    bootloader.get_flash_size = MagicMock(return_value=256)
+    bootloader.read_memory = MagicMock(return_value=bytearray(b"\xaa\xf8\xff\xfb"))
+    assert bootloader.get_flash_banks() == [
+        (0x_0800_0000, 0x_0802_0000),
+        (0x_0804_0000, 0x_0806_0000),
+    ]
+
+
+def test_banks_from_range_on_single_bank_device_raises_error(bootloader):
+    with pytest.raises(Stm32.Stm32LoaderError, match="dual-bank"):
+        bootloader.banks_from_range(0x_0800_0000, 0x_0800_0800)
+
+
 def test_write_protect_sends_command_page_addresses_and_checksum(bootloader, write):
     bootloader.get_flash_size = MagicMock()
     bootloader.get_flash_size.return_value = 16
@@ -500,3 +583,180 @@ def test_get_flash_size_and_uid_bulk_populates_both_caches(connection):
 
     # read_memory should still have been called only once.
     bootloader.read_memory.assert_called_once()
+
+
+def test_detect_device_reads_identity_registers_in_a_single_read():
+    bootloader = Stm32Bootloader(FakeConnection(), verbosity=0)
+    bootloader.read_memory = MagicMock(wraps=bootloader.read_memory)
+
+    bootloader.detect_device()
+    assert bootloader.get_flash_size() == 256
+    assert bootloader.format_uid(bootloader.get_uid()) == "0001-0203-04050607-08090A0B"
+
+    # F3 bootloader ID, UID and flash size are within 56 bytes.
+    bootloader.read_memory.assert_called_once_with(0x_1FFF_F796, 0x38)
+
+
+def test_detect_device_reads_bootloader_id_alone_if_batched_read_fails():
+    bootloader = Stm32Bootloader(FakeConnection(), verbosity=0)
+    batched_read_failed = Stm32.CommandError("NACK 0x11 address failed")
+    bootloader.read_memory = MagicMock(
+        side_effect=[batched_read_failed, b"\x41", b"uid-12-bytes", b"\x00\x01"]
+    )
+
+    bootloader.detect_device()
+    assert bootloader.device.bootloader_id == 0x41
+    assert bootloader.get_flash_size() == 256
+
+
+def test_detect_device_does_not_repeat_failed_bootloader_id_read():
+    bootloader = Stm32Bootloader(FakeConnection(), verbosity=0)
+    bootloader.read_memory = MagicMock(side_effect=Stm32.CommandError("NACK"))
+
+    with pytest.raises(Stm32.CommandError):
+        bootloader.detect_device()
+    # The batched read, then each register alone; the bootloader ID once.
+    assert bootloader.read_memory.call_count == 4
+
+
+def test_read_device_properties_reads_bootloader_id_without_padding():
+    # STM32F40xxx/41xxx: UID and flash size need an aligned block read.
+    bootloader = Stm32Bootloader(FakeConnection(), device=DEVICES[(0x413, 0x91)], verbosity=0)
+    bootloader.read_memory = MagicMock(side_effect=Stm32.CommandError("NACK"))
+
+    failures = {}
+    assert bootloader.read_device_properties(failures) == {}
+    assert [call.args for call in bootloader.read_memory.call_args_list] == [
+        (0x_1FFF_77DE, 1),
+        (0x_1FFF_7A00, 256),
+    ]
+    assert set(failures) == {"bootloader_id", "uid", "flash_size"}
+
+
+def test_device_properties_are_cached_per_instance():
+    bootloaders = [
+        Stm32Bootloader(FakeConnection(), device=DEVICES[(0x410, None)]) for _ in range(4)
+    ]
+    for bootloader in bootloaders:
+        bootloader.read_memory = MagicMock(return_value=b"\x80\x00")
+        bootloader.get_flash_size()
+    for bootloader in bootloaders:
+        assert bootloader.get_flash_size() == 128
+        bootloader.read_memory.assert_called_once()
+
+
+def test_device_properties_are_read_once_by_concurrent_threads(connection):
+    bootloader = Stm32Bootloader(connection, device=DEVICES[(0x410, None)])
+    bootloader.read_memory = MagicMock(return_value=b"uid-12-bytes")
+    threads = [threading.Thread(target=bootloader.get_uid) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bootloader.read_memory.assert_called_once()
+
+
+def test_reset_invalidates_device_properties(connection):
+    bootloader = Stm32Bootloader(connection, device=DEVICES[(0x410, None)])
+    bootloader.read_memory = MagicMock(side_effect=[b"\x80\x00", b"\x40\x00"])
+    assert bootloader.get_flash_size() == 128
+    bootloader.reset_from_flash()
+    assert bootloader.get_flash_size() == 64
+
+
+def test_reset_leaves_unconnected_reset_line_alone(connection):
+    connection.TOGGLES_RESET = False
+    Stm32Bootloader(connection).reset_from_flash()
+    connection.enable_reset.assert_not_called()
+    connection.enable_boot0.assert_called_once_with(False)
+
+
+def test_bulk_read_serves_both_flash_size_and_uid(connection):
+    # STM32F40xxx/41xxx.
+    bootloader = Stm32Bootloader(connection, device=DEVICES[(0x413, None)])
+    memory_block = bytearray(256)
+    memory_block[0x10:0x1C] = b"bulk uid 12b"
+    memory_block[0x22:0x24] = b"\x00\x02"
+    bootloader.read_memory = MagicMock(return_value=memory_block)
+
+    assert bootloader.get_flash_size() == 512
+    assert bootloader.get_uid() == b"bulk uid 12b"
+    bootloader.read_memory.assert_called_once_with(0x_1FFF_7A00, 256)
+
+
+def test_get_capabilities_picks_id_and_erase_commands():
+    command = Stm32Bootloader.Command
+    capabilities = Stm32.get_capabilities(0x31, frozenset([0x00, 0x01, 0x02, 0x11, 0x43, 0x44]))
+    assert capabilities.id_command == command.GET_ID
+    assert capabilities.erase_command == command.EXTENDED_ERASE
+    assert not capabilities.extensions
+
+
+def test_get_capabilities_detects_vendor_extensions():
+    capabilities = Stm32.get_capabilities(0x10, frozenset([0x00, 0x06, 0x11, 0x43, 0xB3]))
+    assert capabilities.id_command == Stm32Bootloader.Command.GET_GD_ID
+    assert capabilities.erase_command == Stm32Bootloader.Command.ERASE
+    assert capabilities.extensions == {0x06, 0xB3}
+
+
+def test_get_capabilities_is_cached_per_version_and_command_set():
+    commands = frozenset([0x00, 0x02])
+    assert Stm32.get_capabilities(0x31, commands) is Stm32.get_capabilities(0x31, commands)
+    assert Stm32.get_capabilities(0x31, commands) is not Stm32.get_capabilities(0x22, commands)
+
+
+def test_get_product_id_uses_advertised_id_command_without_probing(bootloader):
+    bootloader.capabilities = Stm32.get_capabilities(0x10, frozenset([0x00, 0x06, 0x11]))
+    bootloader.get_id = MagicMock()
+    bootloader.get_gd_id = MagicMock(return_value=0x504D4837)
+
+    assert bootloader.get_product_id() == 0x504D4837
+    bootloader.get_id.assert_not_called()
+
+
+def test_get_product_id_without_capabilities_falls_back_to_gd_id(bootloader):
+    bootloader.get_id = MagicMock(side_effect=Stm32.CommandError("NACK"))
+    bootloader.get_gd_id = MagicMock(return_value=0x504D4837)
+    assert bootloader.get_product_id() == 0x504D4837
+
+
+def test_activate_pipelined_sends_identification_commands_in_one_burst():
+    connection = FakeConnection()
+    bootloader = Stm32Bootloader(connection, device_family="F3", verbosity=0)
+    bootloader.get_id = MagicMock()
+
+    assert bootloader.activate_pipelined() == 0x05
+    assert bootloader.extended_erase
+    assert bootloader.get_product_id() == 0x422
+    bootloader.get_id.assert_not_called()
+
+
+@pytest.mark.parametrize("device_family", [None, "GD32VW55X"])
+def test_activate_pipelined_leaves_out_get_id_unless_the_family_supports_it(device_family):
+    connection = FakeConnection()
+    written = []
+    fake_write = connection.write
+
+    def write(data):
+        written.append(bytes(data))
+        fake_write(data)
+
+    connection.write = write
+    bootloader = Stm32Bootloader(connection, device_family=device_family, verbosity=0)
+
+    assert bootloader.activate_pipelined() == 0x05
+    assert b"\x02\xfd" not in b"".join(written)
+    assert "product_id" not in bootloader.device_properties
+    # The product ID is read with the advertised ID command.
+    assert bootloader.get_product_id() == 0x422
+
+
+def test_activate_pipelined_falls_back_to_step_by_step(connection):
+    bootloader = Stm32Bootloader(connection, verbosity=0)
+    connection.read.return_value = [Stm32Bootloader.Reply.NACK]
+    bootloader.reset_from_system_memory = MagicMock()
+    bootloader.get = MagicMock(return_value=0x31)
+
+    assert bootloader.activate_pipelined() == 0x31
+    bootloader.reset_from_system_memory.assert_called_once()
+    assert "product_id" not in bootloader.device_properties
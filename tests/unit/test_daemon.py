@@ -0,0 +1,156 @@
+import base64
+import socket
+import threading
+import time
+
+import pytest
+
+from stm32loader import daemon as daemon_module
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.daemon import SessionDaemon, submit_job
+from stm32loader.emulated.fake import FakeConnection
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Needs Unix sockets")
+
+
+@pytest.fixture
+def session_factory():
+    def open_session(port):
+        open_session.ports.append(port)
+        stm32 = Stm32Bootloader(FakeConnection(), verbosity=0)
+        stm32.get()
+        stm32.detect_device()
+        return stm32
+
+    open_session.ports = []
+    return open_session
+
+
+@pytest.fixture
+def socket_path(tmp_path, session_factory):
+    socket_path = tmp_path / "stm32loader.sock"
+    daemon = SessionDaemon(socket_path, session_factory, default_port="fake")
+    thread = threading.Thread(target=daemon.serve_forever)
+    thread.start()
+    while not socket_path.exists():
+        time.sleep(0.01)
+    yield socket_path
+    daemon.shutdown()
+    thread.join()
+
+
+def run_job(socket_path, **job):
+    events = list(submit_job(socket_path, job))
+    return events[:-1], events[-1]
+
+
+def test_write_then_read_job_returns_written_data(socket_path):
+    data = bytes(range(256)) * 2
+    progress, result = run_job(
+        socket_path, op="write", address=0x_0800_0000, data=base64.b64encode(data).decode()
+    )
+    assert result == {"event": "result", "op": "write", "length": 512}
+    assert [event["index"] for event in progress] == [1, 2]
+
+    _progress, result = run_job(socket_path, op="read", address=0x_0800_0000, length=512)
+    assert base64.b64decode(result["data"]) == data
+
+
+def test_verify_job_reports_mismatch(socket_path, tmp_path):
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(b"\x01\x02\x03\x04")
+    _progress, result = run_job(
+        socket_path, op="verify", address=0x_0800_0000, file=str(firmware_file)
+    )
+    assert result["verified"] is False
+    assert "First mismatch at address: 0x0" in result["message"]
+
+
+def test_jobs_reuse_the_open_session(socket_path, session_factory):
+    run_job(socket_path, op="read", address=0x_0800_0000, length=4)
+    run_job(socket_path, op="read", address=0x_0800_0000, length=4)
+    assert session_factory.ports == ["fake"]
+
+
+def test_unknown_operation_returns_error_with_job_id(socket_path):
+    _progress, result = run_job(socket_path, op="dance", id=7)
+    assert result["event"] == "error"
+    assert result["id"] == 7
+    assert "Unknown operation" in result["message"]
+
+
+def test_shutdown_job_stops_the_daemon(socket_path):
+    _progress, result = run_job(socket_path, op="shutdown")
+    assert result["event"] == "result"
+    for _ in range(100):
+        if not socket_path.exists():
+            break
+        time.sleep(0.01)
+    assert not socket_path.exists()
+
+
+def test_go_job_closes_the_session(socket_path, session_factory):
+    _progress, result = run_job(socket_path, op="go", address=0x_0800_0000)
+    assert result == {"event": "result", "op": "go", "address": 0x_0800_0000}
+    run_job(socket_path, op="read", address=0x_0800_0000, length=4)
+    assert session_factory.ports == ["fake", "fake"]
+
+
+@pytest.mark.parametrize("line", [b"[1]\n", b'"x"\n', b'{"op": "go", "address": "x"}\n'])
+def test_malformed_job_returns_error_and_keeps_connection(socket_path, line):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(line + b'{"op": "read", "address": 134217728, "length": 4}\n')
+        with client.makefile("rb") as replies:
+            assert b'"event": "error"' in replies.readline()
+            # Progress events, then the result of the next job.
+            events = iter(replies.readline, b"")
+            assert any(b'"event": "result"' in event for event in events)
+
+
+def test_socket_is_only_accessible_by_owner(socket_path):
+    assert socket_path.stat().st_mode & 0o777 == 0o600
+
+
+def test_file_job_unmaps_the_file_when_done(socket_path, tmp_path, monkeypatch):
+    firmware_file = tmp_path / "firmware.bin"
+    firmware_file.write_bytes(b"\x01\x02\x03\x04")
+    mappings = []
+    map_file = daemon_module.stream.map_file
+
+    def recording_map_file(path):
+        view = map_file(path)
+        mappings.append(view.obj)
+        return view
+
+    monkeypatch.setattr(daemon_module.stream, "map_file", recording_map_file)
+    _progress, result = run_job(
+        socket_path, op="write", address=0x_0800_0000, file=str(firmware_file)
+    )
+    assert result["length"] == 4
+    assert mappings[0].closed
+
+
+def test_opening_a_session_does_not_block_other_ports(tmp_path):
+    slow_port_opening = threading.Event()
+    release_slow_port = threading.Event()
+
+    def open_session(port):
+        if port == "slow":
+            slow_port_opening.set()
+            release_slow_port.wait(5)
+        return Stm32Bootloader(FakeConnection(), verbosity=0)
+
+    daemon = SessionDaemon(tmp_path / "stm32loader.sock", open_session)
+    slow_thread = threading.Thread(target=daemon.session, args=("slow",))
+    slow_thread.start()
+    slow_port_opening.wait(5)
+    try:
+        assert daemon.session("fast") is daemon.sessions["fast"]
+        assert "slow" not in daemon.sessions
+    finally:
+        release_slow_port.set()
+        slow_thread.join()
+    assert "slow" in daemon.sessions
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.detection_cache import DetectionCache
+from stm32loader.emulated.fake import FakeConnection
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+PORT = "/dev/ttyFAKE0"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DetectionCache(tmp_path / "detection.json")
+
+
+class GdFakeConnection(FakeConnection):
+    """GD32VW553KIQ6: no UID, and GET_GD_ID instead of GET_ID."""
+
+    COMMAND_RESPONSES = {
+        Stm32Bootloader.Command.GET: [
+            7,
+            0x05,
+            [0x0, 0x01, 0x06, 0x11, 0x31, 0x43, 0x44],
+            FakeConnection.ACK,
+        ],
+        Stm32Bootloader.Command.GET_VERSION: [[0x05, 0x00, 0x00], FakeConnection.ACK],
+        # Part number "6KIP".
+        Stm32Bootloader.Command.GET_GD_ID: [4, [0x36, 0x4B, 0x49, 0x50], FakeConnection.ACK],
+    }
+
+
+def activated_bootloader(connection_class=FakeConnection):
+    connection = connection_class()
+    connection.commands = []
+    fake_write = connection.write
+
+    def write(data):
+        connection.commands.append(bytes(data))
+        fake_write(data)
+
+    connection.write = write
+    stm32 = Stm32Bootloader(connection, verbosity=0)
+    version = stm32.get()
+    return stm32, version
+
+
+@pytest.fixture
+def cached_cache(cache):
+    stm32, version = activated_bootloader()
+    stm32.detect_device()
+    cache.store(stm32, PORT, version)
+    return cache
+
+
+def test_store_records_device_flash_size_and_uid(cached_cache):
+    entry = cached_cache.load(PORT)
+    assert entry["product_id"] == 0x422
+    assert entry["bootloader_id"] == 0x41
+    assert entry["flash_size"] == 256
+    assert entry["uid"] == "01000302070605040b0a0908"
+
+
+def test_restore_applies_cached_results_with_a_single_read(cached_cache):
+    stm32, version = activated_bootloader()
+    stm32.connection.commands.clear()
+
+    assert cached_cache.restore(stm32, PORT, version)
+    assert stm32.device.product_id == 0x422
+    assert stm32.get_flash_size() == 256
+    assert stm32.get_uid() == bytearray([1, 0, 3, 2, 7, 6, 5, 4, 0xB, 0xA, 9, 8])
+    read_commands = [c for c in stm32.connection.commands if c == b"\x11"]
+    assert len(read_commands) == 1
+    assert b"\x02" not in stm32.connection.commands
+
+
+def test_restore_for_unknown_port_returns_false(cached_cache):
+    stm32, version = activated_bootloader()
+    assert not cached_cache.restore(stm32, "COM99", version)
+
+
+def test_restore_with_other_bootloader_version_forgets_entry(cached_cache):
+    stm32, version = activated_bootloader()
+    assert not cached_cache.restore(stm32, PORT, version + 1)
+    assert cached_cache.load(PORT) is None
+
+
+def test_restore_with_other_uid_forgets_entry_and_resets_device(cached_cache):
+    entries = json.loads(cached_cache.path.read_text())
+    entries[PORT]["uid"] = "ff" * 12
+    cached_cache.path.write_text(json.dumps(entries))
+
+    stm32, version = activated_bootloader()
+    assert not cached_cache.restore(stm32, PORT, version)
+    assert stm32.device is None
+    assert stm32.device_family is None
+    assert cached_cache.load(PORT) is None
+
+
+def test_restore_without_uid_confirms_the_product_id_with_the_advertised_command(cache):
+    stm32, version = activated_bootloader(GdFakeConnection)
+    stm32.detect_device()
+    cache.store(stm32, PORT, version)
+    assert cache.load(PORT)["uid"] == Stm32Bootloader.UID_NOT_SUPPORTED
+
+    stm32, version = activated_bootloader(GdFakeConnection)
+    stm32.connection.commands.clear()
+    assert cache.restore(stm32, PORT, version)
+    assert stm32.device.product_id == 0x50494B36
+    assert b"\x06" in stm32.connection.commands
+    assert b"\x02" not in stm32.connection.commands
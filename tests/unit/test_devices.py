@@ -1,3 +1,5 @@
+from unittest.mock import MagicMock
+
 import pytest
 from devices_stm32flash import DEVICES as STM32FLASH_DEVICES
 
@@ -112,11 +114,75 @@ def test_device_name_does_not_contain_underscore(dev):
     assert "_" not in dev.device_name, dev.device_name
 
 
+# The hand-written CHIP_IDS table, replaced by DEVICES.
+BASELINE_CHIP_IDS = {
+    0x412: "STM32F10x Low-density",
+    0x444: "STM32F03xx4/6",
+    0x410: "STM32F10x Medium-density",
+    0x420: "STM32F10x Medium-density value line",
+    0x460: "STM32G0x1",
+    0x468: "STM32G431xx/STM32G441xx",
+    0x469: "STM32G47xxx/48xxx",
+    0x414: "STM32F10x High-density",
+    0x428: "STM32F10x High-density value line",
+    0x430: "STM3210xx XL-density",
+    0x417: "STM32L05xxx/06xxx",
+    0x416: "STM32L1xxx6(8/B) Medium-density ultralow power line",
+    0x411: "STM32F2xxx",
+    0x433: "STM32F4xxD/E",
+    0x432: "STM32F373xx/378xx",
+    0x422: "STM32F302xB(C)/303xB(C)/358xx",
+    0x439: "STM32F301xx/302x4(6/8)/318xx",
+    0x438: "STM32F303x4(6/8)/334xx/328xx",
+    0x446: "STM32F302xD(E)/303xD(E)/398xx",
+    0x413: "STM32F405xx/07xx and STM32F415xx/17xx",
+    0x419: "STM32F42xxx and STM32F43xxx",
+    0x452: "STM32F72xxx/73xxx",
+    0x449: "STM32F74xxx/75xxx",
+    0x451: "STM32F76xxx/77xxx",
+    0x483: "STM32H72xxx/73xxx",
+    0x450: "STM32H74xxx/75xxx",
+    0x480: "STM32H7A3xx/B3xx",
+    0x435: "STM32L4xx",
+    0x000003: "BlueNRG-1 160kB",
+    0x00002F: "BlueNRG-2 256kB",
+    0x440: "STM32F030x8",
+    0x445: "STM32F070x6",
+    0x448: "STM32F070xB",
+    0x442: "STM32F030xC",
+    0x457: "STM32L01xxx/02xxx",
+    0x497: "STM32WLE5xx/WL55xx",
+    0x801: "Wiznet W7500",
+    0x50494B36: "GD32VW553KIQ6",
+    0x504D4B36: "GD32VW553KMQ6",
+    0x50494836: "GD32VW553HIQ6",
+    0x504D4836: "GD32VW553HMQ6",
+    0x50494B37: "GD32VW553KIQ7",
+    0x504D4B37: "GD32VW553KMQ7",
+    0x50494837: "GD32VW553HIQ7",
+    0x504D4837: "GD32VW553HMQ7",
+}
+
+
+def test_chip_ids_keep_the_baseline_names():
+    assert {pid: CHIP_IDS[pid] for pid in BASELINE_CHIP_IDS} == BASELINE_CHIP_IDS
+
+
+def test_chip_ids_are_computed_without_building_devices(monkeypatch):
+    # pylint: disable=import-outside-toplevel
+    from stm32loader import bootloader
+    from stm32loader.devices import DeviceSpec
+
+    monkeypatch.setattr(DeviceSpec, "build", MagicMock(side_effect=AssertionError))
+    chip_ids = bootloader.CHIP_IDS
+    assert set(chip_ids) == {pid for pid, bid in DEVICES if bid is None}
+
+
 def test_existing_product_ids_are_present_in_devices():
     all_product_ids = set(dev.product_id for dev in DEVICES.values())
-    chip_ids = set(CHIP_IDS)
-    unknown_chip_ids = chip_ids - all_product_ids
+    unknown_chip_ids = set(BASELINE_CHIP_IDS) - all_product_ids
     assert len(unknown_chip_ids) == 0, unknown_chip_ids
+    assert set(BASELINE_CHIP_IDS) <= set(CHIP_IDS)
 
 
 def test_stm32flash_product_ids_are_present_in_devices():
@@ -364,3 +430,41 @@ def test_family_transfer_size_matches_existing():
             f"Device family transfer size does not match: '{family_code}':"
             f" 0x{transfer_size:08X} vs 0x{family_transfer_size:08X}."
         )
+
+
+def test_devices_lookup_falls_back_to_product_id_for_unknown_bootloader_id():
+    assert DEVICES.lookup(0x413, 0x91) is DEVICES[(0x413, 0x91)]
+    assert DEVICES.lookup(0x413, 0xEE) is DEVICES[(0x413, None)]
+    assert DEVICES.lookup(0xFFF) is None
+
+
+def test_devices_by_family_returns_only_devices_of_that_family():
+    devices = DEVICES.by_family(DeviceFamily.F3)
+    assert devices
+    assert {dev.family.name for dev in devices} == {"F3"}
+    assert DEVICES.by_family("f3") == devices
+
+
+def test_devices_by_name_matches_device_name_and_full_name():
+    assert len(DEVICES.by_name("STM32F10xxx")) > 1
+    devices = DEVICES.by_name("stm32f10xxx-medium-density")
+    assert [dev.product_id for dev in devices] == [0x410]
+
+
+@pytest.mark.parametrize(
+    "specifier, ids",
+    [
+        ("0x410", (0x410, None)),
+        ("0x413:0x91", (0x413, 0x91)),
+        ("STM32F10xxx-Medium-density", (0x410, None)),
+        ("stm32g03xxx/04xxx", (0x466, 0x53)),
+    ],
+)
+def test_devices_find_accepts_ids_and_names(specifier, ids):
+    assert DEVICES.find(specifier) is DEVICES[ids]
+
+
+@pytest.mark.parametrize("specifier", ["0x999", "0x410:0x10:0x1", "STM32F2xxxx", "bogus"])
+def test_devices_find_with_unknown_or_ambiguous_specifier_raises_key_error(specifier):
+    with pytest.raises(KeyError):
+        DEVICES.find(specifier)
@@ -0,0 +1,81 @@
+"""Guard against regressions in import time, which matters for CLI startup."""
+
+import subprocess
+import sys
+
+import pytest
+
+# Modules which should not be imported unless they are really needed.
+HEAVY_MODULES = [
+    "serial",
+    "progress",
+    "intelhex",
+    "stm32loader.bootloader",
+    "stm32loader.devices",
+]
+
+# Generous budget in microseconds, to avoid flaky results on slow CI machines.
+IMPORT_TIME_BUDGET_US = 100_000
+
+# pylint: disable=missing-docstring
+
+
+def run_python(*arguments, check=True):
+    result = subprocess.run(
+        [sys.executable, *arguments],
+        capture_output=True,
+        text=True,
+        check=check,
+    )
+    return result
+
+
+def cumulative_import_times(*arguments):
+    """Return a dict of module name to cumulative import time in us."""
+    stderr = run_python("-X", "importtime", *arguments, check=False).stderr
+    import_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        import_times[module.strip()] = int(cumulative_us)
+    return import_times
+
+
+def test_importing_bootloader_does_not_import_device_table():
+    output = run_python(
+        "-c", "import sys, stm32loader.bootloader; print('stm32loader.devices' in sys.modules)"
+    ).stdout
+    assert output.strip() == "False"
+
+
+def test_device_lookup_builds_only_the_requested_device():
+    output = run_python(
+        "-c",
+        "from stm32loader.devices import DEVICES, DEVICE_DETAILS\n"
+        "DEVICES.lookup(0x410)\n"
+        "print(sum(spec.device is not None for spec in DEVICE_DETAILS))",
+    ).stdout
+    assert output.strip() == "1"
+
+
+def test_bootloader_import_time_is_within_budget():
+    import_times = cumulative_import_times("-c", "import stm32loader.bootloader")
+    assert import_times["stm32loader.bootloader"] < IMPORT_TIME_BUDGET_US, import_times
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [["--version"], ["--help"], ["--bogus-argument"], ["--read"]],
+    ids=["version", "help", "unknown-argument", "missing-arguments"],
+)
+def test_cli_without_work_does_not_import_heavy_modules(arguments):
+    import_times = cumulative_import_times("-m", "stm32loader", *arguments)
+    assert "stm32loader.main" in import_times
+    for module in HEAVY_MODULES:
+        assert module not in import_times
+
+
+def test_cli_import_time_is_within_budget():
+    import_times = cumulative_import_times("-m", "stm32loader", "--version")
+    assert import_times["stm32loader.main"] < IMPORT_TIME_BUDGET_US, import_times
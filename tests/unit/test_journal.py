@@ -0,0 +1,135 @@
+import pytest
+
+from stm32loader import journal as transfer_journal
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.emulated.fake import FakeConfiguration, FakeConnection
+from stm32loader.journal import TransferJournal, resume_write_offset, transfer_key
+from stm32loader.main import Stm32Loader
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+FLASH_START = 0x_0800_0000
+DATA = bytes(range(256)) * 8
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def stm32():
+    connection = FakeConnection()
+    connection.flash_memory[:] = b"\xff" * len(connection.flash_memory)
+    stm32 = Stm32Bootloader(connection, verbosity=0)
+    stm32.get()
+    stm32.detect_device()
+    return stm32
+
+
+def write_key():
+    return transfer_key("write", "UID", FLASH_START, len(DATA), DATA)
+
+
+def test_journal_records_survive_reopening():
+    journal = TransferJournal(write_key())
+    journal.open()
+    journal.record(FLASH_START, DATA[:256])
+    journal.record(FLASH_START + 256, DATA[256:512])
+    journal.record(FLASH_START + 1024, DATA[1024:1280])
+    journal.close()
+
+    reopened = TransferJournal(write_key())
+    assert len(reopened.load()) == 3
+    # Contiguous from the start address only.
+    assert reopened.confirmed_length() == 512
+
+
+def test_journal_of_other_transfer_is_ignored():
+    journal = TransferJournal(write_key())
+    journal.open()
+    journal.record(FLASH_START, DATA[:256])
+    journal.close()
+
+    other_key = transfer_key("write", "UID", FLASH_START, len(DATA), DATA[::-1])
+    assert not TransferJournal(other_key).load()
+
+
+def test_journal_ignores_partial_last_line():
+    journal = TransferJournal(write_key())
+    journal.open()
+    journal.record(FLASH_START, DATA[:256])
+    journal.close()
+    with journal.path.open("a", encoding="utf-8") as journal_file:
+        journal_file.write('{"done": [1342')
+
+    assert TransferJournal(write_key()).load() == [(FLASH_START, FLASH_START + 256)]
+
+
+def test_journal_syncs_once_per_batch(monkeypatch):
+    synced = []
+    monkeypatch.setattr(transfer_journal.os, "fsync", synced.append)
+    journal = TransferJournal(write_key(), sync_interval=4)
+    journal.open()
+    synced.clear()
+    for offset in range(0, len(DATA), 256):
+        journal.record(FLASH_START + offset, DATA[offset : offset + 256])
+    assert len(synced) == 2
+
+
+def test_resume_write_offset_continues_after_verified_chunks(stm32):
+    journal = TransferJournal(write_key(), sync_interval=2)
+    journal.open()
+    stm32.write_memory_data(FLASH_START, DATA[:1280], journal=journal)
+    journal.close()
+    # Written but not recorded before the interruption.
+    journal.load()
+    del journal.chunks[-1]
+
+    assert resume_write_offset(stm32, journal, DATA) == 1280
+
+
+def test_resume_write_offset_refuses_flash_with_other_data(stm32):
+    journal = TransferJournal(write_key())
+    journal.open()
+    stm32.write_memory_data(FLASH_START, DATA[:512], journal=journal)
+    stm32.write_memory_data(FLASH_START + 512, bytes(256))
+    assert resume_write_offset(stm32, journal, DATA) is None
+
+
+def test_resumable_read_continues_interrupted_read(stm32, tmp_path):
+    stm32.write_memory_data(FLASH_START, DATA)
+    loader = Stm32Loader()
+    loader.configuration = FakeConfiguration(
+        erase=False,
+        write=False,
+        verify=False,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file=str(tmp_path / "dump.bin"),
+    )
+    loader.configuration.read = True
+    loader.configuration.resume = True
+    loader.configuration.length = len(DATA)
+    loader.stm32 = stm32
+
+    original_read_memory = stm32.read_memory
+    calls = []
+
+    def read_memory(address, length):
+        calls.append(address)
+        if interrupted and len(calls) > 3:
+            raise KeyboardInterrupt
+        return original_read_memory(address, length)
+
+    stm32.read_memory = read_memory
+    interrupted = True
+    with pytest.raises(KeyboardInterrupt):
+        loader.perform_commands()
+
+    calls.clear()
+    interrupted = False
+    loader.perform_commands()
+
+    assert calls[0] == FLASH_START + 3 * 256
+    assert (tmp_path / "dump.bin").read_bytes() == DATA
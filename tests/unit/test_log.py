@@ -0,0 +1,75 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader import log
+from stm32loader.bootloader import Stm32Bootloader
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+
+class CountingArgument:
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "argument"
+
+
+@pytest.fixture
+def connection():
+    connection = MagicMock()
+    connection.read.return_value = [Stm32Bootloader.Reply.ACK]
+    return connection
+
+
+@pytest.fixture
+def console():
+    log.enable_console()
+    yield
+    log.disable_console()
+
+
+def test_log_level_maps_verbosity_to_logging_levels():
+    assert log.log_level(0) == log.logging.WARNING
+    assert log.log_level(5) == log.logging.INFO
+    assert log.log_level(10) == log.logging.DEBUG
+    assert log.log_level(20) == 1
+
+
+def test_debug_prints_enabled_message_to_stdout(connection, console, capsys):
+    Stm32Bootloader(connection, verbosity=5).debug(5, "Write %d bytes", 256)
+    assert capsys.readouterr().out == "Write 256 bytes\n"
+
+
+def test_library_messages_are_not_printed_without_console(connection, capsys):
+    log.disable_console()
+    Stm32Bootloader(connection, verbosity=5).debug(0, "Write %d bytes", 256)
+    assert capsys.readouterr() == ("", "")
+
+
+def test_debug_does_not_format_disabled_message(connection, console, capsys):
+    argument = CountingArgument()
+    Stm32Bootloader(connection, verbosity=5).debug(10, "Value: %s", argument)
+    assert argument.formatted == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_protocol_log_writes_serial_traffic_as_json_lines(connection, tmp_path):
+    path = tmp_path / "protocol.jsonl"
+    stop = log.start_protocol_log(path)
+    try:
+        stm32 = Stm32Bootloader(connection, verbosity=0)
+        stm32.command(0x11, "Read memory")
+    finally:
+        stop()
+
+    entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(entry["message"], entry["data"]) for entry in entries] == [
+        ("write", "11"),
+        ("write", "ee"),
+        ("read", "79"),
+    ]
+    assert not log.TRANSPORT.isEnabledFor(log.logging.DEBUG)
@@ -0,0 +1,83 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader.bootloader import DataMismatchError, Stm32Bootloader, Stm32LoaderError
+from stm32loader.devices import DEVICES
+from stm32loader.option_bytes import OptionByteTransaction
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+# RDP level 0, no write protection.
+F1_OPTION_BYTES = bytes.fromhex("a55a00ff00ff00ffff00ff00ff00ff00")
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr("stm32loader.option_bytes.time.sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def stm32():
+    # STM32F10xxx Medium-density.
+    stm32 = Stm32Bootloader(MagicMock(), device=DEVICES[(0x410, None)])
+    stm32.option_bytes = bytearray(F1_OPTION_BYTES)
+    stm32.read_memory = MagicMock(side_effect=lambda address, length: bytes(stm32.option_bytes))
+
+    def write_memory(address, data):
+        stm32.option_bytes[:] = data
+
+    stm32.write_memory = MagicMock(side_effect=write_memory)
+    stm32.reset_from_system_memory = MagicMock()
+    return stm32
+
+
+def test_transaction_is_not_supported_for_other_layouts():
+    assert OptionByteTransaction.supports(DEVICES[(0x410, None)])
+    assert not OptionByteTransaction.supports(DEVICES[(0x419, 0x91)])
+    with pytest.raises(Stm32LoaderError):
+        OptionByteTransaction(Stm32Bootloader(MagicMock(), device=DEVICES[(0x419, 0x91)]))
+
+
+def test_transaction_is_not_supported_without_write_protection_support():
+    # STM32F10xxx High-density: F1 layout, but no write protection support.
+    assert not OptionByteTransaction.supports(DEVICES[(0x414, None)])
+
+
+def test_commit_applies_staged_changes_with_single_write_and_reset(stm32):
+    transaction = OptionByteTransaction(stm32)
+    transaction.write_protect([0, 9])
+    transaction.set_data(1, 0x42)
+    transaction.commit()
+
+    stm32.write_memory.assert_called_once()
+    stm32.reset_from_system_memory.assert_called_once()
+    assert stm32.option_bytes == bytes.fromhex("a55a00ff00ff42bdfe01fd02ff00ff00")
+    assert stm32.read_memory.call_count == 2
+    assert not transaction.pending
+
+
+def test_commit_without_changes_does_nothing(stm32):
+    transaction = OptionByteTransaction(stm32)
+    transaction.write_unprotect()
+    transaction.commit()
+    stm32.write_memory.assert_not_called()
+    stm32.reset_from_system_memory.assert_not_called()
+
+
+def test_commit_with_readout_protection_skips_read_back(stm32):
+    transaction = OptionByteTransaction(stm32)
+    transaction.write_protect()
+    transaction.readout_protect()
+    transaction.commit()
+
+    assert stm32.option_bytes == bytes.fromhex("00ff00ff00ff00ff00ff00ff00ff00ff")
+    assert stm32.read_memory.call_count == 1
+
+
+def test_commit_raises_data_mismatch_error_if_option_bytes_differ(stm32):
+    stm32.write_memory.side_effect = None
+    transaction = OptionByteTransaction(stm32)
+    transaction.set_user(0xFE)
+    with pytest.raises(DataMismatchError, match="differ"):
+        transaction.commit()
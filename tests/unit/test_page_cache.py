@@ -0,0 +1,87 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.emulated.fake import FakeConnection
+from stm32loader.page_cache import PageCache
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+FLASH_START = 0x_0800_0000
+
+
+def test_page_cache_evicts_least_recently_used_pages():
+    cache = PageCache(max_bytes=3 * 256)
+    for address in range(0, 3 * 256, 256):
+        cache.put(address, bytes(256))
+    cache.get(0)
+    cache.put(0x300, bytes(256))
+
+    assert cache.get(0x100) is None
+    assert cache.get(0) is not None
+    assert (len(cache), cache.size) == (3, 3 * 256)
+
+
+def test_page_cache_invalidate_drops_overlapping_pages_only():
+    cache = PageCache()
+    for address in range(0, 4 * 256, 256):
+        cache.put(address, bytes(256))
+    cache.invalidate(0x1FF, 0x201)
+    assert [cache.get(address) is None for address in range(0, 4 * 256, 256)] == [
+        False,
+        True,
+        True,
+        False,
+    ]
+
+
+@pytest.fixture
+def stm32():
+    stm32 = Stm32Bootloader(FakeConnection(), verbosity=0, page_cache=PageCache())
+    stm32.get()
+    stm32.detect_device()
+    stm32.read_memory = MagicMock(wraps=stm32.read_memory)
+    return stm32
+
+
+def test_read_memory_data_reads_cached_pages_only_once(stm32):
+    first = stm32.read_memory_data(FLASH_START + 0x10, 0x300)
+    assert stm32.read_memory.call_count == 4
+
+    assert stm32.read_memory_data(FLASH_START + 0x80, 0x100) == first[0x70:0x170]
+    assert stm32.read_memory.call_count == 4
+
+
+def test_write_memory_invalidates_written_pages(stm32):
+    stm32.read_memory_data(FLASH_START, 0x400)
+    stm32.write_memory_data(FLASH_START + 0x100, b"\x01\x02\x03\x04")
+
+    data = stm32.read_memory_data(FLASH_START, 0x400)
+    assert data[0x100:0x104] == b"\x01\x02\x03\x04"
+    # One page re-read.
+    assert stm32.read_memory.call_count == 5
+
+
+def test_page_erase_invalidates_erased_pages_only(stm32):
+    stm32.read_memory_data(FLASH_START, 0x1000)
+    # F3: 2 KiB flash pages.
+    stm32.command = MagicMock()
+    stm32.write = MagicMock()
+    stm32._wait_for_ack = MagicMock()  # pylint: disable=protected-access
+    stm32.extended_erase_memory([1])
+
+    assert stm32.page_cache.get(FLASH_START) is not None
+    assert stm32.page_cache.get(FLASH_START + 0x800) is None
+    assert stm32.page_cache.get(FLASH_START + 0xF00) is None
+
+
+def test_global_erase_clears_the_cache(stm32):
+    stm32.read_memory_data(FLASH_START, 0x100)
+    stm32.extended_erase_memory()
+    assert not stm32.page_cache
+
+
+def test_read_outside_flash_is_not_cached(stm32):
+    stm32.read_memory_data(0x_1FFF_F7AC, 12)
+    assert not stm32.page_cache
@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.devices import DEVICES
+from stm32loader.emulated.fake import FakeConfiguration
+from stm32loader.plan import build_plan
+from stm32loader.timeouts import TimeoutPolicy
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+
+@pytest.fixture
+def stm32():
+    # STM32F10xxx Medium-density.
+    return Stm32Bootloader(MagicMock(), device=DEVICES[(0x410, None)])
+
+
+@pytest.fixture
+def configuration():
+    return FakeConfiguration(
+        erase=False,
+        write=False,
+        verify=False,
+        write_protect=False,
+        write_unprotect=False,
+        firmware_file="firmware.bin",
+    )
+
+
+def plan_for(configuration, stm32, **kwargs):
+    return build_plan(configuration, stm32, TimeoutPolicy(115200), **kwargs)
+
+
+def test_plan_lists_steps_in_order_with_estimates(configuration, stm32):
+    configuration.erase = configuration.write = configuration.verify = True
+    plan = plan_for(configuration, stm32, data_length=4096)
+
+    assert [step.name for step in plan] == ["erase", "write", "verify"]
+    assert all(step.estimate for step in plan)
+    assert "Estimated time" in plan.describe()
+
+
+def test_plan_skips_erase_after_readout_unprotect(configuration, stm32):
+    configuration.unprotect = configuration.erase = True
+    plan = plan_for(configuration, stm32)
+
+    assert "erase" not in plan
+    assert plan.skipped[0][0] == "erase"
+
+
+def test_plan_for_ram_image_skips_erase_and_program_time(configuration, stm32):
+    configuration.erase = configuration.write = configuration.ram = True
+    configuration.address = configuration.go_address = 0x2000_0200
+    plan = plan_for(configuration, stm32, data_length=4096)
+
+    assert [step.name for step in plan] == ["write", "go"]
+    assert "to RAM" in plan.step("write").description
+    configuration.ram = False
+    flash_plan = plan_for(configuration, stm32, data_length=4096)
+    assert plan.step("write").estimate < flash_plan.step("write").estimate
+
+
+def test_plan_skips_erase_when_resuming_write(configuration, stm32):
+    configuration.erase = configuration.write = True
+    plan = plan_for(configuration, stm32, data_length=4096, write_offset=1024)
+
+    assert "erase" not in plan
+    assert "write 3072 bytes at 0x08000400" in plan.step("write").description
+
+
+def test_plan_marks_read_of_erased_range_as_blank(configuration, stm32):
+    configuration.erase = configuration.read = True
+    configuration.length = 2048
+    plan = plan_for(configuration, stm32)
+
+    assert plan.step("read").blank
+
+
+def test_plan_reads_range_that_was_not_erased(configuration, stm32):
+    configuration.read = True
+    configuration.length = 2048
+    plan = plan_for(configuration, stm32)
+
+    assert not plan.step("read").blank
+
+
+def test_plan_combines_protection_into_single_reset(configuration, stm32):
+    configuration.write_protect = configuration.protect = True
+    separate = plan_for(configuration, stm32)
+    combined = plan_for(configuration, stm32, combine_protection=True)
+
+    assert separate.resets == 2
+    assert combined.resets == 1
+    assert "write and readout protection" in combined.step("protect").description
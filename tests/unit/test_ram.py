@@ -0,0 +1,42 @@
+import struct
+
+import pytest
+
+from stm32loader.devices import DEVICES
+from stm32loader.ram import RamImageError, check_image, load_address
+
+# pylint: disable=missing-docstring
+
+# STM32F302xB(C)/303xB(C): usable RAM 0x20001400 - 0x2000A000.
+DEVICE = DEVICES[(0x422, 0x41)]
+RAM_START = 0x2000_1400
+
+
+def image(stack_pointer=0x2000_A000, reset_handler=RAM_START + 0x101, size=0x200):
+    return struct.pack("<II", stack_pointer, reset_handler) + bytes(size - 8)
+
+
+def test_load_address_defaults_to_start_of_usable_ram():
+    assert load_address(DEVICE) == RAM_START
+    assert load_address(DEVICE, 0x0800_0000) == RAM_START
+    assert load_address(DEVICE, 0x2000_2000) == 0x2000_2000
+
+
+def test_check_image_returns_vector_table():
+    assert check_image(DEVICE, RAM_START, image()) == (0x2000_A000, RAM_START + 0x101)
+
+
+@pytest.mark.parametrize(
+    "address, data, message",
+    [
+        (0x2000_0000, image(), "not in usable RAM"),
+        (RAM_START, image(size=0x9000), "does not fit"),
+        (RAM_START, image(stack_pointer=0x2001_0000), "stack pointer"),
+        (RAM_START, image(reset_handler=RAM_START + 0x100), "not Thumb code"),
+        (RAM_START, image(reset_handler=0x0800_0101), "outside the image"),
+        (RAM_START, b"\x00" * 4, "too short"),
+    ],
+)
+def test_check_image_rejects_bad_images(address, data, message):
+    with pytest.raises(RamImageError, match=message):
+        check_image(DEVICE, address, data)
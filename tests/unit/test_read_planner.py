@@ -0,0 +1,77 @@
+import pytest
+
+from stm32loader.read_planner import plan_reads, read_planned
+
+# pylint: disable=missing-docstring
+
+
+def memory(address, length):
+    return bytes((address + i) & 0xFF for i in range(length))
+
+
+def test_plan_reads_merges_requests_that_fit_in_one_window():
+    # F3 bootloader ID, UID and flash size.
+    windows = plan_reads([(0x_1FFF_F7CC, 2), (0x_1FFF_F796, 1), (0x_1FFF_F7AC, 12)], 256)
+    assert [(w.start, w.length) for w in windows] == [(0x_1FFF_F796, 0x38)]
+    assert windows[0].requests == [(0x_1FFF_F796, 1), (0x_1FFF_F7AC, 12), (0x_1FFF_F7CC, 2)]
+
+
+def test_plan_reads_splits_requests_that_are_too_far_apart():
+    windows = plan_reads([(0x1000, 4), (0x10F0, 16), (0x1100, 1)], 256)
+    assert [(w.start, w.end) for w in windows] == [(0x1000, 0x1100), (0x1100, 0x1101)]
+
+
+def test_plan_reads_with_block_size_reads_aligned_full_blocks():
+    # F4 UID and flash size.
+    windows = plan_reads([(0x_1FFF_7A10, 12), (0x_1FFF_7A22, 2)], 256, block_size=256)
+    assert [(w.start, w.length) for w in windows] == [(0x_1FFF_7A00, 256)]
+
+
+def test_plan_reads_pads_only_windows_with_block_requests():
+    # F4 bootloader ID, UID and flash size.
+    block_requests = [(0x_1FFF_7A10, 12), (0x_1FFF_7A22, 2)]
+    windows = plan_reads(
+        [(0x_1FFF_76DE, 1), *block_requests], 256, block_size=256, block_requests=block_requests
+    )
+    assert [(w.start, w.length) for w in windows] == [(0x_1FFF_76DE, 1), (0x_1FFF_7A00, 256)]
+
+
+def test_read_planned_does_not_repeat_failed_block_read():
+    reads = []
+
+    def read(address, length):
+        reads.append((address, length))
+        raise IOError("NACK")
+
+    failures = {}
+    requests = [(0x1010, 12), (0x1022, 2)]
+    results = read_planned(
+        read, requests, 256, block_size=256, errors=(IOError,), failures=failures
+    )
+    assert results == {}
+    assert reads == [(0x1000, 256)]
+    assert set(failures) == set(requests)
+
+
+def test_read_planned_returns_a_slice_per_request():
+    reads = []
+
+    def read(address, length):
+        reads.append((address, length))
+        return memory(address, length)
+
+    results = read_planned(read, [(0x100, 2), (0x108, 4)], 256)
+    assert reads == [(0x100, 12)]
+    assert results == {(0x100, 2): memory(0x100, 2), (0x108, 4): memory(0x108, 4)}
+
+
+@pytest.mark.parametrize("unreadable", [0x100, 0x108])
+def test_read_planned_falls_back_to_single_reads_when_window_fails(unreadable):
+    def read(address, length):
+        if address <= unreadable < address + length:
+            raise IOError("NACK")
+        return memory(address, length)
+
+    results = read_planned(read, [(0x100, 2), (0x10C, 4)], 256, errors=(IOError,))
+    assert (0x10C, 4) in results
+    assert ((0x100, 2) in results) == (unreadable != 0x100)
@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader import bootloader as Stm32
+from stm32loader.bootloader import CommandError, Stm32Bootloader
+from stm32loader.devices import DEVICES
+from stm32loader.retry import RetryPolicy
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(Stm32.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def connection():
+    connection = MagicMock()
+    connection.read.return_value = [Stm32Bootloader.Reply.NACK]
+    return connection
+
+
+@pytest.fixture
+def stm32(connection):
+    # STM32F10xxx Medium-density.
+    return Stm32Bootloader(
+        connection, device=DEVICES[(0x410, None)], retry_policy=RetryPolicy(retries=2)
+    )
+
+
+def test_retry_policy_delay_backs_off_exponentially_up_to_maximum():
+    policy = RetryPolicy(backoff=0.1, backoff_factor=2, max_backoff=0.3)
+    assert [policy.delay(retry) for retry in range(3)] == [0.1, 0.2, 0.3]
+
+
+def test_write_memory_data_retries_failed_chunk_and_records_it(stm32):
+    stm32.write_memory = MagicMock(side_effect=[None, CommandError("NACK"), None])
+    stm32.write_memory_data(0x_0800_0000, bytes(512))
+
+    assert stm32.write_memory.call_count == 3
+    stm32.write_memory.assert_called_with(0x_0800_0100, bytes(256))
+    assert stm32.retry_stats.retries == 1
+    assert "1 retries" in str(stm32.retry_stats)
+
+
+def test_write_memory_data_skips_retry_of_chunk_that_was_written(stm32):
+    stm32.write_memory = MagicMock(side_effect=[CommandError("Timeout"), None])
+    stm32.read_memory = MagicMock(return_value=bytearray(b"\x11" * 256))
+    stm32.write_memory_data(0x_0800_0000, b"\x11" * 256 + b"\x22" * 256)
+
+    stm32.read_memory.assert_called_once_with(0x_0800_0000, 256)
+    stm32.write_memory.assert_called_with(0x_0800_0100, b"\x22" * 256)
+    assert stm32.write_memory.call_count == 2
+
+
+def test_read_memory_data_gives_up_after_configured_retries(stm32):
+    stm32.read_memory = MagicMock(side_effect=CommandError("NACK"))
+    with pytest.raises(CommandError):
+        stm32.read_memory_data(0x_0800_0000, 16)
+    assert stm32.read_memory.call_count == 3
+
+
+def test_resynchronize_sends_filler_and_waits_for_nack(stm32, connection):
+    stm32.resynchronize()
+    written = b"".join(call.args[0] for call in connection.write.call_args_list)
+    # Not a valid write: the last byte doesn't match the checksum.
+    assert written == b"\xff" * 257 + b"\x00" + b"\xff"
+    connection.flush_input_buffer.assert_called()
+
+
+def test_resynchronize_without_nack_raises_command_error(stm32, connection):
+    connection.read.return_value = []
+    with pytest.raises(CommandError, match="resynchronize"):
+        stm32.resynchronize()
@@ -0,0 +1,131 @@
+import json
+import zipfile
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader.bootloader import CommandError, Stm32Bootloader
+from stm32loader.devices import DEVICES
+from stm32loader.snapshot import MemoryRegion, coalesce_regions, device_regions, take_snapshot
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+
+@pytest.fixture
+def stm32():
+    # STM32F10xxx Medium-density.
+    device = DEVICES[(0x410, None)]
+    stm32 = Stm32Bootloader(MagicMock(), device=device)
+
+    def read_memory_data(address, length):
+        return bytearray((address + i) & 0xFF for i in range(length))
+
+    stm32.read_memory_data = MagicMock(side_effect=read_memory_data)
+    stm32.read_memory = MagicMock(side_effect=read_memory_data)
+    stm32.get_flash_size = MagicMock(return_value=64)
+    return stm32
+
+
+def test_device_regions_lists_flash_system_memory_option_bytes_and_registers():
+    regions = {region.name: region for region in device_regions(DEVICES[(0x410, None)])}
+    assert (regions["flash"].start, regions["flash"].size) == (0x_0800_0000, 128 * 1024)
+    assert (regions["system_memory"].start, regions["system_memory"].size) == (0x_1FFF_F000, 2048)
+    # Inclusive end address in the device table.
+    assert (regions["option_bytes"].start, regions["option_bytes"].size) == (0x_1FFF_F800, 16)
+    assert (regions["uid"].start, regions["uid"].size) == (0x_1FFF_F7E8, 12)
+    assert (regions["flash_size"].start, regions["flash_size"].size) == (0x_1FFF_F7E0, 2)
+
+
+def test_coalesce_regions_merges_overlapping_and_nearby_regions():
+    regions = [
+        MemoryRegion("a", 0x100, 0x110),
+        MemoryRegion("b", 0x108, 0x10C),
+        MemoryRegion("c", 0x180, 0x190),
+        MemoryRegion("d", 0x1000, 0x1010),
+    ]
+    windows = coalesce_regions(regions, max_gap=0x100)
+    ranges = [(start, end) for start, end, _members in windows]
+    assert ranges == [(0x100, 0x190), (0x1000, 0x1010)]
+    assert [r.name for r in windows[0][2]] == ["a", "b", "c"]
+
+
+def test_device_regions_sizes_flash_from_the_flash_size_read_from_the_device():
+    regions = {region.name: region for region in device_regions(DEVICES[(0x410, None)], 32)}
+    assert regions["flash"].size == 32 * 1024
+
+
+def test_device_regions_option_bytes_end_is_inclusive_for_all_devices():
+    for key in DEVICES:
+        device = DEVICES[key]
+        for region in device_regions(device):
+            if region.name.startswith("option_bytes"):
+                assert region.size % 2 == 0, (str(device), region)
+
+
+def test_take_snapshot_reads_system_memory_and_option_bytes_in_a_single_window(stm32, tmp_path):
+    take_snapshot(stm32, tmp_path / "snapshot.zip")
+    # Flash and the merged system memory / option bytes window.
+    assert stm32.read_memory_data.call_count == 2
+    stm32.read_memory_data.assert_any_call(0x_0800_0000, 64 * 1024)
+    stm32.read_memory_data.assert_any_call(0x_1FFF_F000, 0x810)
+    # The identity registers, in a single read.
+    stm32.read_memory.assert_called_once_with(0x_1FFF_F7E0, 20)
+
+
+def test_take_snapshot_reads_identity_registers_in_aligned_blocks(tmp_path):
+    # STM32F40xxx/41xxx: UID at 0x1FFF7A10 and flash size at 0x1FFF7A22.
+    stm32 = Stm32Bootloader(MagicMock(), device=DEVICES[(0x413, None)])
+    stm32.read_memory_data = MagicMock(return_value=bytearray(16))
+    stm32.read_memory = MagicMock(side_effect=lambda _address, length: bytearray(length))
+    stm32.get_flash_size = MagicMock(return_value=1)
+
+    manifest = take_snapshot(stm32, tmp_path / "snapshot.zip")
+    reads = [call.args for call in stm32.read_memory.call_args_list]
+    assert (0x_1FFF_7A00, 256) in reads
+    assert not [address for address, _length in reads if address in (0x_1FFF_7A10, 0x_1FFF_7A22)]
+    assert manifest["flash_size_kib"] == 0
+    assert "uid" in manifest
+
+
+def test_take_snapshot_reads_regions_alone_when_their_window_fails(stm32, tmp_path):
+    read_memory_data = stm32.read_memory_data.side_effect
+
+    def read_option_bytes_only(address, length):
+        if address < 0x_1FFF_F800 and address + length > 0x_1FFF_F800:
+            # The window spanning system memory and option bytes.
+            raise CommandError("NACK 0x11 address failed")
+        return read_memory_data(address, length)
+
+    stm32.read_memory_data.side_effect = read_option_bytes_only
+    manifest = take_snapshot(stm32, tmp_path / "snapshot.zip")
+    regions = {region["name"]: region for region in manifest["regions"]}
+    assert "error" not in regions["system_memory"]
+    assert "error" not in regions["option_bytes"]
+    stm32.read_memory_data.assert_any_call(0x_1FFF_F800, 16)
+
+
+def test_take_snapshot_writes_region_files_and_manifest(stm32, tmp_path):
+    archive_path = tmp_path / "snapshot.zip"
+    take_snapshot(stm32, archive_path)
+
+    with zipfile.ZipFile(archive_path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        assert archive.read("uid.bin") == bytes(range(0xE8, 0xF4))
+        assert len(archive.read("flash.bin")) == 64 * 1024
+
+    assert manifest["product_id"] == 0x410
+    assert manifest["flash_size_kib"] == 0xE1E0
+    assert {region["name"] for region in manifest["regions"]} == {
+        "flash",
+        "system_memory",
+        "option_bytes",
+        "uid",
+        "flash_size",
+    }
+
+
+def test_take_snapshot_records_unreadable_regions_in_manifest(stm32, tmp_path):
+    stm32.read_memory_data.side_effect = CommandError("NACK 0x11 address failed")
+    stm32.read_memory.side_effect = CommandError("NACK 0x11 address failed")
+    manifest = take_snapshot(stm32, tmp_path / "snapshot.zip")
+    assert all("error" in region for region in manifest["regions"])
@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader.bootloader import CommandError, Stm32Bootloader
+from stm32loader.devices import DEVICES
+from stm32loader.stats import LatencyHistogram, TransferStats
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+
+@pytest.fixture
+def connection():
+    connection = MagicMock()
+    connection.read.side_effect = lambda length=1: [Stm32Bootloader.Reply.ACK] * length
+    return connection
+
+
+@pytest.fixture
+def stats():
+    return TransferStats(baud_rate=115200)
+
+
+@pytest.fixture
+def stm32(connection, stats):
+    # STM32F10xxx Medium-density.
+    return Stm32Bootloader(connection, device=DEVICES[(0x410, None)], stats=stats)
+
+
+def test_histogram_counts_durations_per_bucket():
+    histogram = LatencyHistogram()
+    for seconds in (0.0004, 0.003, 0.003, 0.003, 0.3):
+        histogram.record(seconds)
+
+    assert histogram.count == 5
+    assert histogram.mean == pytest.approx(0.06188)
+    assert histogram.percentile(50) == 0.005
+    assert histogram.percentile(100) == 0.3
+
+
+def test_commands_are_counted_with_bytes_moved(stm32, stats):
+    stm32.write_memory(0x_0800_0000, bytes(256))
+    stm32.read_memory(0x_0800_0000, 16)
+
+    assert stats.commands["WRITE_MEMORY"].count == 1
+    assert stats.commands["READ_MEMORY"].count == 1
+    # Command, address with checksum, length, data and checksum.
+    assert stats.bytes_sent == 2 + 5 + 1 + 256 + 1 + 2 + 5 + 2
+    assert stats.bytes_received == 3 + 3 + 16
+    assert "READ_MEMORY" in stats.report()
+    assert "115200 baud" in stats.report()
+
+
+def test_failed_command_is_recorded_and_reported_to_hook(stm32, stats, connection):
+    calls = []
+    stats.add_hook(lambda name, seconds, failed: calls.append((name, failed)))
+    connection.read.side_effect = None
+    connection.read.return_value = [Stm32Bootloader.Reply.NACK]
+
+    with pytest.raises(CommandError):
+        stm32.go(0x_0800_0000)
+
+    assert calls == [("GO", True)]
+    assert stats.commands["GO"].failures == 1
+
+
+def test_extended_erase_through_erase_memory_is_counted_once(stm32, stats):
+    stm32.extended_erase = True
+    stm32.erase_memory([1, 2])
+    assert list(stats.commands) == ["EXTENDED_ERASE"]
+
+
+def test_without_stats_nothing_is_measured(connection):
+    stm32 = Stm32Bootloader(connection, device=DEVICES[(0x410, None)])
+    stm32.read_memory(0x_0800_0000, 16)
+    assert stm32.stats is None
@@ -0,0 +1,103 @@
+import io
+import tracemalloc
+
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.emulated.fake import FakeConnection
+from stm32loader.stream import data_length, iter_chunks, map_file, rechunk
+
+# pylint: disable=missing-docstring
+
+FLASH = 0x0800_0000
+DATA = bytes(range(256)) * 8 + b"tail"
+
+
+class SinkConnection:
+    """Accept everything; reply ACK to all reads, without storing anything."""
+
+    timeout = 5
+
+    def write(self, data):
+        return len(data)
+
+    def read(self, length=1):  # pylint: disable=unused-argument
+        return b"\x79"
+
+
+def written_flash(data, address=FLASH):
+    connection = FakeConnection()
+    stm32 = Stm32Bootloader(connection, device_family="F3", verbosity=0)
+    stm32.write_memory_data(address, data)
+    return connection.flash_memory
+
+
+def test_iter_chunks_slices_buffer_without_copying():
+    chunks = list(iter_chunks(FLASH, DATA, 256))
+    assert [address for address, _chunk in chunks] == [FLASH + 256 * n for n in range(9)]
+    assert all(isinstance(chunk, memoryview) for _address, chunk in chunks)
+    assert b"".join(chunks[-1][1:]) == b"tail"
+
+
+def test_iter_chunks_reads_file_object():
+    chunks = list(iter_chunks(FLASH, io.BytesIO(DATA), 256))
+    assert b"".join(chunk for _address, chunk in chunks) == DATA
+    assert chunks[-1] == (FLASH + 2048, b"tail")
+
+
+def test_rechunk_joins_consecutive_pieces_and_splits_large_ones():
+    pieces = [(FLASH, b"a" * 100), (FLASH + 100, b"b" * 500), (FLASH + 0x1000, b"c" * 10)]
+    chunks = [(address, bytes(chunk)) for address, chunk in rechunk(pieces, 256)]
+    assert chunks == [
+        (FLASH, b"a" * 100 + b"b" * 156),
+        (FLASH + 256, b"b" * 256),
+        (FLASH + 512, b"b" * 88),
+        (FLASH + 0x1000, b"c" * 10),
+    ]
+
+
+def test_data_length_of_buffer_file_and_iterator(tmp_path):
+    path = tmp_path / "image.bin"
+    path.write_bytes(DATA)
+    with path.open("rb") as image_file:
+        image_file.read(4)
+        assert data_length(image_file) == len(DATA) - 4
+    assert data_length(DATA) == len(DATA)
+    assert data_length(iter([])) is None
+
+
+def test_map_file_returns_file_content(tmp_path):
+    path = tmp_path / "image.bin"
+    path.write_bytes(DATA)
+    assert map_file(path) == DATA
+    path.write_bytes(b"")
+    assert map_file(path) == b""
+
+
+def test_write_memory_data_accepts_file_object():
+    flash = written_flash(io.BytesIO(DATA))
+    assert flash[: len(DATA)] == DATA
+
+
+def test_write_memory_data_accepts_address_chunk_pairs():
+    def generate():
+        for offset in range(0, len(DATA), 100):
+            yield FLASH + 0x100 + offset, DATA[offset : offset + 100]
+
+    flash = written_flash(generate(), address=None)
+    assert flash[0x100 : 0x100 + len(DATA)] == DATA
+
+
+def test_write_memory_data_streams_mapped_image_in_constant_memory(tmp_path):
+    # A 4 MiB image, filling the flash of the GD32VW553xM parts.
+    image_size = 4 * 1024 * 1024
+    path = tmp_path / "image.bin"
+    path.write_bytes(bytes(range(256)) * (image_size // 256))
+    stm32 = Stm32Bootloader(SinkConnection(), device_family="GD32VW55X", verbosity=0)
+
+    tracemalloc.start()
+    try:
+        stm32.write_memory_data(FLASH, map_file(path))
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < image_size // 16
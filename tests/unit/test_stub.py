@@ -0,0 +1,142 @@
+import zlib
+
+import pytest
+
+from stm32loader import bootloader
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.devices import DEVICES
+from stm32loader.emulated.fake import FakeConnection
+from stm32loader.emulated.stub import StubDevice, StubEmulator
+from stm32loader.stub import (
+    REQUEST,
+    Opcode,
+    StubClient,
+    StubError,
+    StubRegistry,
+    encode_request,
+    load_stub,
+)
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+FLASH = 0x0800_0000
+DATA = bytes(range(256)) * 40 + b"tail"
+# Stack pointer and entry point, then code.
+STUB_IMAGE = bytes.fromhex("00a00020 09140020") + b"stub code"
+
+
+@pytest.fixture
+def emulator():
+    return StubEmulator(bytearray(b"\xff" * 64 * 1024))
+
+
+@pytest.fixture
+def client(emulator):
+    stub_client = StubClient(Stm32Bootloader(emulator, verbosity=0))
+    stub_client.hello()
+    return stub_client
+
+
+@pytest.fixture
+def registry():
+    stub_registry = StubRegistry()
+    stub_registry.register("F3", STUB_IMAGE)
+    return stub_registry
+
+
+@pytest.fixture
+def stm32(monkeypatch):
+    monkeypatch.setattr(bootloader.time, "sleep", lambda _seconds: None)
+    stm32 = Stm32Bootloader(StubDevice(STUB_IMAGE), verbosity=0)
+    stm32.set_device(DEVICES[(0x422, 0x41)])
+    stm32.reset_from_system_memory()
+    return stm32
+
+
+def test_hello_returns_max_payload(client):
+    assert client.max_payload == 4096
+
+
+def test_write_sends_large_frames_and_programs_flash(client, emulator):
+    client.write_memory_data(FLASH + 0x100, DATA)
+    assert emulator.flash_memory[0x100 : 0x100 + len(DATA)] == DATA
+    writes = [frame for frame in emulator.frames if frame[0] == Opcode.WRITE]
+    assert [length for _opcode, _address, length in writes] == [4096, 4096, 2052]
+    assert emulator.frames[-1][0] == Opcode.FLUSH
+
+
+def test_erase_and_checksum(client, emulator):
+    client.write_memory_data(FLASH, DATA)
+    assert client.checksum(FLASH, len(DATA)) == zlib.crc32(DATA)
+    client.erase(FLASH + 100, 10)
+    assert emulator.flash_memory[:2048] == b"\xff" * 2048
+    assert emulator.flash_memory[2048 : len(DATA)] == DATA[2048:]
+
+
+def test_programming_error_is_reported_by_next_reply(client, emulator):
+    emulator.fail_address = FLASH + 5000
+    with pytest.raises(StubError, match="FLASH_ERROR.*0x08001388"):
+        client.write_memory_data(FLASH, DATA)
+
+
+def test_corrupt_frame_is_rejected(emulator):
+    frame = bytearray(encode_request(Opcode.HELLO, 0))
+    frame[REQUEST.size] ^= 0xFF
+    emulator.write(frame)
+    stub_client = StubClient(Stm32Bootloader(emulator, verbosity=0))
+    # pylint: disable=protected-access
+    with pytest.raises(StubError, match="CRC_ERROR"):
+        stub_client._receive_reply(Opcode.HELLO, 0)
+
+
+def test_silent_stub_raises_error():
+    stub_client = StubClient(Stm32Bootloader(StubEmulator(bytearray(16)), verbosity=0))
+    # pylint: disable=protected-access
+    with pytest.raises(StubError, match="No reply"):
+        stub_client._receive_reply(Opcode.HELLO, 0)
+
+
+def test_registry_finds_registered_image_and_directory_file(tmp_path):
+    (tmp_path / "f4.bin").write_bytes(b"f4 stub")
+    stub_registry = StubRegistry(tmp_path)
+    stub_registry.register("f3", STUB_IMAGE)
+    assert stub_registry.find("F3") == STUB_IMAGE
+    assert stub_registry.find("F4") == b"f4 stub"
+    assert stub_registry.find("G0") is None
+
+
+def test_load_stub_uploads_and_starts_stub(stm32, registry):
+    stub_client = load_stub(stm32, registry)
+    ram_start = stm32.device.ram[0]
+    connection = stm32.connection
+    assert connection.ram_memory[ram_start - 0x2000_0000 :][: len(STUB_IMAGE)] == STUB_IMAGE
+    stub_client.write_memory_data(FLASH, DATA)
+    assert connection.flash_memory[: len(DATA)] == DATA
+
+
+def test_load_stub_without_stub_uses_rom_bootloader(stm32):
+    assert load_stub(stm32, StubRegistry()) is None
+
+
+def test_load_stub_without_reset_control_uses_rom_bootloader(registry, monkeypatch):
+    monkeypatch.setattr(bootloader.time, "sleep", lambda _seconds: None)
+    connection = FakeConnection()
+    stm32 = Stm32Bootloader(connection, verbosity=0)
+    stm32.set_device(DEVICES[(0x422, 0x41)])
+    assert load_stub(stm32, registry) is None
+    assert connection.ram_memory == bytearray(len(connection.ram_memory))
+
+
+def test_load_stub_with_unconnected_reset_uses_rom_bootloader(stm32, registry):
+    # E.g. a SerialConnection with --no-reset, which has enable_reset().
+    stm32.connection.TOGGLES_RESET = False
+    assert load_stub(stm32, registry) is None
+    assert STUB_IMAGE not in stm32.connection.ram_memory
+
+
+def test_load_stub_returns_to_rom_bootloader_if_stub_does_not_start(stm32):
+    other_registry = StubRegistry()
+    other_registry.register("F3", b"other code")
+    assert load_stub(stm32, other_registry) is None
+    # The ROM bootloader responds again.
+    assert stm32.get_version() == 0x05
@@ -0,0 +1,145 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from stm32loader import bootloader as Stm32
+from stm32loader.bootloader import Stm32Bootloader
+from stm32loader.device_family import FlashTiming
+from stm32loader.devices import DEVICES
+from stm32loader.timeouts import TimeoutPolicy, erase_time, program_time, transfer_time
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+F1_TIMING = FlashTiming(
+    page_erase_time=0.040, mass_erase_time=0.040, word_program_time=70e-6, word_size=2
+)
+
+
+@pytest.fixture
+def connection():
+    connection = MagicMock()
+    connection.read.return_value = [Stm32Bootloader.Reply.ACK]
+    connection.timeout = 5
+    return connection
+
+
+@pytest.fixture
+def stm32(connection):
+    # STM32F10xxx Medium-density.
+    return Stm32Bootloader(
+        connection, device=DEVICES[(0x410, None)], timeout_policy=TimeoutPolicy(115200)
+    )
+
+
+def test_transfer_time_counts_parity_and_stop_bits():
+    assert transfer_time(11520, 115200) == pytest.approx(1.1)
+
+
+def test_program_time_rounds_up_to_whole_words():
+    assert program_time(F1_TIMING, 3) == pytest.approx(2 * 70e-6)
+    assert program_time(FlashTiming(), 256) is None
+
+
+def test_erase_time_uses_page_or_mass_erase_time():
+    assert erase_time(F1_TIMING, 10) == pytest.approx(0.4)
+    assert erase_time(F1_TIMING) == pytest.approx(0.040)
+    assert erase_time(FlashTiming(sector_erase_time=2.0), 3) == pytest.approx(6.0)
+    assert erase_time(FlashTiming(), 3) is None
+
+
+def test_command_timeout_is_sized_to_a_chunk():
+    policy = TimeoutPolicy(115200, margin=2.0, latency=0.1)
+    timeout = policy.command_timeout(F1_TIMING, 256)
+    assert 0.1 < timeout < 0.2
+    assert policy.command_timeout(FlashTiming(), 256) is None
+
+
+def test_erase_timeout_falls_back_when_erase_time_is_unknown():
+    policy = TimeoutPolicy(115200)
+    assert policy.erase_timeout(FlashTiming(), 4) == TimeoutPolicy.FALLBACK_ERASE_TIMEOUT
+    assert policy.erase_timeout(F1_TIMING, 4) < 1
+
+
+def test_apply_command_timeout_tightens_connection_timeout(stm32, connection):
+    stm32.apply_command_timeout()
+    assert connection.timeout < 0.2
+
+
+def test_apply_command_timeout_without_policy_keeps_timeout(connection):
+    stm32 = Stm32Bootloader(connection, device=DEVICES[(0x410, None)])
+    stm32.apply_command_timeout()
+    assert connection.timeout == 5
+
+
+def test_extended_erase_waits_with_erase_sized_timeout(stm32, connection):
+    timeouts = []
+
+    def read(*_args, **_kwargs):
+        timeouts.append(connection.timeout)
+        return [Stm32Bootloader.Reply.ACK]
+
+    connection.read.side_effect = read
+    stm32.extended_erase_memory([0, 1, 2, 3])
+
+    assert timeouts[-1] == pytest.approx(TimeoutPolicy(115200).erase_timeout(F1_TIMING, 4))
+    assert connection.timeout == 5
+
+
+def test_extended_erase_without_policy_waits_30_seconds(connection):
+    stm32 = Stm32Bootloader(connection, device=DEVICES[(0x410, None)])
+    timeouts = []
+
+    def read(*_args, **_kwargs):
+        timeouts.append(connection.timeout)
+        return [Stm32Bootloader.Reply.ACK]
+
+    connection.read.side_effect = read
+    stm32.extended_erase_memory(None)
+    assert timeouts[-1] == 30
+    assert connection.timeout == 5
+
+
+def record_timeouts(connection):
+    timeouts = []
+
+    def read(*_args, **_kwargs):
+        timeouts.append(connection.timeout)
+        return [Stm32Bootloader.Reply.ACK]
+
+    connection.read.side_effect = read
+    return timeouts
+
+
+def test_readout_unprotect_waits_for_mass_erase_after_tight_command_timeout(
+    connection, monkeypatch
+):
+    monkeypatch.setattr(Stm32.time, "sleep", lambda _seconds: None)
+    # STM32F40xxx/41xxx: the mass erase takes up to 32 seconds.
+    stm32 = Stm32Bootloader(
+        connection, device=DEVICES[(0x413, 0x91)], timeout_policy=TimeoutPolicy(115200)
+    )
+    stm32.reset_from_system_memory = MagicMock()
+    stm32.apply_command_timeout()
+    command_timeout = connection.timeout
+    timeouts = record_timeouts(connection)
+
+    stm32.readout_unprotect()
+
+    # ACK of the command, then the ACK after the mass erase.
+    assert timeouts[0] == command_timeout
+    assert timeouts[1] == pytest.approx(
+        TimeoutPolicy(115200).erase_timeout(stm32.get_flash_timing())
+    )
+    assert timeouts[1] > 32
+    assert connection.timeout == command_timeout
+
+
+def test_write_unprotect_waits_for_option_byte_programming(stm32, connection, monkeypatch):
+    monkeypatch.setattr(Stm32.time, "sleep", lambda _seconds: None)
+    stm32.reset_from_system_memory = MagicMock()
+    stm32.apply_command_timeout()
+    timeouts = record_timeouts(connection)
+
+    stm32.write_unprotect()
+    assert timeouts[1] == pytest.approx(TimeoutPolicy(115200).erase_timeout(F1_TIMING, 1))
+    assert timeouts[1] > timeouts[0]
@@ -0,0 +1,97 @@
+import pytest
+
+from stm32loader.bootloader import Stm32Bootloader, Stm32LoaderError
+from stm32loader.emulated.fake import FakeConnection
+from stm32loader.trace import (
+    READ,
+    WRITE,
+    TraceMismatchError,
+    TraceRecord,
+    TraceRecorder,
+    TraceReplayer,
+    read_trace,
+    reply_latencies,
+)
+
+# pylint: disable=missing-docstring, redefined-outer-name
+
+DATA = bytes(range(256)) * 2
+
+
+def run_session(connection):
+    stm32 = Stm32Bootloader(connection, device_family="F3", verbosity=0)
+    stm32.reset_from_system_memory()
+    stm32.write_memory_data(0x0800_0000, DATA)
+    return stm32.read_memory_data(0x0800_0000, len(DATA))
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    path = tmp_path / "session.trace"
+    recorder = TraceRecorder(FakeConnection(), path)
+    run_session(recorder)
+    recorder.close()
+    return path
+
+
+def test_recorder_stores_traffic_in_both_directions(trace_path):
+    records = read_trace(trace_path)
+    assert records[0].direction == WRITE
+    assert records[0].data == b"\x7f"
+    assert records[1].direction == READ
+    assert records[1].data == bytes([Stm32Bootloader.Reply.ACK])
+    timestamps = [record.timestamp for record in records]
+    assert timestamps == sorted(timestamps)
+
+
+def test_recorder_passes_other_attributes_through():
+    connection = FakeConnection()
+    recorder = TraceRecorder(connection, "/dev/null")
+    recorder.timeout = 0.5
+    assert connection.timeout == 0.5
+    assert recorder.ack == connection.ack
+    recorder.close()
+
+
+def test_replayer_reproduces_recorded_session(trace_path):
+    replayer = TraceReplayer(trace_path)
+    assert run_session(replayer) == DATA
+    assert replayer.finished
+
+
+def test_replayer_detects_deviating_write(trace_path):
+    replayer = TraceReplayer(trace_path)
+    stm32 = Stm32Bootloader(replayer, device_family="F3", verbosity=0)
+    stm32.reset_from_system_memory()
+    with pytest.raises(TraceMismatchError):
+        stm32.write_memory_data(0x0800_0100, DATA)
+
+
+def test_replayer_detects_session_beyond_end_of_trace():
+    replayer = TraceReplayer([TraceRecord(WRITE, 0.0, b"\x7f")])
+    replayer.write(b"\x7f")
+    with pytest.raises(TraceMismatchError):
+        replayer.read()
+
+
+def test_read_trace_ignores_truncated_record(trace_path):
+    complete = read_trace(trace_path)
+    trace_path.write_bytes(trace_path.read_bytes()[:-1])
+    assert len(read_trace(trace_path)) == len(complete) - 1
+
+
+def test_read_trace_rejects_other_files(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(DATA)
+    with pytest.raises(Stm32LoaderError):
+        read_trace(path)
+
+
+def test_reply_latencies_pair_writes_with_replies():
+    records = [
+        TraceRecord(WRITE, 1.0, b"\x11"),
+        TraceRecord(WRITE, 1.5, b"\xee"),
+        TraceRecord(READ, 1.75, b"\x79"),
+        TraceRecord(READ, 1.8, b"\x79"),
+    ]
+    assert reply_latencies(records) == [(1.5, 0.25)]
@@ -0,0 +1,107 @@
+import pytest
+
+from stm32loader.bootloader import DataMismatchError, Stm32Bootloader
+from stm32loader.emulated.fake import FakeConnection
+from stm32loader.verify import compare, pad_to_words, stm32_crc32
+
+# pylint: disable=missing-docstring
+
+REFERENCE = bytes(range(256)) * 64
+
+
+def with_changes(data, changes):
+    data = bytearray(data)
+    for offset, value in changes.items():
+        data[offset] = value
+    return bytes(data)
+
+
+def test_compare_identical_data_is_ok():
+    report = compare(REFERENCE, bytearray(REFERENCE))
+    assert report.ok
+    assert report.mismatches == []
+    assert report.describe() == "Data matches."
+
+
+def test_compare_finds_all_mismatching_ranges():
+    read_data = with_changes(REFERENCE, {0: 0xAA, 1: 0xAA, 100: 0x00, 10000: 0xAA})
+    report = compare(read_data, REFERENCE)
+    assert not report
+    assert report.mismatches == [(0, 2), (100, 101), (10000, 10001)]
+    assert report.mismatch_count == 4
+
+
+def test_compare_merges_ranges_across_blocks():
+    read_data = with_changes(REFERENCE, {offset: 0xAA for offset in range(15, 34)})
+    report = compare(read_data, REFERENCE, block_size=16)
+    assert report.mismatches == [(15, 34)]
+
+
+def test_compare_reports_length_difference():
+    report = compare(REFERENCE[:-1], REFERENCE)
+    assert not report
+    assert report.mismatches == []
+    assert "Data length does not match" in report.describe()
+
+
+def test_page_summaries_flag_erased_pages():
+    read_data = bytearray(REFERENCE)
+    read_data[1024:2048] = b"\xff" * 1024
+    read_data[3000] ^= 0x01
+    report = compare(bytes(read_data), REFERENCE, address=0x0800_0000)
+    summaries = report.page_summaries(1024)
+    assert [(summary.address, summary.erased) for summary in summaries] == [
+        (0x0800_0400, True),
+        (0x0800_0800, False),
+    ]
+    # The reference holds 0xFF once per 256 bytes.
+    assert summaries[0].mismatch_count == 1020
+    assert summaries[1].mismatch_count == 1
+    assert "reads as erased" in report.describe(1024)
+
+
+def test_write_diff_stores_flipped_bits(tmp_path):
+    read_data = with_changes(REFERENCE, {3: 0x03 ^ 0x10})
+    path = tmp_path / "verify.diff"
+    compare(read_data, REFERENCE).write_diff(path)
+    diff = path.read_bytes()
+    assert len(diff) == len(REFERENCE)
+    assert diff[3] == 0x10
+    assert diff.count(0) == len(REFERENCE) - 1
+
+
+def test_verify_data_attaches_report_to_error():
+    read_data = with_changes(REFERENCE, {5: 0x00, 9000: 0x00})
+    with pytest.raises(DataMismatchError, match="First mismatch at address: 0x5") as error:
+        Stm32Bootloader.verify_data(read_data, REFERENCE)
+    assert error.value.report.mismatches == [(5, 6), (9000, 9001)]
+
+
+def reference_stm32_crc32(data, crc=0xFFFF_FFFF):
+    for offset in range(0, len(data), 4):
+        crc ^= int.from_bytes(data[offset : offset + 4], "little")
+        for _bit in range(32):
+            crc = (crc << 1) ^ (0x04C11DB7 if crc & 0x8000_0000 else 0)
+            crc &= 0xFFFF_FFFF
+    return crc
+
+
+def test_stm32_crc32_matches_crc_unit():
+    # Example from the STM32 CRC unit documentation.
+    assert stm32_crc32(bytes.fromhex("78563412")) == 0xDF8A8A2B
+    assert stm32_crc32(REFERENCE[:1024]) == reference_stm32_crc32(REFERENCE[:1024])
+    assert stm32_crc32(REFERENCE[:64], 0) == reference_stm32_crc32(REFERENCE[:64], 0)
+
+
+def test_stm32_crc32_needs_whole_words():
+    with pytest.raises(ValueError):
+        stm32_crc32(b"abc")
+    assert pad_to_words(b"abc") == b"abc\xff"
+    assert pad_to_words(b"abcd") == b"abcd"
+
+
+def test_get_checksum_returns_crc_calculated_on_device():
+    connection = FakeConnection()
+    connection.flash_memory[:1024] = REFERENCE[:1024]
+    stm32 = Stm32Bootloader(connection, verbosity=0)
+    assert stm32.get_checksum(0x0800_0000, 1024) == stm32_crc32(REFERENCE[:1024])